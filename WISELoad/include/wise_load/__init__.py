@@ -3,7 +3,9 @@ original_sys_path = sys.path
 sys.path.insert(0,
     os.path.join(os.path.abspath(os.path.dirname(__file__)), "..", "..", ".."))
 
+from WISELoad.src.async_workload import AsyncWorkload
 from WISELoad.src.session import Session
+from WISELoad.src.transport import HttpTransport, shared_http_transport
 from WISELoad.src.workload import Workload
 
 sys.path = original_sys_path
@@ -0,0 +1,21 @@
+import click
+
+import wise_load
+
+
+@click.group()
+def main():
+  pass
+
+
+@main.command()
+@click.option("--config", prompt="Workload configuration file")
+@click.option("--seed", prompt="Seed", type=click.INT)
+@click.option("--output", prompt="Schedule file")
+def schedule(config, seed, output):
+  """Expand a workload and a seed into a binary schedule file."""
+  wise_load.Workload(None, config, seed=seed).write_schedule(output)
+
+
+if __name__ == "__main__":
+  main()
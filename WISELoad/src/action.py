@@ -10,12 +10,14 @@ class Action:
   def name(self):
     return self._name
 
-  def delay(self, speed_up_factor):
-    self._delay.sleep(speed_up_factor)
+  def delay(self):
+    return self._delay
 
-  def transition(self):
-    random_num = random.uniform(0, sum(self._transition_weights.values()))
-    for transition, weight in self._transition_weights.items():
-      if random_num < weight:
-        return transition
-      random_num -= weight
+  def transition_weights(self):
+    return self._transition_weights
+
+  def sample_delay(self, speed_up_factor, rng=random):
+    return self._delay.sample(rng) / speed_up_factor
+
+  def sample_delays(self, rng, size):
+    return self._delay.sample_array(rng, size)
@@ -0,0 +1,25 @@
+import asyncio
+
+from .session_group import SessionGroup
+from .stats import Stats
+
+
+class AsyncSessionGroup(SessionGroup):
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self._stats = Stats()
+
+  def stats(self):
+    return self._stats
+
+  async def start(self):
+    loop = asyncio.get_running_loop()
+    await asyncio.sleep(max(0, self._start_at - loop.time()))
+    self._sessions = [self.session(i) for i in self._session_ids]
+    # [NOTE] All sessions run on the loop's thread, so they can share one
+    # Stats object instead of keeping a set of histograms each.
+    self._stats = Stats()
+    for session in self._sessions:
+      session.set_stats(self._stats)
+    await asyncio.gather(*[session.async_start(*self.session_schedule(i))
+        for (i, session) in zip(self._session_ids, self._sessions)])
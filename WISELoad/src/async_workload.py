@@ -0,0 +1,24 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from .async_session_group import AsyncSessionGroup
+from .open_loop_session_group import AsyncOpenLoopSessionGroup
+from .workload import Workload
+
+
+class AsyncWorkload(Workload):
+  _session_group_cls = AsyncSessionGroup
+  _open_loop_session_group_cls = AsyncOpenLoopSessionGroup
+
+  def _run(self):
+    asyncio.run(self._async_run())
+    return self.stats()
+
+  async def _async_run(self):
+    # [NOTE] Size the default executor so that sessions with synchronous
+    # actions are not throttled by it. Such sessions (e.g., MicroblogSession)
+    # thus still take one thread each while an action runs, as with the
+    # thread engine; only sessions with coroutine actions never touch it.
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=max(1, self.no_concurrent_sessions())))
+    await asyncio.gather(*[sg.start() for sg in self._session_groups])
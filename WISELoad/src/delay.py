@@ -1,25 +1,182 @@
+import os
 import random
-import time
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+
+_delay_classes = {}
+
+
+def register_delay(type_name):
+  """Make a Delay subclass selectable as |type_name| in session configs."""
+  def register(delay_cls):
+    _delay_classes[type_name] = delay_cls
+    return delay_cls
+  return register
+
+
+def create_delay(config, dirname="."):
+  """Build the Delay described by a "delayDistribution" entry. Relative trace
+  paths are resolved against |dirname|."""
+  if config["type"] not in _delay_classes:
+    raise ValueError("Unknown delay distribution %s" % config["type"])
+  return _delay_classes[config["type"]].from_config(config, dirname)
 
 
 class Delay:
-  def sleep(self, speed_up_factor):
+  @classmethod
+  def from_config(cls, config, dirname):
+    raise NotImplementedError
+
+  def sample(self, rng=random):
+    raise NotImplementedError
+
+  def sample_array(self, rng, size):
     raise NotImplementedError
 
 
+@register_delay("uniform")
 class UniformDelay(Delay):
   def __init__(self, start, end):
     self._start = start
     self._end = end
 
-  def sleep(self, speed_up_factor):
-    time.sleep(random.uniform(start, end) / speed_up_factor)
+  @classmethod
+  def from_config(cls, config, dirname):
+    return cls(config["start"], config["end"])
 
+  def sample(self, rng=random):
+    return rng.uniform(self._start, self._end)
 
+  def sample_array(self, rng, size):
+    return rng.uniform(self._start, self._end, size)
+
+
+@register_delay("gaussian")
 class GaussianDelay(Delay):
   def __init__(self, mean, sd):
     self._mean = mean
     self._sd = sd
 
-  def sleep(self, speed_up_factor):
-    time.sleep(max(0, random.gauss(self._mean, self._sd)) / speed_up_factor)
+  @classmethod
+  def from_config(cls, config, dirname):
+    return cls(config["mean"], config["sd"])
+
+  def sample(self, rng=random):
+    return max(0, rng.gauss(self._mean, self._sd))
+
+  def sample_array(self, rng, size):
+    return rng.normal(self._mean, self._sd, size).clip(min=0)
+
+
+@register_delay("exponential")
+class ExponentialDelay(Delay):
+  def __init__(self, mean):
+    self._mean = mean
+
+  @classmethod
+  def from_config(cls, config, dirname):
+    return cls(config["mean"])
+
+  def sample(self, rng=random):
+    return rng.expovariate(1.0 / self._mean)
+
+  def sample_array(self, rng, size):
+    return rng.exponential(self._mean, size)
+
+
+@register_delay("lognormal")
+class LognormalDelay(Delay):
+  """Think time whose logarithm is normal with mean |mu| and standard
+  deviation |sigma|."""
+
+  def __init__(self, mu, sigma):
+    self._mu = mu
+    self._sigma = sigma
+
+  @classmethod
+  def from_config(cls, config, dirname):
+    return cls(config["mu"], config["sigma"])
+
+  def sample(self, rng=random):
+    return rng.lognormvariate(self._mu, self._sigma)
+
+  def sample_array(self, rng, size):
+    return rng.lognormal(self._mu, self._sigma, size)
+
+
+@register_delay("pareto")
+class ParetoDelay(Delay):
+  """Think time of at least |scale| with a tail of index |shape|."""
+
+  def __init__(self, scale, shape):
+    self._scale = scale
+    self._shape = shape
+
+  @classmethod
+  def from_config(cls, config, dirname):
+    return cls(config["scale"], config["shape"])
+
+  def sample(self, rng=random):
+    return self._scale * rng.paretovariate(self._shape)
+
+  def sample_array(self, rng, size):
+    # [NOTE] NumPy draws from the Lomax distribution, i.e. a Pareto
+    # distribution shifted to start at 0.
+    return self._scale * (1.0 + rng.pareto(self._shape, size))
+
+
+@register_delay("empirical")
+class EmpiricalDelay(Delay):
+  """Think time drawn uniformly from observed values, either listed in the
+  config as "samples" or read from a "trace" file with one value per line."""
+
+  def __init__(self, samples):
+    if not samples:
+      raise ValueError("An empirical delay distribution needs samples")
+    self._samples = [float(sample) for sample in samples]
+    self._array = None if np is None else np.array(self._samples)
+
+  @classmethod
+  def from_config(cls, config, dirname):
+    if "samples" in config:
+      return cls(config["samples"])
+    with open(os.path.join(dirname, config["trace"])) as trace_file:
+      return cls([line for line in trace_file if line.strip()])
+
+  def sample(self, rng=random):
+    return rng.choice(self._samples)
+
+  def sample_array(self, rng, size):
+    return rng.choice(self._array, size)
+
+
+class DelayBuffer:
+  """Think times of the actions of one session, drawn from their
+  distributions in blocks through NumPy and handed out one at a time."""
+
+  def __init__(self, delays, rng, block_size=32):
+    self._delays = delays
+    self._rng = rng
+    self._block_size = block_size
+    # [NOTE] The NumPy generator is seeded from |rng|, so a seeded session
+    # draws the same think times with or without a schedule.
+    self._generator = None if np is None else \
+        np.random.default_rng(rng.getrandbits(64))
+    # [NOTE] Blocks stay NumPy arrays, which take 8 bytes per think time
+    # rather than a Python float object each; every session has its own.
+    self._blocks = [() for delay in delays]
+    self._positions = [0] * len(delays)
+
+  def sample(self, i):
+    if self._generator is None:
+      return self._delays[i].sample(self._rng)
+    if self._positions[i] == len(self._blocks[i]):
+      self._blocks[i] = self._delays[i].sample_array(self._generator,
+          self._block_size)
+      self._positions[i] = 0
+    self._positions[i] += 1
+    return float(self._blocks[i][self._positions[i] - 1])
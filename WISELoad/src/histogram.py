@@ -0,0 +1,73 @@
+import math
+
+
+class Histogram:
+  """Log-linear (HDR-style) histogram of non-negative integers, kept with
+  |significant_digits| decimal digits of precision in a sparse dict."""
+
+  def __init__(self, significant_digits=2):
+    self._significant_digits = significant_digits
+    self._magnitude = math.ceil(math.log2(2 * 10 ** significant_digits)) - 1
+    self._sub_bucket_count = 2 ** (self._magnitude + 1)
+    self._counts = {}
+    self._total_count = 0
+    self._min = None
+    self._max = None
+    self._sum = 0
+
+  def _index(self, value):
+    bucket = max(0, value.bit_length() - self._magnitude - 1)
+    return (bucket << self._magnitude) + (value >> bucket)
+
+  def _highest_equivalent_value(self, index):
+    if index < self._sub_bucket_count:
+      return index
+    bucket = (index >> self._magnitude) - 1
+    sub_bucket = index - (bucket << self._magnitude)
+    return ((sub_bucket + 1) << bucket) - 1
+
+  def record(self, value, count=1):
+    value = max(0, int(value))
+    index = self._index(value)
+    self._counts[index] = self._counts.get(index, 0) + count
+    self._total_count += count
+    self._sum += value * count
+    self._min = value if self._min is None else min(self._min, value)
+    self._max = value if self._max is None else max(self._max, value)
+
+  def merge(self, other):
+    if other._significant_digits != self._significant_digits:
+      raise ValueError("Cannot merge histograms of different precisions")
+    for (index, count) in other._counts.items():
+      self._counts[index] = self._counts.get(index, 0) + count
+    self._total_count += other._total_count
+    self._sum += other._sum
+    if other._min is not None:
+      self._min = other._min if self._min is None else \
+          min(self._min, other._min)
+      self._max = other._max if self._max is None else \
+          max(self._max, other._max)
+    return self
+
+  def count(self):
+    return self._total_count
+
+  def min(self):
+    return self._min
+
+  def max(self):
+    return self._max
+
+  def mean(self):
+    return self._sum / self._total_count if self._total_count else None
+
+  def percentile(self, percentile):
+    if not self._total_count:
+      return None
+    threshold = max(1, math.ceil(percentile / 100.0 * self._total_count))
+    seen = 0
+    for index in sorted(self._counts):
+      seen += self._counts[index]
+      if seen >= threshold:
+        return min(self._highest_equivalent_value(index), self._max)
+    return self._max
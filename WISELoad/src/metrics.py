@@ -0,0 +1,115 @@
+from collections import Counter
+import http.server
+import json
+import os
+import threading
+import time
+
+from .histogram import Histogram
+from .stats import PERCENTILES
+
+
+class LiveMetrics:
+  """Per-action throughput, errors and latency over the last complete window
+  of |window| seconds, plus the number of sessions in flight."""
+
+  def __init__(self, window=1.0):
+    self._window = window
+    self._lock = threading.Lock()
+    self._in_flight = 0
+    self._current = self._empty_window(self._window_index())
+    self._previous = self._empty_window(self._current["index"] - 1)
+
+  def _window_index(self):
+    return int(time.monotonic() // self._window)
+
+  @staticmethod
+  def _empty_window(index):
+    return {"index": index, "counts": Counter(), "errors": Counter(),
+        "latencies": {}}
+
+  def _rotate(self):
+    # [NOTE] Called with the lock held. Only the window being filled and the
+    # last complete one are kept.
+    index = self._window_index()
+    if index != self._current["index"]:
+      self._previous = self._current if index == self._current["index"] + 1 \
+          else self._empty_window(index - 1)
+      self._current = self._empty_window(index)
+
+  def record(self, action_name, latency):
+    with self._lock:
+      self._rotate()
+      self._current["counts"][action_name] += 1
+      latencies = self._current["latencies"]
+      if action_name not in latencies:
+        latencies[action_name] = Histogram()
+      latencies[action_name].record(latency * 1e6)
+
+  def record_error(self, action_name):
+    with self._lock:
+      self._rotate()
+      self._current["errors"][action_name] += 1
+
+  def session_started(self):
+    with self._lock:
+      self._in_flight += 1
+
+  def session_finished(self):
+    with self._lock:
+      self._in_flight -= 1
+
+  def snapshot(self):
+    with self._lock:
+      self._rotate()
+      window = self._previous
+      in_flight = self._in_flight
+    actions = {}
+    for action_name in set(window["counts"]) | set(window["errors"]):
+      entry = {"throughput": window["counts"][action_name] / self._window,
+          "errors": window["errors"][action_name]}
+      histogram = window["latencies"].get(action_name)
+      for (name, percentile) in PERCENTILES:
+        entry[name] = histogram.percentile(percentile) / 1e6 \
+            if histogram is not None else None
+      actions[action_name] = entry
+    return {"window": self._window, "in_flight": in_flight,
+        "actions": actions}
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+  def do_GET(self):
+    body = json.dumps(self.server.metrics.snapshot()).encode("utf-8")
+    self.send_response(200)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, format, *args):
+    pass
+
+
+def serve_metrics(port, hostname="127.0.0.1"):
+  """Serve the live metrics of this process as JSON over HTTP from a
+  background thread, and return the server so that it can be shut down."""
+  server = http.server.ThreadingHTTPServer((hostname, port), _MetricsHandler)
+  server.daemon_threads = True
+  server.metrics = live_metrics()
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  return server
+
+
+_live_metrics = None
+_live_metrics_pid = None
+_live_metrics_lock = threading.Lock()
+
+
+def live_metrics():
+  """Return the live metrics of this process, creating them on first use."""
+  global _live_metrics, _live_metrics_pid
+  with _live_metrics_lock:
+    if _live_metrics is None or _live_metrics_pid != os.getpid():
+      _live_metrics = LiveMetrics()
+      _live_metrics_pid = os.getpid()
+    return _live_metrics
@@ -0,0 +1,157 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import copy
+import random
+
+from .session import load_transition_table, trajectory, trajectory_random
+from .stats import Stats
+
+
+class OpenLoopSessionGroup:
+  def __init__(self, session_cls, args, config_filename, arrival_rate,
+        session_length, max_concurrent_sessions, start_at, stop_at,
+        burst_schedule, group_id=0, seed=None):
+    self._session_cls = session_cls
+    self._args = args
+    self._config_filename = config_filename
+    self._arrival_rate = arrival_rate
+    self._session_length = session_length
+    self._max_concurrent_sessions = max_concurrent_sessions
+    self._start_at = start_at
+    self._stop_at = stop_at
+    self._burst_schedule = burst_schedule
+    self._group_id = group_id
+    self._seed = seed
+    self._schedule = None
+    self._first_session_id = 0
+    self._start_offset = 0
+    self._no_scheduled_sessions = 0
+    self._shard_id = 0
+    self._no_shards = 1
+    self._stats = Stats()
+
+  def no_concurrent_sessions(self):
+    return self._max_concurrent_sessions
+
+  def shard(self, shard_id, no_shards):
+    # [NOTE] Every shard draws the whole arrival process and keeps every n-th
+    # arrival. A thinned Poisson process is still Poisson, and a seeded run
+    # issues the same sessions whatever the number of shards.
+    session_group = copy.copy(self)
+    session_group._shard_id = self._shard_id + shard_id * self._no_shards
+    session_group._no_shards = self._no_shards * no_shards
+    session_group._max_concurrent_sessions = \
+        -(-self._max_concurrent_sessions // no_shards)
+    session_group._stats = Stats()
+    return session_group
+
+  def set_schedule(self, schedule, first_session_id, no_sessions,
+      start_offset):
+    self._schedule = schedule
+    self._first_session_id = first_session_id
+    self._no_scheduled_sessions = no_sessions
+    self._start_offset = start_offset
+
+  def transition_table(self):
+    return load_transition_table(self._config_filename)
+
+  def stats(self):
+    return self._stats
+
+  def arrival_rate(self, t):
+    speed_up_factor, window, arrival_rate = self._burst_schedule.lookup(t)
+    if arrival_rate is not None:
+      return arrival_rate
+    return self._arrival_rate * speed_up_factor
+
+  def arrivals(self):
+    """Yield the offset of each session arrival from the start of the
+    group, or None for a replayed session that issues no action."""
+    if self._schedule is not None:
+      # [NOTE] A session that arrived too close to the end of the group to
+      # issue any action has no records, and thus no arrival, in a schedule.
+      for k in range(self._no_scheduled_sessions):
+        arrival = self._schedule.arrival(self._first_session_id + k)
+        yield None if arrival is None else arrival - self._start_offset
+      return
+    rng = random.Random() if self._seed is None else \
+        random.Random("%s:arrivals" % self._seed)
+    duration = self._stop_at - self._start_at
+    offset = 0.0
+    while True:
+      arrival_rate = self.arrival_rate(self._start_at + offset)
+      offset += rng.expovariate(arrival_rate) if arrival_rate > 0 else 0.05
+      if offset >= duration:
+        return
+      if arrival_rate > 0:
+        yield offset
+
+  def session_seed(self, k):
+    return None if self._seed is None else "%s:%d" % (self._seed, k)
+
+  def session(self, k):
+    session = self._session_cls.seeded(self.session_seed(k),
+        self._config_filename, *self._args)
+    session.set_id("%d:%d" % (self._group_id, k))
+    if self._schedule is not None:
+      session.set_schedule(self._schedule.steps(self._first_session_id + k))
+    return session
+
+  def generate_schedule(self, epoch):
+    transition_table = self.transition_table()
+    for (k, arrival) in enumerate(self.arrivals()):
+      t = self._start_at + arrival
+      records = []
+      for (step, (action, delay)) in zip(range(self._session_length),
+          trajectory(transition_table, trajectory_random(self.session_seed(k)),
+              lambda: self._burst_schedule.speed_up_factor(t))):
+        t += delay
+        if t >= self._stop_at:
+          break
+        records.append(
+            (t - epoch, transition_table.index(action.name()), delay))
+      yield records
+
+  def start(self):
+    asyncio.run(self._run_in_own_loop())
+
+  async def _run_in_own_loop(self):
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=max(1, self._max_concurrent_sessions)))
+    await self.async_start()
+
+  async def async_start(self):
+    loop = asyncio.get_running_loop()
+    # [NOTE] Arrivals are scheduled at absolute times on the loop's monotonic
+    # clock, regardless of how long earlier sessions take to be served. A
+    # session arriving while the maximum number of sessions run is not started
+    # but counted, instead of delaying the arrivals after it.
+    slots = asyncio.Semaphore(self._max_concurrent_sessions)
+    tasks = set()
+    for (k, arrival) in enumerate(self.arrivals()):
+      if k % self._no_shards != self._shard_id or arrival is None:
+        continue
+      scheduled_at = self._start_at + arrival
+      await asyncio.sleep(max(0, scheduled_at - loop.time()))
+      if slots.locked():
+        self._stats.record_dropped_session()
+        continue
+      await slots.acquire()
+      task = asyncio.ensure_future(self._run_session(k, scheduled_at, slots))
+      tasks.add(task)
+      task.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks)
+
+  async def _run_session(self, k, scheduled_at, slots):
+    try:
+      session = self.session(k)
+      session.set_stats(self._stats)
+      await session.async_start_open_loop(scheduled_at, self._session_length,
+          self._stop_at, self._burst_schedule)
+    finally:
+      slots.release()
+
+
+class AsyncOpenLoopSessionGroup(OpenLoopSessionGroup):
+  async def start(self):
+    await self.async_start()
@@ -0,0 +1,106 @@
+import json
+import mmap
+import struct
+
+
+MAGIC = b"WISESCHD"
+VERSION = 1
+# Header length, followed by a JSON header.
+PREAMBLE = struct.Struct("<8sI")
+# First record and number of records of each session.
+INDEX_ENTRY = struct.Struct("<QI")
+# Session id, start offset (s), action id and think time (s) of each action.
+RECORD = struct.Struct("<IdHf")
+
+
+def write_schedule(workload, seed, filename):
+  sessions = []
+  records = bytearray()
+  no_records = 0
+  config = []
+  for (sg_spec, sg) in zip(workload.config(), workload.session_groups()):
+    first_session_id = len(sessions)
+    for (session_id, session_records) in enumerate(
+        sg.generate_schedule(workload.epoch())):
+      session_id += first_session_id
+      sessions.append((no_records, len(session_records)))
+      for (start_offset, action_id, delay) in session_records:
+        records += RECORD.pack(session_id, start_offset, action_id, delay)
+      no_records += len(session_records)
+    config.append(dict(sg_spec, firstSessionId=first_session_id,
+        noSessions=len(sessions) - first_session_id,
+        actions=[action.name() for action in sg.transition_table().actions()]))
+  header = json.dumps({"version": VERSION, "seed": seed,
+      "workload": config}).encode("utf-8")
+  with open(filename, "wb") as schedule_file:
+    schedule_file.write(PREAMBLE.pack(MAGIC, len(header)))
+    schedule_file.write(header)
+    for (first_record, session_no_records) in sessions:
+      schedule_file.write(INDEX_ENTRY.pack(first_record, session_no_records))
+    schedule_file.write(records)
+
+
+class Schedule:
+  def __init__(self, filename):
+    self._filename = filename
+    self._mmap = None
+    with open(filename, "rb") as schedule_file:
+      magic, header_length = PREAMBLE.unpack(
+          schedule_file.read(PREAMBLE.size))
+      if magic != MAGIC:
+        raise ValueError("%s is not a schedule file" % filename)
+      self._header = json.loads(schedule_file.read(header_length))
+    if self._header["version"] != VERSION:
+      raise ValueError("Unsupported schedule version %s" %
+          self._header["version"])
+    self._no_sessions = sum(sg_spec["noSessions"]
+        for sg_spec in self._header["workload"])
+    self._index_offset = PREAMBLE.size + header_length
+    self._records_offset = self._index_offset + \
+        self._no_sessions * INDEX_ENTRY.size
+
+  def __getstate__(self):
+    # [NOTE] Memory maps cannot be pickled; worker processes map the file
+    # again on first use.
+    state = self.__dict__.copy()
+    state["_mmap"] = None
+    return state
+
+  def _map(self):
+    if self._mmap is None:
+      with open(self._filename, "rb") as schedule_file:
+        self._mmap = mmap.mmap(schedule_file.fileno(), 0,
+            access=mmap.ACCESS_READ)
+    return self._mmap
+
+  def seed(self):
+    return self._header["seed"]
+
+  def workload_config(self):
+    return self._header["workload"]
+
+  def no_sessions(self):
+    return self._no_sessions
+
+  def _session_records(self, session_id):
+    first_record, no_records = INDEX_ENTRY.unpack_from(self._map(),
+        self._index_offset + session_id * INDEX_ENTRY.size)
+    start = self._records_offset + first_record * RECORD.size
+    return memoryview(self._map())[start:start + no_records * RECORD.size]
+
+  def records(self, session_id):
+    """Yield the (start offset, action id, think time) of each action."""
+    for (_, start_offset, action_id, delay) in RECORD.iter_unpack(
+        self._session_records(session_id)):
+      yield start_offset, action_id, delay
+
+  def steps(self, session_id):
+    for (start_offset, action_id, delay) in self.records(session_id):
+      yield action_id, delay
+
+  def arrival(self, session_id):
+    """Return the offset at which a session starts, i.e. when its first think
+    time begins."""
+    for (start_offset, action_id, delay) in self.records(session_id):
+      return start_offset - delay
+    return None
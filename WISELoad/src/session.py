@@ -1,5 +1,7 @@
+import asyncio
 from collections import OrderedDict
-import datetime
+import functools
+import os
 import random
 import string
 import time
@@ -7,41 +9,220 @@ import time
 import yaml
 
 from .action import Action
-from .delay import UniformDelay, GaussianDelay
+from .delay import DelayBuffer, create_delay
+from .metrics import live_metrics
+from .stats import Stats
+from .timer import timer_wheel
+from .transition_table import TransitionTable
+
+
+@functools.lru_cache(maxsize=None)
+def load_transition_table(config_filename):
+  # [NOTE] The compiled session graph is immutable, so every session of a
+  # process shares it instead of parsing the YAML file again.
+  actions = OrderedDict()
+  with open(config_filename) as config_file:
+    config = yaml.safe_load(config_file)
+  for action in config:
+    name = action["action"]
+    delay = create_delay(action["delayDistribution"],
+        os.path.dirname(config_filename))
+    transition_weights = OrderedDict()
+    for (transition, weight) in action["transitionWeights"].items():
+      transition_weights[transition] = weight
+    actions[name] = Action(name, delay, transition_weights)
+  return TransitionTable(actions)
 
 
 class Session:
   def __init__(self, config_filename):
-    self._actions = OrderedDict()
-    with open(config_filename) as config_file:
-      config = yaml.safe_load(config_file)
-    for action in config:
-      name = action["action"]
-      if action["delayDistribution"]["type"] == "uniform":
-        delay = UniformDelay(action["delayDistribution"]["start"],
-            action["delayDistribution"]["end"])
-      elif action["delayDistribution"]["type"] == "gaussian":
-        delay = GaussianDelay(action["delayDistribution"]["mean"],
-            action["delayDistribution"]["sd"])
-      transition_weights = OrderedDict()
-      for (transition, weight) in action["transitionWeights"].items():
-        transition_weights[transition] = weight
-      self._actions[name] = Action(name, delay, transition_weights)
+    self._transition_table = load_transition_table(config_filename)
+    self._actions = self._transition_table.actions()
+    self._stats = Stats()
+    self._schedule = None
+    self._id = None
+    # Loop of the asyncio engine running the session, if any.
+    self._loop = None
+    if not hasattr(self, "_random"):
+      self.seed(None)
+
+  @classmethod
+  def seeded(cls, seed, config_filename, *args):
+    # [NOTE] Seed before running the constructor, since subclasses draw from
+    # the session stream there (e.g., to pick a username).
+    session = cls.__new__(cls)
+    session.seed(seed)
+    session.__init__(config_filename, *args)
+    return session
+
+  def transition_table(self):
+    return self._transition_table
+
+  def stats(self):
+    return self._stats
+
+  def set_stats(self, stats):
+    self._stats = stats
+
+  def seed(self, seed):
+    # [NOTE] The trajectory (actions and think times) and the session's own
+    # randomness (e.g., |random_string|) use separate streams, so that a seeded
+    # trajectory is the same whatever the session does with its own stream.
+    self._trajectory_random = trajectory_random(seed)
+    self._random = random.Random() if seed is None else \
+        random.Random("%s:session" % seed)
+
+  def set_schedule(self, schedule):
+    self._schedule = schedule
+
+  def set_id(self, session_id):
+    self._id = session_id
+
+  def random(self):
+    return self._random
 
   def random_string(self, length):
     letters = string.ascii_lowercase + string.ascii_uppercase + string.digits
-    return "".join(random.choice(letters) for i in range(length))
-
-  def start(self, start_at, stop_at, burstiness):
-    while datetime.datetime.now() < start_at:
-      time.sleep(0.5)
-    action = list(self._actions.values())[0]
-    while datetime.datetime.now() < stop_at:
-      now = datetime.datetime.now()
-      speed_up_factor = 1.0
-      for burst in burstiness:
-        if now > burst["start_at"] and now < burst["stop_at"]:
-          speed_up_factor = float(burst["speed_up_factor"])
-      action.delay(speed_up_factor)
-      getattr(self, action.name())()
-      action = self._actions[action.transition()]
+    return "".join(self._random.choice(letters) for i in range(length))
+
+  def record_error(self, action_name):
+    """Count a failed |action_name|, e.g. on a malformed response."""
+    # [NOTE] Under the asyncio engine, the sessions of a group share a Stats
+    # object that only the loop's thread updates, while synchronous actions
+    # run on executor threads. Their errors are thus recorded by the loop,
+    # before it learns that the action completed.
+    if self._loop is not None and not self._on_loop_thread():
+      self._loop.call_soon_threadsafe(self._stats.record_error, action_name)
+    else:
+      self._stats.record_error(action_name)
+    live_metrics().record_error(action_name)
+
+  def _on_loop_thread(self):
+    try:
+      return asyncio.get_running_loop() is self._loop
+    except RuntimeError:
+      return False
+
+  def _record(self, action_name, window, latency, lag=None):
+    self._stats.record(action_name, window, time.time(), latency, lag)
+    live_metrics().record(action_name, latency)
+
+  def close(self):
+    """Release the resources of the session, once it has issued its last
+    action."""
+    pass
+
+  def steps(self, burst_schedule):
+    """Yield (action, think time) pairs, either replayed from a schedule or
+    drawn from the session graph when the next step is requested."""
+    if self._schedule is not None:
+      for (action_id, delay) in self._schedule:
+        yield self._actions[action_id], delay
+      return
+    yield from trajectory(self._transition_table, self._trajectory_random,
+        lambda: burst_schedule.speed_up_factor(time.monotonic()))
+
+  def start(self, start_at, stop_at, burst_schedule):
+    timer = timer_wheel()
+    timer.sleep_until(start_at)
+    live_metrics().session_started()
+    try:
+      for (action, delay) in self.steps(burst_schedule):
+        deadline = time.monotonic() + delay
+        if deadline >= stop_at:
+          break
+        woke_at = timer.sleep_until(deadline)
+        self._stats.record_drift(self._id, woke_at - deadline)
+        started_at = time.perf_counter()
+        getattr(self, action.name())()
+        self._record(action.name(), burst_schedule.window(woke_at),
+            time.perf_counter() - started_at)
+    finally:
+      live_metrics().session_finished()
+      self.close()
+
+  async def async_start(self, start_at, stop_at, burst_schedule):
+    loop = self._loop = asyncio.get_running_loop()
+    await asyncio.sleep(max(0, start_at - loop.time()))
+    live_metrics().session_started()
+    try:
+      for (action, delay) in self.steps(burst_schedule):
+        deadline = loop.time() + delay
+        if deadline >= stop_at:
+          break
+        await asyncio.sleep(max(0, deadline - loop.time()))
+        woke_at = loop.time()
+        self._stats.record_drift(self._id, woke_at - deadline)
+        started_at = await self._async_execute(action)
+        if started_at is None:
+          continue
+        self._record(action.name(), burst_schedule.window(woke_at),
+            time.monotonic() - started_at)
+    finally:
+      live_metrics().session_finished()
+      self.close()
+
+  async def async_start_open_loop(self, scheduled_at, length, stop_at,
+      burst_schedule):
+    loop = self._loop = asyncio.get_running_loop()
+    live_metrics().session_started()
+    try:
+      for (step, (action, delay)) in zip(range(length),
+          self.steps(burst_schedule)):
+        # [NOTE] The next action is due one think time after the previous
+        # one was due, not after it completed, so a slow response shows up
+        # as lag.
+        scheduled_at += delay
+        if scheduled_at >= stop_at:
+          break
+        await asyncio.sleep(max(0, scheduled_at - loop.time()))
+        woke_at = loop.time()
+        # [NOTE] The lag runs until the action actually starts, so the time a
+        # synchronous action waits for an executor thread counts too.
+        started_at = await self._async_execute(action)
+        if started_at is None:
+          continue
+        self._record(action.name(), burst_schedule.window(woke_at),
+            time.monotonic() - started_at, max(0, started_at - scheduled_at))
+    finally:
+      live_metrics().session_finished()
+      self.close()
+
+  async def _async_execute(self, action):
+    """Run |action|; return the time at which it started, on the monotonic
+    clock of the loop, or None if it failed."""
+    method = getattr(self, action.name())
+
+    def run():
+      started_at = time.monotonic()
+      method()
+      return started_at
+
+    # [NOTE] A failed action is counted as an error and the session goes on,
+    # so that it neither stops the other sessions of the loop nor the run.
+    try:
+      if asyncio.iscoroutinefunction(method):
+        started_at = time.monotonic()
+        await method()
+        return started_at
+      # [NOTE] Synchronous actions block, so they run in the loop's default
+      # executor instead of stalling every other session.
+      return await asyncio.get_running_loop().run_in_executor(None, run)
+    except Exception as e:
+      print(f"Error: action {action.name()} failed:\n{e!r}")
+      self.record_error(action.name())
+      return None
+
+
+def trajectory_random(seed):
+  return random.Random() if seed is None else \
+      random.Random("%s:trajectory" % seed)
+
+
+def trajectory(transition_table, rng, speed_up_factor):
+  actions = transition_table.actions()
+  delays = DelayBuffer([action.delay() for action in actions], rng)
+  i = 0
+  while True:
+    yield actions[i], delays.sample(i) / speed_up_factor()
+    i = transition_table.next(i, rng)
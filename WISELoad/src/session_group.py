@@ -1,11 +1,15 @@
-import datetime
+import copy
 import threading
-import time
+
+from .session import load_transition_table, trajectory, trajectory_random
+from .stats import Stats
+from .timer import timer_wheel
 
 
 class SessionGroup:
   def __init__(self, session_cls, args, config_filename, no_concurrent_sessions,
-        ramp_up_duration, ramp_down_duration, start_at, stop_at, burstiness):
+        ramp_up_duration, ramp_down_duration, start_at, stop_at,
+        burst_schedule, group_id=0, seed=None):
     self._session_cls = session_cls
     self._args = args
     self._config_filename = config_filename
@@ -14,20 +18,104 @@ class SessionGroup:
     self._ramp_down_duration = ramp_down_duration
     self._start_at = start_at
     self._stop_at = stop_at
-    self._burstiness = burstiness
+    self._burst_schedule = burst_schedule
+    self._group_id = group_id
+    self._seed = seed
+    self._schedule = None
+    self._first_session_id = 0
+    self._no_scheduled_sessions = 0
+    self._start_offset = 0
+    self._session_ids = range(no_concurrent_sessions)
+    self._sessions = []
+
+  def no_concurrent_sessions(self):
+    return len(self._session_ids)
+
+  def shard(self, shard_id, no_shards):
+    # [NOTE] Sessions keep their index in the whole group, so the ramp-up and
+    # ramp-down offsets of a shard are the same as in an unsharded run.
+    session_group = copy.copy(self)
+    session_group._session_ids = self._session_ids[shard_id::no_shards]
+    session_group._sessions = []
+    return session_group
+
+  def set_schedule(self, schedule, first_session_id, no_sessions,
+      start_offset):
+    self._schedule = schedule
+    self._first_session_id = first_session_id
+    self._no_scheduled_sessions = no_sessions
+    self._start_offset = start_offset
+
+  def _scheduled_session_id(self, i):
+    """Return the id in the schedule of session |i|, or None if the schedule
+    has no entries for it."""
+    if self._schedule is None or i >= self._no_scheduled_sessions:
+      return None
+    return self._first_session_id + i
+
+  def transition_table(self):
+    return load_transition_table(self._config_filename)
+
+  def session_seed(self, i):
+    return None if self._seed is None else "%s:%d" % (self._seed, i)
+
+  def session(self, i):
+    session = self._session_cls.seeded(self.session_seed(i),
+        self._config_filename, *self._args)
+    session.set_id("%d:%d" % (self._group_id, i))
+    if self._schedule is not None:
+      # [NOTE] A session beyond those of the schedule replays no action rather
+      # than the entries of the next group.
+      session_id = self._scheduled_session_id(i)
+      session.set_schedule(() if session_id is None else
+          self._schedule.steps(session_id))
+    return session
+
+  def stats(self):
+    stats = Stats()
+    for session in self._sessions:
+      stats.merge(session.stats())
+    return stats
+
+  def session_schedule(self, i):
+    start_at = self._start_at + \
+        i * self._ramp_up_duration / self._no_concurrent_sessions
+    session_id = self._scheduled_session_id(i)
+    if session_id is not None:
+      # [NOTE] Schedule offsets are from the epoch of the recorded run, so a
+      # replayed session starts at its recorded offset from the group start.
+      arrival = self._schedule.arrival(session_id)
+      if arrival is not None:
+        start_at = self._start_at + arrival - self._start_offset
+    return [start_at,
+        self._stop_at - (self._no_concurrent_sessions - i) *
+        self._ramp_down_duration / self._no_concurrent_sessions,
+        self._burst_schedule]
+
+  def generate_schedule(self, epoch):
+    """Yield the (start offset, action id, think time) records of each
+    session, assuming that every action completes instantly."""
+    transition_table = self.transition_table()
+    for i in range(self._no_concurrent_sessions):
+      start_at, stop_at, burst_schedule = self.session_schedule(i)
+      t = start_at
+      records = []
+      for (action, delay) in trajectory(transition_table,
+          trajectory_random(self.session_seed(i)),
+          lambda: burst_schedule.speed_up_factor(t)):
+        t += delay
+        if t >= stop_at:
+          break
+        records.append(
+            (t - epoch, transition_table.index(action.name()), delay))
+      yield records
 
   def start(self):
-    while datetime.datetime.now() < self._start_at:
-      time.sleep(1)
+    timer_wheel().sleep_until(self._start_at)
+    self._sessions = [self.session(i) for i in self._session_ids]
     threads = [
-        threading.Thread(
-            target=self._session_cls(self._config_filename, *self._args).start,
-            args=[self._start_at +
-                i * self._ramp_up_duration / self._no_concurrent_sessions,
-                self._stop_at - (self._no_concurrent_sessions - i) *
-                self._ramp_down_duration / self._no_concurrent_sessions,
-                self._burstiness])
-        for i in range(self._no_concurrent_sessions)]
+        threading.Thread(target=session.start, args=self.session_schedule(i))
+        for (i, session) in zip(self._session_ids, self._sessions)]
     for thread in threads:
       thread.start()
     for thread in threads:
@@ -0,0 +1,157 @@
+from collections import Counter
+import json
+
+from .histogram import Histogram
+
+
+PERCENTILES = [("p50", 50.0), ("p99", 99.0), ("p99.9", 99.9)]
+
+
+class Stats:
+  def __init__(self):
+    self._counts = Counter()
+    self._errors = Counter()
+    # Open-loop sessions not started for lack of a concurrent session slot.
+    self._dropped_sessions = 0
+    # [NOTE] Latencies and schedule lags are recorded in microseconds, keyed
+    # by (action name, burst window).
+    self._latencies = {}
+    self._lags = {}
+    # Completed actions per wall-clock second (UNIX time).
+    self._throughput = Counter()
+    # [NOTE] Timer drift is how late a session woke up for its next action,
+    # both overall and as [count, sum, max] per session.
+    self._drift = Histogram()
+    self._session_drift = {}
+
+  def record(self, action_name, window, timestamp, latency, lag=None):
+    self._counts[action_name] += 1
+    self._throughput[int(timestamp)] += 1
+    key = (action_name, window)
+    if key not in self._latencies:
+      self._latencies[key] = Histogram()
+    self._latencies[key].record(latency * 1e6)
+    if lag is not None:
+      if key not in self._lags:
+        self._lags[key] = Histogram()
+      self._lags[key].record(lag * 1e6)
+
+  def record_error(self, action_name):
+    self._errors[action_name] += 1
+
+  def record_dropped_session(self):
+    self._dropped_sessions += 1
+
+  def record_drift(self, session_id, drift):
+    drift = max(0, drift)
+    self._drift.record(drift * 1e6)
+    if session_id not in self._session_drift:
+      self._session_drift[session_id] = [0, 0.0, 0.0]
+    session_drift = self._session_drift[session_id]
+    session_drift[0] += 1
+    session_drift[1] += drift
+    session_drift[2] = max(session_drift[2], drift)
+
+  def merge(self, other):
+    self._counts.update(other._counts)
+    self._errors.update(other._errors)
+    self._dropped_sessions += other._dropped_sessions
+    self._drift.merge(other._drift)
+    for (session_id, (count, total, maximum)) in \
+        other._session_drift.items():
+      if session_id not in self._session_drift:
+        self._session_drift[session_id] = [0, 0.0, 0.0]
+      session_drift = self._session_drift[session_id]
+      session_drift[0] += count
+      session_drift[1] += total
+      session_drift[2] = max(session_drift[2], maximum)
+    self._throughput.update(other._throughput)
+    for (histograms, other_histograms) in [(self._latencies, other._latencies),
+        (self._lags, other._lags)]:
+      for (key, histogram) in other_histograms.items():
+        if key not in histograms:
+          histograms[key] = Histogram()
+        histograms[key].merge(histogram)
+    return self
+
+  def counts(self):
+    return self._counts
+
+  def errors(self):
+    return self._errors
+
+  def dropped_sessions(self):
+    return self._dropped_sessions
+
+  def latencies(self):
+    return self._latencies
+
+  def lags(self):
+    return self._lags
+
+  def throughput(self):
+    return self._throughput
+
+  def drift(self):
+    return self._drift
+
+  def session_drift(self):
+    return self._session_drift
+
+  def _summarize_histogram(self, histogram):
+    entry = {"count": histogram.count(), "mean": histogram.mean() / 1e6,
+        "max": histogram.max() / 1e6}
+    for (name, percentile) in PERCENTILES:
+      entry[name] = histogram.percentile(percentile) / 1e6
+    return entry
+
+  def _summarize(self, histograms):
+    summary = {}
+    for ((action_name, window), histogram) in sorted(histograms.items()):
+      summary.setdefault(action_name, {})[window] = \
+          self._summarize_histogram(histogram)
+    return summary
+
+  def dump(self, filename):
+    with open(filename, "w") as summary_file:
+      json.dump({
+          "latency": self._summarize(self._latencies),
+          "lag": self._summarize(self._lags),
+          "throughput": sorted(self._throughput.items()),
+          "errors": dict(sorted(self._errors.items())),
+          "dropped_sessions": self._dropped_sessions,
+          "drift": {
+              "all": self._summarize_histogram(self._drift)
+                  if self._drift.count() else {},
+              "sessions": {str(session_id): {"count": count,
+                  "mean": total / count, "max": maximum}
+                  for (session_id, (count, total, maximum)) in
+                  sorted(self._session_drift.items(), key=str)}
+          }
+      }, summary_file, indent=1)
+
+  def summary(self):
+    lines = []
+    for (title, histograms) in [("latency", self._latencies),
+        ("schedule lag", self._lags)]:
+      for (action_name, windows) in self._summarize(histograms).items():
+        for (window, entry) in windows.items():
+          lines.append(
+              "{title} (s) {action}/{window}: n={count} mean={mean:.6f} "
+              "p50={p50:.6f} p99={p99:.6f} p99.9={p999:.6f} "
+              "max={max:.6f}".format(title=title, action=action_name,
+                  window=window, p999=entry["p99.9"], **entry))
+    if self._errors:
+      lines.append("errors: " + " ".join("%s=%d" % (action_name, count)
+          for (action_name, count) in sorted(self._errors.items())))
+    if self._dropped_sessions:
+      lines.append("dropped sessions: %d" % self._dropped_sessions)
+    if self._drift.count():
+      entry = self._summarize_histogram(self._drift)
+      lines.append("timer drift (s): n={count} mean={mean:.6f} p99={p99:.6f} "
+          "max={max:.6f}".format(**entry))
+    if self._throughput:
+      lines.append("throughput (actions/s): mean={mean:.2f} max={max}".format(
+          mean=sum(self._throughput.values()) / len(self._throughput),
+          max=max(self._throughput.values())))
+    return "\n".join(lines)
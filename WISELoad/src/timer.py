@@ -0,0 +1,114 @@
+import bisect
+import math
+import os
+import threading
+import time
+
+
+class BurstSchedule:
+  """Burst in effect at a monotonic time, precomputed per interval between
+  burst boundaries so that a lookup is a single bisection."""
+
+  def __init__(self, burstiness):
+    self._boundaries = sorted({burst["start_at"] for burst in burstiness} |
+        {burst["stop_at"] for burst in burstiness})
+    self._intervals = []
+    points = [self._boundaries[0] - 1.0] if self._boundaries else [0.0]
+    points += [(start + stop) / 2 for (start, stop) in
+        zip(self._boundaries, self._boundaries[1:])]
+    points += [self._boundaries[-1] + 1.0] if self._boundaries else []
+    for point in points:
+      speed_up_factor = 1.0
+      arrival_rate = None
+      window = None
+      for (i, burst) in enumerate(burstiness):
+        if point > burst["start_at"] and point < burst["stop_at"]:
+          speed_up_factor = float(burst["speed_up_factor"])
+          arrival_rate = burst["arrival_rate"]
+          if window is None:
+            window = "burst-%d" % i
+      self._intervals.append((speed_up_factor, window or "steady",
+          arrival_rate))
+
+  def lookup(self, t):
+    """Return the (speed up factor, window, arrival rate override) at |t|."""
+    return self._intervals[bisect.bisect_right(self._boundaries, t)]
+
+  def speed_up_factor(self, t):
+    return self.lookup(t)[0]
+
+  def window(self, t):
+    return self.lookup(t)[1]
+
+
+class TimerWheel:
+  """Hashed timer wheel that wakes threads at absolute monotonic deadlines,
+  advanced one tick at a time by a single thread while timers are pending."""
+
+  def __init__(self, tick=0.001, no_slots=1024):
+    self._tick = tick
+    self._slots = [[] for i in range(no_slots)]
+    self._condition = threading.Condition()
+    self._origin = time.monotonic()
+    self._current_tick = 0
+    self._no_timers = 0
+    self._thread = threading.Thread(target=self._run, daemon=True)
+    self._thread.start()
+
+  def _now_tick(self):
+    return math.floor((time.monotonic() - self._origin) / self._tick)
+
+  def sleep_until(self, deadline):
+    """Block until |deadline| and return the monotonic time of the wake up."""
+    tick = math.ceil((deadline - self._origin) / self._tick)
+    event = threading.Event()
+    with self._condition:
+      if self._no_timers == 0:
+        self._current_tick = self._now_tick()
+      if tick <= self._current_tick:
+        return time.monotonic()
+      self._slots[tick % len(self._slots)].append((tick, event))
+      self._no_timers += 1
+      self._condition.notify()
+    event.wait()
+    return time.monotonic()
+
+  def _run(self):
+    while True:
+      with self._condition:
+        while self._no_timers == 0:
+          self._condition.wait()
+        next_tick = self._current_tick + 1
+      time.sleep(max(0,
+          self._origin + next_tick * self._tick - time.monotonic()))
+      due = []
+      with self._condition:
+        now_tick = self._now_tick()
+        # [NOTE] If the thread fell behind by more than a revolution, one pass
+        # over every slot fires everything that is due.
+        for tick in range(self._current_tick + 1,
+            min(now_tick, self._current_tick + len(self._slots)) + 1):
+          slot = self._slots[tick % len(self._slots)]
+          if slot:
+            due.extend(event for (t, event) in slot if t <= now_tick)
+            slot[:] = [(t, event) for (t, event) in slot if t > now_tick]
+        self._current_tick = max(self._current_tick, now_tick)
+        self._no_timers -= len(due)
+      for event in due:
+        event.set()
+
+
+_timer_wheel = None
+_timer_wheel_pid = None
+_timer_wheel_lock = threading.Lock()
+
+
+def timer_wheel():
+  """Return the timer wheel of this process, creating it on first use."""
+  global _timer_wheel, _timer_wheel_pid
+  with _timer_wheel_lock:
+    # [NOTE] The wheel's thread does not survive a fork.
+    if _timer_wheel is None or _timer_wheel_pid != os.getpid():
+      _timer_wheel = TimerWheel()
+      _timer_wheel_pid = os.getpid()
+    return _timer_wheel
@@ -0,0 +1,89 @@
+import random
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+
+class TransitionTable:
+  """Dense Markov transition matrix over the actions of a session, with one
+  Walker alias table per row so that the next action is drawn in O(1)."""
+
+  def __init__(self, actions):
+    self._actions = list(actions.values())
+    self._indices = {action.name(): i for (i, action) in
+        enumerate(self._actions)}
+    n = len(self._actions)
+    self._matrix = [[0.0] * n for i in range(n)]
+    for (i, action) in enumerate(self._actions):
+      weights = action.transition_weights()
+      total_weight = sum(weights.values())
+      for (name, weight) in weights.items():
+        self._matrix[i][self._indices[name]] += weight / total_weight
+    self._probabilities = []
+    self._aliases = []
+    for row in self._matrix:
+      probabilities, aliases = self._alias_table(row)
+      self._probabilities.append(probabilities)
+      self._aliases.append(aliases)
+    self._n = n
+
+  @staticmethod
+  def _alias_table(row):
+    # Vose's method.
+    n = len(row)
+    scaled = [p * n for p in row]
+    probabilities = [1.0] * n
+    aliases = list(range(n))
+    small = [i for (i, p) in enumerate(scaled) if p < 1.0]
+    large = [i for (i, p) in enumerate(scaled) if p >= 1.0]
+    while small and large:
+      i = small.pop()
+      j = large.pop()
+      probabilities[i] = scaled[i]
+      aliases[i] = j
+      scaled[j] -= 1.0 - scaled[i]
+      if scaled[j] < 1.0:
+        small.append(j)
+      else:
+        large.append(j)
+    return probabilities, aliases
+
+  def actions(self):
+    return self._actions
+
+  def index(self, action_name):
+    return self._indices[action_name]
+
+  def matrix(self):
+    return self._matrix
+
+  def next(self, i, rng=random):
+    u = rng.random() * self._n
+    k = int(u)
+    if u - k < self._probabilities[i][k]:
+      return k
+    return self._aliases[i][k]
+
+  def trajectories(self, n_sessions, length, seed=None, speed_up_factor=1.0):
+    """Return (actions, delays), two |n_sessions| x |length| arrays holding
+    the action indices of each session and the think time before each."""
+    if np is None:
+      raise RuntimeError("Vectorized trajectories require NumPy")
+    rng = np.random.default_rng(seed)
+    probabilities = np.array(self._probabilities)
+    aliases = np.array(self._aliases)
+    actions = np.zeros((n_sessions, length), dtype=np.int32)
+    for t in range(1, length):
+      u = rng.random(n_sessions) * self._n
+      k = u.astype(np.int32)
+      current = actions[:, t - 1]
+      actions[:, t] = np.where(u - k < probabilities[current, k], k,
+          aliases[current, k])
+    delays = np.empty((n_sessions, length), dtype=np.float64)
+    for (i, action) in enumerate(self._actions):
+      mask = actions == i
+      delays[mask] = action.sample_delays(rng, int(mask.sum())) / \
+          speed_up_factor
+    return actions, delays
@@ -0,0 +1,55 @@
+import os
+import threading
+
+try:
+  import requests
+  import requests.adapters
+except ImportError:
+  requests = None
+
+
+class HttpTransport:
+  """HTTP client that keeps connections to each host open across requests,
+  with at most |max_connections| of them per host."""
+
+  def __init__(self, max_connections=1, keep_alive=True):
+    if requests is None:
+      raise RuntimeError("The HTTP transport requires requests")
+    self._session = requests.Session()
+    # [NOTE] With a blocking pool, a request waits for a free connection
+    # instead of opening one more that would be dropped right after.
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+        pool_maxsize=max_connections, pool_block=True)
+    self._session.mount("http://", adapter)
+    self._session.mount("https://", adapter)
+    if not keep_alive:
+      self._session.headers["Connection"] = "close"
+
+  def get(self, url, **kwargs):
+    return self._session.get(url, **kwargs)
+
+  def post(self, url, **kwargs):
+    return self._session.post(url, **kwargs)
+
+  def close(self):
+    self._session.close()
+
+
+_shared_transports = {}
+_shared_transports_pid = None
+_shared_transports_lock = threading.Lock()
+
+
+def shared_http_transport(max_connections, keep_alive=True):
+  """Return the transport of this process with the given options, so that
+  every session of the process draws from a single connection pool."""
+  global _shared_transports_pid
+  with _shared_transports_lock:
+    # [NOTE] Pooled sockets must not be shared with a forked process.
+    if _shared_transports_pid != os.getpid():
+      _shared_transports.clear()
+      _shared_transports_pid = os.getpid()
+    key = (max_connections, keep_alive)
+    if key not in _shared_transports:
+      _shared_transports[key] = HttpTransport(max_connections, keep_alive)
+    return _shared_transports[key]
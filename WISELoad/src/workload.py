@@ -1,37 +1,141 @@
-import datetime
+import copy
+import multiprocessing
 import threading
+import time
 
 import yaml
 
+from .open_loop_session_group import OpenLoopSessionGroup
+from .schedule import Schedule, write_schedule
 from .session_group import SessionGroup
+from .metrics import serve_metrics
+from .stats import Stats
+from .timer import BurstSchedule
 
 
 class Workload:
-  def __init__(self, session_cls, config_filename, *args):
+  _session_group_cls = SessionGroup
+  _open_loop_session_group_cls = OpenLoopSessionGroup
+
+  def __init__(self, session_cls, config_filename, *args, seed=None):
     with open(config_filename) as config_file:
       config = yaml.safe_load(config_file)
-    now = datetime.datetime.now()
+    self._setup(session_cls, config, args, seed)
+
+  @classmethod
+  def from_schedule(cls, session_cls, schedule_filename, *args):
+    schedule = Schedule(schedule_filename)
+    workload = cls.__new__(cls)
+    workload._setup(session_cls, schedule.workload_config(), args,
+        schedule.seed())
+    for (sg_spec, sg) in zip(workload._config, workload._session_groups):
+      sg.set_schedule(schedule, sg_spec["firstSessionId"],
+          sg_spec["noSessions"], sg_spec["startTime"])
+    return workload
+
+  def _setup(self, session_cls, config, args, seed):
+    self._config = config
+    self._seed = seed
+    self._shard_id = 0
+    self._metrics_port = None
+    # [NOTE] Every time in the workload is an absolute reading of the
+    # monotonic clock, so wall-clock adjustments during a run shift nothing.
+    self._epoch = time.monotonic()
     self._session_groups = [
-        SessionGroup(session_cls, args,
-            config_filename=sg_spec["sessionConfig"],
-            no_concurrent_sessions=sg_spec["noConcurrentSessions"],
-            ramp_up_duration=datetime.timedelta(
-                seconds=sg_spec["rampUpDuration"]),
-            ramp_down_duration=datetime.timedelta(
-                seconds=sg_spec["rampDownDuration"]),
-            start_at=now + datetime.timedelta(seconds=sg_spec["startTime"]),
-            stop_at=now + datetime.timedelta(seconds=sg_spec["endTime"]),
-            burstiness=[{"speed_up_factor": burst_spec["speedUpFactor"],
-                "start_at": now + \
-                    datetime.timedelta(seconds=burst_spec["startTime"]),
-                "stop_at": now + \
-                    datetime.timedelta(seconds=burst_spec["endTime"])}
-                for burst_spec in sg_spec.get("burstiness", [])])
-        for sg_spec in config]
-
-  def start(self):
+        self._session_group(session_cls, args, self._epoch, sg_spec, i,
+            None if seed is None else "%s:%d" % (seed, i))
+        for (i, sg_spec) in enumerate(config)]
+
+  def _session_group(self, session_cls, args, epoch, sg_spec, group_id,
+      seed):
+    start_at = epoch + sg_spec["startTime"]
+    stop_at = epoch + sg_spec["endTime"]
+    burst_schedule = BurstSchedule([
+        {"speed_up_factor": burst_spec["speedUpFactor"],
+            "arrival_rate": burst_spec.get("arrivalRate", None),
+            "start_at": epoch + burst_spec["startTime"],
+            "stop_at": epoch + burst_spec["endTime"]}
+        for burst_spec in sg_spec.get("burstiness", [])])
+    if "arrivalRate" in sg_spec:
+      return self._open_loop_session_group_cls(session_cls, args,
+          config_filename=sg_spec["sessionConfig"],
+          arrival_rate=sg_spec["arrivalRate"],
+          session_length=sg_spec["sessionLength"],
+          max_concurrent_sessions=sg_spec.get("maxConcurrentSessions", 1024),
+          start_at=start_at, stop_at=stop_at, burst_schedule=burst_schedule,
+          group_id=group_id, seed=seed)
+    return self._session_group_cls(session_cls, args,
+        config_filename=sg_spec["sessionConfig"],
+        no_concurrent_sessions=sg_spec["noConcurrentSessions"],
+        ramp_up_duration=sg_spec["rampUpDuration"],
+        ramp_down_duration=sg_spec["rampDownDuration"],
+        start_at=start_at, stop_at=stop_at, burst_schedule=burst_schedule,
+        group_id=group_id, seed=seed)
+
+  def config(self):
+    return self._config
+
+  def epoch(self):
+    return self._epoch
+
+  def session_groups(self):
+    return self._session_groups
+
+  def write_schedule(self, filename):
+    write_schedule(self, self._seed, filename)
+
+  def no_concurrent_sessions(self):
+    return sum(sg.no_concurrent_sessions() for sg in self._session_groups)
+
+  def shard(self, shard_id, no_shards):
+    workload = copy.copy(self)
+    workload._shard_id = shard_id
+    workload._session_groups = [sg.shard(shard_id, no_shards)
+        for sg in self._session_groups]
+    return workload
+
+  def stats(self):
+    stats = Stats()
+    for sg in self._session_groups:
+      stats.merge(sg.stats())
+    return stats
+
+  def start(self, processes=1, metrics_port=None):
+    """Run the workload and return its stats. With |metrics_port| set, live
+    metrics are served over HTTP while it runs, by process i on
+    |metrics_port| + i."""
+    self._metrics_port = metrics_port
+    if processes == 1:
+      return self._run_with_metrics()
+    # [NOTE] Every shard keeps the absolute start and stop times computed in
+    # the constructor. The monotonic clock is system-wide, so all processes
+    # follow the same schedule.
+    with multiprocessing.Pool(processes) as pool:
+      shard_stats = pool.map(_run_shard,
+          [self.shard(i, processes) for i in range(processes)])
+    stats = Stats()
+    for shard_stat in shard_stats:
+      stats.merge(shard_stat)
+    return stats
+
+  def _run_with_metrics(self):
+    if self._metrics_port is None:
+      return self._run()
+    server = serve_metrics(self._metrics_port + self._shard_id)
+    try:
+      return self._run()
+    finally:
+      server.shutdown()
+      server.server_close()
+
+  def _run(self):
     threads = [threading.Thread(target=sg.start) for sg in self._session_groups]
     for thread in threads:
       thread.start()
     for thread in threads:
       thread.join()
+    return self.stats()
+
+
+def _run_shard(workload):
+  return workload._run_with_metrics()
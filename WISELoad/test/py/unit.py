@@ -0,0 +1,242 @@
+from collections import Counter, OrderedDict
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import yaml
+
+sys.path.insert(0,
+    os.path.join(os.path.abspath(os.path.dirname(__file__)), "..", "..", ".."))
+
+from WISELoad.src.action import Action
+from WISELoad.src.async_workload import AsyncWorkload
+from WISELoad.src.delay import UniformDelay
+from WISELoad.src.histogram import Histogram
+from WISELoad.src.schedule import Schedule
+from WISELoad.src.session import Session
+from WISELoad.src.transition_table import TransitionTable, np
+from WISELoad.src.workload import Workload
+
+
+def write_yaml(directory, filename, content):
+  path = os.path.join(directory, filename)
+  with open(path, "w") as yaml_file:
+    yaml.safe_dump(content, yaml_file)
+  return path
+
+
+class FailingSession(Session):
+  """Session whose action fails every other time."""
+
+  def __init__(self, config_filename):
+    super().__init__(config_filename)
+    self._no_calls = 0
+
+  async def act(self):
+    self._no_calls += 1
+    if self._no_calls % 2 == 0:
+      raise ValueError("Failed action")
+
+
+class ErrorSession(Session):
+  """Session whose synchronous action records many errors."""
+
+  def act(self):
+    for i in range(100):
+      self.record_error("act")
+
+
+class SlowSession(Session):
+  """Session whose action is slow, keeping count of the sessions acting at
+  once."""
+
+  lock = threading.Lock()
+  no_acting = 0
+  max_acting = 0
+
+  def act(self):
+    with SlowSession.lock:
+      SlowSession.no_acting += 1
+      SlowSession.max_acting = max(SlowSession.max_acting,
+          SlowSession.no_acting)
+    time.sleep(0.1)
+    with SlowSession.lock:
+      SlowSession.no_acting -= 1
+
+
+class TestHistogram(unittest.TestCase):
+  def testEmpty(self):
+    histogram = Histogram()
+    self.assertEqual(histogram.count(), 0)
+    self.assertIsNone(histogram.mean())
+    self.assertIsNone(histogram.percentile(50.0))
+
+  def testExactBelowSubBuckets(self):
+    histogram = Histogram()
+    for value in range(100):
+      histogram.record(value)
+    self.assertEqual(histogram.count(), 100)
+    self.assertEqual(histogram.min(), 0)
+    self.assertEqual(histogram.max(), 99)
+    self.assertEqual(histogram.mean(), 49.5)
+    self.assertEqual(histogram.percentile(50.0), 49)
+    self.assertEqual(histogram.percentile(100.0), 99)
+
+  def testPrecision(self):
+    histogram = Histogram(significant_digits=2)
+    values = [int(1.1 ** i) for i in range(200)]
+    for value in values:
+      histogram.record(value)
+    values.sort()
+    for percentile in [1.0, 25.0, 50.0, 90.0, 99.0, 99.9]:
+      exact = values[max(1, math.ceil(percentile / 100.0 * len(values))) - 1]
+      self.assertAlmostEqual(histogram.percentile(percentile), exact,
+          delta=exact * 0.01 + 1)
+
+  def testMerge(self):
+    histogram, other = Histogram(), Histogram()
+    histogram.record(10, count=3)
+    other.record(1000)
+    histogram.merge(other)
+    self.assertEqual(histogram.count(), 4)
+    self.assertEqual(histogram.min(), 10)
+    self.assertEqual(histogram.max(), 1000)
+    self.assertEqual(histogram.percentile(75.0), 10)
+
+  def testMergeDifferentPrecisions(self):
+    with self.assertRaises(ValueError):
+      Histogram(2).merge(Histogram(3))
+
+
+class TestTransitionTable(unittest.TestCase):
+  def setUp(self):
+    delay = UniformDelay(1.0, 2.0)
+    self._table = TransitionTable(OrderedDict((name, Action(name, delay,
+        weights)) for (name, weights) in [
+            ("a", {"a": 1, "b": 2, "c": 5}),
+            ("b", {"c": 1}),
+            ("c", {"a": 3, "b": 1})]))
+
+  def testMatrix(self):
+    matrix = self._table.matrix()
+    self.assertEqual(self._table.index("b"), 1)
+    for row in matrix:
+      self.assertAlmostEqual(sum(row), 1.0)
+    self.assertAlmostEqual(matrix[0][2], 5 / 8)
+    self.assertEqual(matrix[1], [0.0, 0.0, 1.0])
+
+  def testNextFollowsTheMatrix(self):
+    rng = random.Random(1)
+    no_draws = 20000
+    for (i, row) in enumerate(self._table.matrix()):
+      counts = Counter(self._table.next(i, rng) for k in range(no_draws))
+      for (j, probability) in enumerate(row):
+        if probability == 0.0:
+          self.assertEqual(counts[j], 0)
+        else:
+          self.assertAlmostEqual(counts[j] / no_draws, probability,
+              delta=0.02)
+
+  @unittest.skipIf(np is None, "NumPy is not installed")
+  def testTrajectories(self):
+    actions, delays = self._table.trajectories(1000, 20, seed=1,
+        speed_up_factor=2.0)
+    self.assertEqual(actions.shape, (1000, 20))
+    self.assertTrue((actions[:, 0] == 0).all())
+    # "b" is always followed by "c".
+    self.assertTrue((actions[:, 1:][actions[:, :-1] == 1] == 2).all())
+    self.assertTrue(((delays >= 0.5) & (delays <= 1.0)).all())
+    same_actions, same_delays = self._table.trajectories(1000, 20, seed=1,
+        speed_up_factor=2.0)
+    self.assertTrue((actions == same_actions).all())
+    self.assertTrue((delays == same_delays).all())
+
+
+class TestAsyncWorkload(unittest.TestCase):
+  def setUp(self):
+    self._directory = tempfile.TemporaryDirectory()
+    self._session_config = write_yaml(self._directory.name, "session.yml", [{
+        "action": "act",
+        "delayDistribution": {"type": "uniform", "start": 0.01, "end": 0.02},
+        "transitionWeights": {"act": 1}}])
+
+  def tearDown(self):
+    self._directory.cleanup()
+
+  def _closed_loop(self, no_sessions, duration):
+    return write_yaml(self._directory.name, "workload.yml", [{
+        "sessionConfig": self._session_config,
+        "noConcurrentSessions": no_sessions, "rampUpDuration": 0,
+        "rampDownDuration": 0, "startTime": 0, "endTime": duration}])
+
+  def testFailedActionsAreErrors(self):
+    stats = AsyncWorkload(FailingSession, self._closed_loop(4, 0.5),
+        seed=1).start()
+    self.assertGreater(stats.errors()["act"], 0)
+    # [NOTE] Sessions go on after a failure, so about as many actions succeed
+    # as fail.
+    self.assertGreaterEqual(stats.counts()["act"], stats.errors()["act"])
+
+  def testErrorsOfExecutorThreadsAreAllCounted(self):
+    stats = AsyncWorkload(ErrorSession, self._closed_loop(8, 0.5),
+        seed=1).start()
+    self.assertEqual(stats.errors()["act"], 100 * stats.counts()["act"])
+
+  def testMaxConcurrentSessions(self):
+    workload_config = write_yaml(self._directory.name, "open_loop.yml", [{
+        "sessionConfig": self._session_config, "arrivalRate": 100.0,
+        "sessionLength": 2, "maxConcurrentSessions": 2, "startTime": 0,
+        "endTime": 0.5}])
+    stats = AsyncWorkload(SlowSession, workload_config, seed=1).start()
+    self.assertGreater(stats.dropped_sessions(), 0)
+    self.assertGreater(stats.counts()["act"], 0)
+    self.assertLessEqual(SlowSession.max_acting, 2)
+
+
+class TestScheduleReplay(unittest.TestCase):
+  def setUp(self):
+    self._directory = tempfile.TemporaryDirectory()
+    session_config = write_yaml(self._directory.name, "session.yml", [{
+        "action": "act",
+        "delayDistribution": {"type": "uniform", "start": 0.5, "end": 1.0},
+        "transitionWeights": {"act": 1}}])
+    workload_config = write_yaml(self._directory.name, "workload.yml", [
+        {"sessionConfig": session_config, "noConcurrentSessions": 2,
+            "rampUpDuration": 2, "rampDownDuration": 0, "startTime": 0,
+            "endTime": 10},
+        {"sessionConfig": session_config, "noConcurrentSessions": 4,
+            "rampUpDuration": 4, "rampDownDuration": 0, "startTime": 5,
+            "endTime": 20}])
+    self._schedule_filename = os.path.join(self._directory.name, "schedule")
+    self._workload = Workload(Session, workload_config, seed=1)
+    self._workload.write_schedule(self._schedule_filename)
+    self._replay = Workload.from_schedule(Session, self._schedule_filename)
+
+  def tearDown(self):
+    self._directory.cleanup()
+
+  def testSessionsStartAtTheirRecordedOffset(self):
+    for (sg, replayed_sg) in zip(self._workload.session_groups(),
+        self._replay.session_groups()):
+      for i in range(sg.no_concurrent_sessions()):
+        start_at = sg.session_schedule(i)[0] - self._workload.epoch()
+        replayed_start_at = \
+            replayed_sg.session_schedule(i)[0] - self._replay.epoch()
+        self.assertAlmostEqual(start_at, replayed_start_at)
+
+  def testSessionsReplayTheirGroupOnly(self):
+    # [NOTE] With a schedule of one session, the second session of the
+    # group must not replay the first session of the next group.
+    sg = self._replay.session_groups()[0]
+    sg.set_schedule(Schedule(self._schedule_filename), 0, 1, 0)
+    self.assertGreater(len(list(sg.session(0).steps(None))), 0)
+    self.assertEqual(list(sg.session(1).steps(None)), [])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -6,6 +6,7 @@ sys.path.insert(0,
 
 from auth.src.py.gen_auth.auth.ttypes import TAccount, \
     TInvalidCredentialsException
+from auth.src.py.gen_auth.auth import TAuthService
 from auth.src.py.client import Client
 
 sys.path = original_sys_path
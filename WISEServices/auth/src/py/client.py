@@ -1,6 +1,7 @@
 from thrift.transport import TSocket
 from thrift.transport import TTransport
 from thrift.protocol import TBinaryProtocol
+import wise_rpc
 
 from .gen_auth.auth import TAuthService
 
@@ -21,6 +22,9 @@ class Client:
     if self._transport.isOpen():
       self._transport.close()
 
+  def is_open(self):
+    return wise_rpc.is_connection_open(self._transport, self._socket)
+
   def sign_up(self, username, password, first_name, last_name):
     return self._tclient.sign_up(username=username, password=password,
         first_name=first_name, last_name=last_name)
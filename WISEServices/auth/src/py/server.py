@@ -1,72 +1,81 @@
 import datetime
 
 import click
-import psycopg2
 from thrift.transport import TSocket
 from thrift.transport import TTransport
 from thrift.protocol import TBinaryProtocol
 from thrift.server.TServer import TThreadPoolServer
+import wise_db
+from wise_rpc import tracing
 
 from gen_auth.auth import TAuthService
 from gen_auth.auth.ttypes import TAccount, TInvalidCredentialsException
 
 
+SIGN_UP = wise_db.Statement("sign_up", """
+    INSERT INTO Accounts (username, password, first_name, last_name,
+        created_at)
+    VALUES ($1, $2, $3, $4, $5)
+    RETURNING id
+    """)
+
+SIGN_IN = wise_db.Statement("sign_in", """
+    SELECT id, password, first_name, last_name, created_at
+    FROM Accounts
+    WHERE username = $1
+    """)
+
+
 class Handler:
-  def __init__(self, db_host, db_user):
-    self._db_host = db_host
-    self._db_user = db_user
+  def __init__(self, db):
+    self._db = db
 
   def sign_up(self, username, password, first_name, last_name):
-    conn = psycopg2.connect("dbname='{dbname}' host='{host}' user={dbuser}".format(
-        dbname="microblog_bench", host=self._db_host, dbuser=self._db_user))
-    cursor = conn.cursor()
-    now = datetime.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
-    cursor.execute("""
-        INSERT INTO Accounts (username, password, first_name, last_name,
-            created_at)
-        VALUES ('{username}', '{password}', '{first_name}', '{last_name}',
-            '{now}')
-        RETURNING id
-        """.format(username=username, password=password, first_name=first_name,
-            last_name=last_name, now=now))
-    account_id = cursor.fetchone()[0]
-    conn.commit()
-    conn.close()
-    return TAccount(id=account_id, username=username, first_name=first_name,
-        last_name=last_name, created_at=now)
+    with self._db.connection() as conn:
+      cursor = conn.cursor()
+      now = datetime.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+      with tracing.span("query"):
+        SIGN_UP.execute(cursor, username, password, first_name, last_name, now)
+      account_id = cursor.fetchone()[0]
+      with tracing.span("commit"):
+        conn.commit()
+      return TAccount(id=account_id, username=username, first_name=first_name,
+          last_name=last_name, created_at=now)
 
   def sign_in(self, username, password):
-    conn = psycopg2.connect("dbname='{dbname}' host='{host}' user={dbuser}".format(
-        dbname="microblog_bench", host=self._db_host, dbuser=self._db_user))
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, password, first_name, last_name, created_at
-        FROM Accounts
-        WHERE username = '{username}'
-        """.format(username=username))
-    row = cursor.fetchone()
-    conn.commit()
-    conn.close()
-    if row is None:
-      raise TInvalidCredentialsException()
-    account_id, password_, first_name, last_name, created_at = row
-    if password != password_:
-      raise TInvalidCredentialsException()
-    return TAccount(id=account_id, username=username, first_name=first_name,
-        last_name=last_name, created_at=created_at)
+    with self._db.connection() as conn:
+      cursor = conn.cursor()
+      with tracing.span("query"):
+        SIGN_IN.execute(cursor, username)
+      row = cursor.fetchone()
+      with tracing.span("commit"):
+        conn.commit()
+      if row is None:
+        raise TInvalidCredentialsException()
+      account_id, password_, first_name, last_name, created_at = row
+      if password != password_:
+        raise TInvalidCredentialsException()
+      return TAccount(id=account_id, username=username, first_name=first_name,
+          last_name=last_name, created_at=created_at)
 
 
 class Server:
-  def __init__(self, ip_address, port, thread_pool_size, db_host, db_user):
+  def __init__(self, ip_address, port, thread_pool_size, db_host, db_user,
+      db_max_lifetime=600.0, db_stats_interval=10.0):
     self._ip_address = ip_address
     self._port = port
     self._thread_pool_size = thread_pool_size
     self._db_host = db_host
     self._db_user = db_user
+    self._db_max_lifetime = db_max_lifetime
+    self._db_stats_interval = db_stats_interval
 
   def serve(self):
-    handler = Handler(self._db_host, self._db_user)
-    processor = TAuthService.Processor(handler)
+    db = wise_db.create_pool(self._db_host, self._db_user,
+        self._thread_pool_size, self._db_max_lifetime,
+        self._db_stats_interval)
+    handler = Handler(db)
+    processor = tracing.TracingProcessor(TAuthService.Processor(handler))
     transport = TSocket.TServerSocket(host=self._ip_address, port=self._port)
     tfactory = TTransport.TBufferedTransportFactory()
     pfactory = TBinaryProtocol.TBinaryProtocolFactory()
@@ -81,8 +90,19 @@ class Server:
 @click.option("--thread_pool_size", prompt="Thread pool size", type=click.INT)
 @click.option("--db_host", prompt="PostgreSQL host")
 @click.option("--db_user", prompt="PostgreSQL user")
-def main(ip_address, port, thread_pool_size, db_host, db_user):
-  server = Server(ip_address, port, thread_pool_size, db_host, db_user)
+# Directory to write the spans of the server to when it exits; tracing is
+# disabled if unset.
+@click.option("--trace_dir", envvar="WISE_TRACE_DIR", default=None)
+@click.option("--db_max_lifetime", default=600.0, type=click.FLOAT)
+# Period (seconds) of the database pool stats written to the log; 0 disables
+# them.
+@click.option("--db_stats_interval", default=10.0, type=click.FLOAT)
+def main(ip_address, port, thread_pool_size, db_host, db_user, trace_dir,
+    db_max_lifetime, db_stats_interval):
+  if trace_dir is not None:
+    tracing.configure("auth", trace_dir)
+  server = Server(ip_address, port, thread_pool_size, db_host, db_user,
+      db_max_lifetime, db_stats_interval)
   server.serve()
 
 
@@ -0,0 +1,10 @@
+import os, sys
+original_sys_path = sys.path
+sys.path.insert(0,
+    os.path.join(os.path.abspath(os.path.dirname(__file__)),
+        "..", "..", "..", ".."))
+
+from db.src.py.pool import ConnectionPool, create_pool
+from db.src.py.statement import Statement
+
+sys.path = original_sys_path
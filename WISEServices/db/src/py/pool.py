@@ -0,0 +1,188 @@
+import collections
+import contextlib
+import json
+import sys
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+from db.src.py.statement import Connection
+from rpc.src.py import tracing
+
+
+class _Timer:
+  """Count, total and maximum of a duration."""
+
+  def __init__(self):
+    self.count = 0
+    self.total = 0.0
+    self.max = 0.0
+
+  def record(self, duration):
+    self.count += 1
+    self.total += duration
+    self.max = max(self.max, duration)
+
+  def stats(self):
+    return {"count": self.count, "total": self.total, "max": self.max,
+        "mean": self.total / self.count if self.count else 0.0}
+
+
+class ConnectionPool:
+  """Thread-safe pool of at most |max_size| PostgreSQL connections, meant to
+  be sized to the thread pool of the server using it.
+
+  Connections are closed once they are |max_lifetime| seconds old, and
+  checked with a round trip when taken from the pool after more than
+  |validation_interval| seconds of idleness. A connection given back in a
+  transaction is rolled back, and dropped if it is broken."""
+
+  def __init__(self, dsn, max_size=32, max_lifetime=600.0,
+      validation_interval=30.0):
+    self._dsn = dsn
+    self._max_lifetime = max_lifetime
+    self._validation_interval = validation_interval
+    self._semaphore = threading.BoundedSemaphore(max_size)
+    self._lock = threading.Lock()
+    # (connection, creation time, time at which it was returned to the
+    # pool), most recently returned last.
+    self._idle = collections.deque()
+    self._in_use = 0
+    # Time spent waiting for a connection to be free, and to check one out
+    # including that wait, validation and connection.
+    self._wait_time = _Timer()
+    self._checkout_time = _Timer()
+    self._counts = collections.Counter()
+
+  def _connect(self):
+    with tracing.span("connect"):
+      conn = psycopg2.connect(self._dsn, connection_factory=Connection)
+    with self._lock:
+      self._counts["connects"] += 1
+    return conn, time.monotonic()
+
+  def _close(self, conn, reason):
+    with self._lock:
+      self._counts[reason] += 1
+    try:
+      conn.close()
+    except psycopg2.Error:
+      pass
+
+  def _is_valid(self, conn, returned_at, now):
+    if conn.closed:
+      return False
+    if now - returned_at < self._validation_interval:
+      return True
+    try:
+      with conn.cursor() as cursor:
+        cursor.execute("SELECT 1")
+      conn.rollback()
+    except psycopg2.Error:
+      return False
+    return True
+
+  def _acquire(self):
+    while True:
+      with self._lock:
+        if not self._idle:
+          break
+        conn, created_at, returned_at = self._idle.pop()
+      now = time.monotonic()
+      if now - created_at > self._max_lifetime:
+        self._close(conn, "expired")
+      elif not self._is_valid(conn, returned_at, now):
+        self._close(conn, "invalid")
+      else:
+        return conn, created_at
+    return self._connect()
+
+  def _release(self, conn, created_at):
+    if not conn.closed and conn.get_transaction_status() != \
+        psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+      try:
+        conn.rollback()
+      except psycopg2.Error:
+        pass
+    if conn.closed or conn.get_transaction_status() != \
+        psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+      self._close(conn, "broken")
+      return
+    with self._lock:
+      self._idle.append((conn, created_at, time.monotonic()))
+
+  @contextlib.contextmanager
+  def connection(self):
+    """Check a connection out of the pool for the enclosed block."""
+    with tracing.span("checkout"):
+      started_at = time.perf_counter()
+      self._semaphore.acquire()
+      waited = time.perf_counter() - started_at
+      try:
+        conn, created_at = self._acquire()
+      except BaseException:
+        self._semaphore.release()
+        raise
+      checkout_time = time.perf_counter() - started_at
+    with self._lock:
+      self._in_use += 1
+      self._wait_time.record(waited)
+      self._checkout_time.record(checkout_time)
+    try:
+      yield conn
+    finally:
+      with self._lock:
+        self._in_use -= 1
+      self._release(conn, created_at)
+      self._semaphore.release()
+
+  def stats(self):
+    with self._lock:
+      stats = {
+          "in_use": self._in_use,
+          "idle": len(self._idle),
+          "wait_time": self._wait_time.stats(),
+          "checkout_time": self._checkout_time.stats()
+      }
+      for reason in ("connects", "expired", "invalid", "broken"):
+        stats[reason] = self._counts[reason]
+      return stats
+
+  def report_stats(self, interval, stream=sys.stdout):
+    """Write the stats of the pool as a line of JSON to |stream| every
+    |interval| seconds, from a background thread."""
+    def report():
+      while True:
+        time.sleep(interval)
+        stats = self.stats()
+        stats["time"] = time.time()
+        stream.write(json.dumps({"db_pool": stats}) + "\n")
+        stream.flush()
+    threading.Thread(target=report, daemon=True).start()
+
+  def close(self):
+    with self._lock:
+      idle = [conn for (conn, _, _) in self._idle]
+      self._idle.clear()
+    for conn in idle:
+      conn.close()
+
+
+def create_pool(db_host, db_user, thread_pool_size, max_lifetime=600.0,
+    stats_interval=10.0, no_background_threads=0):
+  """Pool of connections to the microblog_bench database for a server of
+  |thread_pool_size| threads, plus |no_background_threads| threads of its own
+  that use the database too, reporting its stats every |stats_interval|
+  seconds unless it is 0."""
+  # [NOTE] Each of these threads holds at most one connection at a time, so
+  # the pool never makes a call wait.
+  pool = ConnectionPool(
+      "dbname='{dbname}' host='{host}' user={dbuser}".format(
+          dbname="microblog_bench", host=db_host, dbuser=db_user),
+      max_size=thread_pool_size + no_background_threads,
+      max_lifetime=max_lifetime)
+  if stats_interval > 0:
+    pool.report_stats(stats_interval)
+  return pool
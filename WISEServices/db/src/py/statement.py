@@ -0,0 +1,44 @@
+import re
+
+import psycopg2.extensions
+
+
+class Connection(psycopg2.extensions.connection):
+  """Connection remembering the statements prepared in its session."""
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.prepared = set()
+
+
+class Statement:
+  """Query declared once, with parameters $1, $2, ..., and run as a
+  server-side prepared statement, so that Postgres parses and plans it once
+  per connection instead of once per call.
+
+  Parameters are bound by the driver, never formatted into the query."""
+
+  def __init__(self, name, sql):
+    self._name = name
+    self._sql = sql
+    no_params = max([int(index) for index in re.findall(r"\$(\d+)", sql)],
+        default=0)
+    self._execute_sql = "EXECUTE %s (%s)" % (name,
+        ", ".join(["%s"] * no_params)) if no_params else "EXECUTE " + name
+
+  def name(self):
+    return self._name
+
+  def sql(self):
+    return self._sql
+
+  def execute(self, cursor, *params):
+    """Run the statement with |params| on |cursor|, whose connection must
+    come from a wise_db.ConnectionPool."""
+    conn = cursor.connection
+    if self._name not in conn.prepared:
+      # [NOTE] Prepared statements belong to the session, not to the
+      # transaction, so they outlive a rollback.
+      cursor.execute("PREPARE %s AS %s" % (self._name, self._sql))
+      conn.prepared.add(self._name)
+    cursor.execute(self._execute_sql, params or None)
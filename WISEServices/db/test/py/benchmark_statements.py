@@ -0,0 +1,129 @@
+import os
+import sys
+import timeit
+
+import click
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.abspath(os.path.dirname(__file__)),
+    "..", "..", ".."))
+from db.src.py.statement import Connection, Statement
+
+
+# The queries of get_post, fetch and get_subscribers_of_channel, as formatted
+# by the handlers before and as declared statements now.
+QUERIES = [
+    ("get_post", """
+        SELECT author_id, parent_id, text, n_endorsements
+        FROM Posts
+        WHERE id = '{0}'
+        """, Statement("bench_get_post", """
+        SELECT author_id, parent_id, text, n_endorsements
+        FROM Posts
+        WHERE id = $1
+        """), lambda ids: (ids["post_id"],)),
+    ("fetch", """
+        SELECT id, text, created_at
+        FROM Messages
+        WHERE inbox_name = '{0}' AND id < {1}
+        ORDER BY id DESC
+        LIMIT {2}
+        """, Statement("bench_fetch", """
+        SELECT id, text, created_at
+        FROM Messages
+        WHERE inbox_name = $1 AND id < COALESCE($2, 2147483647)
+        ORDER BY id DESC
+        LIMIT $3
+        """), lambda ids: ("bench_inbox", ids["message_id"], 10)),
+    ("get_subscribers_of_channel", """
+        SELECT id, subscriber_id, created_at
+        FROM Subscriptions
+        WHERE channel_name = '{0}'
+        """, Statement("bench_get_subscribers_of_channel", """
+        SELECT id, subscriber_id, created_at
+        FROM Subscriptions
+        WHERE channel_name = $1
+        """), lambda ids: ("bench_channel",))
+]
+
+
+def populate(cursor, n):
+  """Insert |n| rows of benchmark data in each table; return the ids to
+  query."""
+  cursor.execute("""
+      INSERT INTO Posts (author_id, parent_id, text, created_at)
+      SELECT i, NULL, 'bench post ' || i, now() FROM generate_series(1, %s) i
+      RETURNING id
+      """, (n,))
+  post_id = cursor.fetchall()[-1][0]
+  cursor.execute("""
+      INSERT INTO Messages (inbox_name, text, created_at)
+      SELECT 'bench_inbox', 'bench message ' || i, now()
+      FROM generate_series(1, %s) i
+      RETURNING id
+      """, (n,))
+  # [NOTE] Pages are fetched from the middle of the inbox.
+  message_id = cursor.fetchall()[n // 2][0]
+  cursor.execute("""
+      INSERT INTO Subscriptions (subscriber_id, channel_name, created_at)
+      SELECT i, 'bench_channel', '2000-01-01-00-00-00'
+      FROM generate_series(1, %s) i
+      """, (n,))
+  return {"post_id": post_id, "message_id": message_id}
+
+
+def planning_time(cursor, sql):
+  cursor.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql)
+  return cursor.fetchone()[0][0]["Planning Time"]
+
+
+@click.command()
+@click.option("--db_host", prompt="PostgreSQL host")
+@click.option("--db_user", prompt="PostgreSQL user")
+@click.option("--n_rows", default=1000, type=click.INT)
+@click.option("--number", default=2000, type=click.INT)
+@click.option("--repeat", default=5, type=click.INT)
+def main(db_host, db_user, n_rows, number, repeat):
+  conn = psycopg2.connect(
+      "dbname='{dbname}' host='{host}' user={dbuser}".format(
+          dbname="microblog_bench", host=db_host, dbuser=db_user),
+      connection_factory=Connection)
+  cursor = conn.cursor()
+  # [NOTE] The benchmark data is inserted in a transaction that is rolled
+  # back at the end, leaving the database as it was.
+  ids = populate(cursor, n_rows)
+  cursor.execute("ANALYZE Posts, Messages, Subscriptions")
+  print("%28s %12s %12s %12s %8s" % ("query", "mode", "us/query",
+      "planning us", "speedup"))
+  for (name, formatted, statement, params) in QUERIES:
+    params = params(ids)
+    sql = formatted.format(*params)
+
+    def run_formatted():
+      cursor.execute(sql)
+      cursor.fetchall()
+
+    def run_prepared():
+      statement.execute(cursor, *params)
+      cursor.fetchall()
+
+    # [NOTE] Postgres plans the first 5 executions of a prepared statement for
+    # their parameters before settling on a generic plan, so it is warmed up
+    # first.
+    for _ in range(10):
+      run_prepared()
+    baseline = None
+    for (mode, run, explained) in [("format", run_formatted, sql),
+        ("prepared", run_prepared, cursor.mogrify("EXECUTE %s (%s)" % (
+            statement.name(), ", ".join(["%s"] * len(params))),
+            params).decode())]:
+      elapsed = min(timeit.repeat(run, number=number, repeat=repeat)) / number
+      baseline = baseline or elapsed
+      print("%28s %12s %12.1f %12.1f %7.1fx" % (name, mode, elapsed * 1e6,
+          planning_time(cursor, explained) * 1e3, baseline / elapsed))
+  conn.rollback()
+  conn.close()
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,19 @@
+-- Store the creation times of messages as timestamps rather than formatted
+-- strings, and index the pages of each inbox. Running this again does
+-- nothing.
+BEGIN;
+
+DO $$
+BEGIN
+  IF (SELECT data_type FROM information_schema.columns
+      WHERE table_name = 'messages' AND column_name = 'created_at') =
+      'character varying' THEN
+    ALTER TABLE Messages ALTER COLUMN created_at TYPE TIMESTAMP
+      USING to_timestamp(created_at, 'YYYY-MM-DD-HH24-MI-SS');
+  END IF;
+END
+$$;
+
+CREATE INDEX IF NOT EXISTS Messages_inbox_name_id ON Messages(inbox_name, id);
+
+COMMIT;
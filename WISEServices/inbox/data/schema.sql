@@ -3,5 +3,8 @@ CREATE TABLE Messages(
   id SERIAL PRIMARY KEY,
   inbox_name VARCHAR(512) NOT NULL,
   text TEXT NOT NULL,
-  created_at VARCHAR(64) NOT NULL
+  created_at TIMESTAMP NOT NULL
 );
+
+-- Pages of an inbox are read newest first, before a given id.
+CREATE INDEX Messages_inbox_name_id ON Messages(inbox_name, id);
@@ -5,6 +5,7 @@ sys.path.insert(0,
         "..", "..", "..", ".."))
 
 from inbox.src.py.gen_inbox.inbox.ttypes import TMessage
+from inbox.src.py.gen_inbox.inbox import TInboxService
 from inbox.src.py.client import Client
 
 sys.path = original_sys_path 
@@ -0,0 +1,9 @@
+#!/bin/bash
+
+# Change to the parent directory.
+cd "$(dirname "$(dirname "$(readlink -fm "$0")")")"
+
+# Migrate an existing database to the current schema.
+for migration in data/migrations/*.sql; do
+  psql -h $1 -d microblog_bench -v ON_ERROR_STOP=1 -f $migration || exit 1
+done
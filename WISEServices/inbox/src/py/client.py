@@ -1,6 +1,7 @@
 from thrift.transport import TSocket
 from thrift.transport import TTransport
 from thrift.protocol import TBinaryProtocol
+import wise_rpc
 
 from .gen_inbox.inbox import TInboxService
 
@@ -21,8 +22,11 @@ class Client:
     if self._transport.isOpen():
       self._transport.close()
 
+  def is_open(self):
+    return wise_rpc.is_connection_open(self._transport, self._socket)
+
   def push(self, inbox_name, message_text):
     return self._tclient.push(inbox_name=inbox_name, message_text=message_text)
 
-  def fetch(self, inbox_name, n, offset):
-    return self._tclient.fetch(inbox_name=inbox_name, n=n, offset=offset)
+  def fetch(self, inbox_name, n, before_id=None):
+    return self._tclient.fetch(inbox_name=inbox_name, n=n, before_id=before_id)
@@ -1,67 +1,82 @@
 import datetime
 
 import click
-import psycopg2
 from thrift.transport import TSocket
 from thrift.transport import TTransport
 from thrift.protocol import TBinaryProtocol
 from thrift.server.TServer import TThreadPoolServer
+import wise_db
+from wise_rpc import tracing
 
 from gen_inbox.inbox import TInboxService
 from gen_inbox.inbox.ttypes import TMessage
 
 
+# Format of the creation time of messages.
+TIMESTAMP_FORMAT = "%Y-%m-%d-%H-%M-%S"
+
+PUSH = wise_db.Statement("push", """
+    INSERT INTO Messages (inbox_name, text, created_at)
+    VALUES ($1, $2, $3)
+    RETURNING id
+    """)
+
+FETCH = wise_db.Statement("fetch", """
+    SELECT id, text, created_at
+    FROM Messages
+    WHERE inbox_name = $1 AND id < COALESCE($2, 2147483647)
+    ORDER BY id DESC
+    LIMIT $3
+    """)
+
+
 class Handler:
-  def __init__(self, db_host, db_user):
-    self._db_host = db_host
-    self._db_user = db_user
+  def __init__(self, db):
+    self._db = db
 
   def push(self, inbox_name, message_text):
-    conn = psycopg2.connect("dbname='{dbname}' host='{host}' user={dbuser}".format(
-        dbname="microblog_bench", host=self._db_host, dbuser=self._db_user))
-    cursor = conn.cursor()
-    now = datetime.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
-    cursor.execute("""
-        INSERT INTO Messages (inbox_name, text, created_at)
-        VALUES ('{inbox_name}', '{message_text}', '{now}')
-        RETURNING id
-        """.format(inbox_name=inbox_name, message_text=message_text, now=now))
-    message_id = cursor.fetchone()[0]
-    conn.commit()
-    conn.close()
-    return message_id
-
-  def fetch(self, inbox_name, n, offset):
-    conn = psycopg2.connect("dbname='{dbname}' host='{host}' user={dbuser}".format(
-        dbname="microblog_bench", host=self._db_host, dbuser=self._db_user))
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, text, created_at
-        FROM Messages
-        WHERE inbox_name = '{inbox_name}'
-        ORDER BY created_at DESC
-        LIMIT {n} OFFSET {offset}
-        """.format(inbox_name=inbox_name, n=n, offset=offset))
-    rows = cursor.fetchall()
-    conn.commit()
-    conn.close()
-    return [
-        TMessage(id=message_id, text=message_text, created_at=created_at)
-        for (message_id, message_text, created_at) in rows
-    ]
+    with self._db.connection() as conn:
+      cursor = conn.cursor()
+      now = datetime.datetime.now()
+      with tracing.span("query"):
+        PUSH.execute(cursor, inbox_name, message_text, now)
+      message_id = cursor.fetchone()[0]
+      with tracing.span("commit"):
+        conn.commit()
+      return message_id
+
+  def fetch(self, inbox_name, n, before_id):
+    with self._db.connection() as conn:
+      cursor = conn.cursor()
+      with tracing.span("query"):
+        FETCH.execute(cursor, inbox_name, before_id, n)
+      rows = cursor.fetchall()
+      with tracing.span("commit"):
+        conn.commit()
+      return [
+          TMessage(id=message_id, text=message_text,
+              created_at=created_at.strftime(TIMESTAMP_FORMAT))
+          for (message_id, message_text, created_at) in rows
+      ]
 
 
 class Server:
-  def __init__(self, ip_address, port, thread_pool_size, db_host, db_user):
+  def __init__(self, ip_address, port, thread_pool_size, db_host, db_user,
+      db_max_lifetime=600.0, db_stats_interval=10.0):
     self._ip_address = ip_address
     self._port = port
     self._thread_pool_size = thread_pool_size
     self._db_host = db_host
     self._db_user = db_user
+    self._db_max_lifetime = db_max_lifetime
+    self._db_stats_interval = db_stats_interval
 
   def serve(self):
-    handler = Handler(self._db_host, self._db_user)
-    processor = TInboxService.Processor(handler)
+    db = wise_db.create_pool(self._db_host, self._db_user,
+        self._thread_pool_size, self._db_max_lifetime,
+        self._db_stats_interval)
+    handler = Handler(db)
+    processor = tracing.TracingProcessor(TInboxService.Processor(handler))
     transport = TSocket.TServerSocket(host=self._ip_address, port=self._port)
     tfactory = TTransport.TBufferedTransportFactory()
     pfactory = TBinaryProtocol.TBinaryProtocolFactory()
@@ -76,8 +91,19 @@ class Server:
 @click.option("--thread_pool_size", prompt="Thread pool size", type=click.INT)
 @click.option("--db_host", prompt="PostgreSQL host")
 @click.option("--db_user", prompt="PostgreSQL user")
-def main(ip_address, port, thread_pool_size, db_host, db_user):
-  server = Server(ip_address, port, thread_pool_size, db_host, db_user)
+# Directory to write the spans of the server to when it exits; tracing is
+# disabled if unset.
+@click.option("--trace_dir", envvar="WISE_TRACE_DIR", default=None)
+@click.option("--db_max_lifetime", default=600.0, type=click.FLOAT)
+# Period (seconds) of the database pool stats written to the log; 0 disables
+# them.
+@click.option("--db_stats_interval", default=10.0, type=click.FLOAT)
+def main(ip_address, port, thread_pool_size, db_host, db_user, trace_dir,
+    db_max_lifetime, db_stats_interval):
+  if trace_dir is not None:
+    tracing.configure("inbox", trace_dir)
+  server = Server(ip_address, port, thread_pool_size, db_host, db_user,
+      db_max_lifetime, db_stats_interval)
   server.serve()
 
 
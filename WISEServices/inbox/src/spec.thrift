@@ -9,5 +9,8 @@ struct TMessage {
 service TInboxService {
   i32 push (1:string inbox_name, 2:string message_text);
 
-  list<TMessage> fetch (1:string inbox_name, 2:i32 n, 3:i32 offset);
+  // The n most recent messages of an inbox with an id below before_id, or the
+  // n most recent ones if it is unset, newest first. The next page is the one
+  // before the id of the last message.
+  list<TMessage> fetch (1:string inbox_name, 2:i32 n, 4:i32 before_id);
 }
@@ -29,7 +29,7 @@ class TestService(unittest.TestCase):
     self._client.push("foo", "pong")
     self._client.push("foo", "ping")
     self._client.push("foo", "pong")
-    msgs = self._client.fetch("foo", 5, 0)
+    msgs = self._client.fetch("foo", 5)
     self.assertIsInstance(msgs, list)
     self.assertEqual(len(msgs), 5)
     self.assertIn(msgs[0].text, ["ping", "pong"])
@@ -37,6 +37,12 @@ class TestService(unittest.TestCase):
         self._start_time.strftime("%Y-%m-%d-%H-%M-%S"))
     self.assertLessEqual(msgs[0].created_at,
         datetime.datetime.now().strftime("%Y-%m-%d-%H-%M-%S"))
+    # Fetch the next page.
+    next_msgs = self._client.fetch("foo", 5, msgs[-1].id)
+    self.assertGreaterEqual(len(next_msgs), 1)
+    self.assertLess(next_msgs[0].id, msgs[-1].id)
+    self.assertEqual([msg.id for msg in msgs + next_msgs],
+        sorted([msg.id for msg in msgs + next_msgs], reverse=True))
 
 
 if __name__ == "__main__":
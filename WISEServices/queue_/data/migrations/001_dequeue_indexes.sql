@@ -0,0 +1,5 @@
+-- Index the entries of each queue in order, and by expiration time.
+CREATE INDEX IF NOT EXISTS QueueEntries_queue_name_id
+  ON QueueEntries(queue_name, id);
+CREATE INDEX IF NOT EXISTS QueueEntries_expires_at
+  ON QueueEntries(expires_at);
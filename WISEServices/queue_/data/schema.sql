@@ -6,3 +6,7 @@ CREATE TABLE QueueEntries(
   created_at VARCHAR(64) NOT NULL,
   expires_at VARCHAR(64) NOT NULL
 );
+
+-- Entries are dequeued oldest first, and collected once expired.
+CREATE INDEX QueueEntries_queue_name_id ON QueueEntries(queue_name, id);
+CREATE INDEX QueueEntries_expires_at ON QueueEntries(expires_at);
@@ -6,6 +6,7 @@ sys.path.insert(0,
 
 from queue_.src.py.gen_queue.queue.ttypes import TQueueEntry, \
     TEmptyQueueException
+from queue_.src.py.gen_queue.queue import TQueueService
 from queue_.src.py.client import Client
 
 sys.path = original_sys_path
@@ -1,6 +1,7 @@
 from thrift.transport import TSocket
 from thrift.transport import TTransport
 from thrift.protocol import TBinaryProtocol
+import wise_rpc
 
 from .gen_queue.queue import TQueueService
 
@@ -21,9 +22,15 @@ class Client:
     if self._transport.isOpen():
       self._transport.close()
 
+  def is_open(self):
+    return wise_rpc.is_connection_open(self._transport, self._socket)
+
   def enqueue(self, queue_name, message, expires_at):
     return self._tclient.enqueue(queue_name=queue_name, message=message,
         expires_at=expires_at)
 
   def dequeue(self, queue_name):
     return self._tclient.dequeue(queue_name=queue_name)
+
+  def dequeue_batch(self, queue_name, max_n):
+    return self._tclient.dequeue_batch(queue_name=queue_name, max_n=max_n)
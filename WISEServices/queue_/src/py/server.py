@@ -1,4 +1,8 @@
 import datetime
+import json
+import sys
+import threading
+import time
 
 import click
 import psycopg2
@@ -6,70 +10,145 @@ from thrift.transport import TSocket
 from thrift.transport import TTransport
 from thrift.protocol import TBinaryProtocol
 from thrift.server.TServer import TThreadPoolServer
+import wise_db
+from wise_rpc import tracing
 
 from gen_queue.queue import TQueueService
 from gen_queue.queue.ttypes import TQueueEntry, TEmptyQueueException
 
 
+# Format of the creation and expiration times of entries, whose lexicographic
+# order is their chronological order.
+TIMESTAMP_FORMAT = "%Y-%m-%d-%H-%M-%S"
+
+ENQUEUE = wise_db.Statement("enqueue", """
+    INSERT INTO QueueEntries (queue_name, message, created_at, expires_at)
+    VALUES ($1, $2, $3, $4)
+    RETURNING id
+    """)
+
+# [NOTE] The oldest unexpired entries are claimed and deleted in a single
+# statement. Entries locked by a concurrent dequeue are skipped rather than
+# waited for, so that concurrent consumers never get the same entry nor wait
+# for each other.
+DEQUEUE = wise_db.Statement("dequeue", """
+    DELETE FROM QueueEntries
+    WHERE id IN (
+      SELECT id
+      FROM QueueEntries
+      WHERE queue_name = $1 AND expires_at > $2
+      ORDER BY id
+      LIMIT $3
+      FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, message, created_at, expires_at
+    """)
+
+DELETE_EXPIRED = wise_db.Statement("delete_expired", """
+    DELETE FROM QueueEntries
+    WHERE id IN (
+      SELECT id
+      FROM QueueEntries
+      WHERE expires_at <= $1
+      LIMIT $2
+      FOR UPDATE SKIP LOCKED
+    )
+    """)
+
+
 class Handler:
-  def __init__(self, db_host, db_user):
-    self._db_host = db_host
-    self._db_user = db_user
+  def __init__(self, db):
+    self._db = db
 
   def enqueue(self, queue_name, message, expires_at):
-    conn = psycopg2.connect("dbname='{dbname}' host='{host}' user={dbuser}".format(
-        dbname="microblog_bench", host=self._db_host, dbuser=self._db_user))
-    cursor = conn.cursor()
-    now = datetime.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
-    cursor.execute("""
-        INSERT INTO QueueEntries (queue_name, message, created_at, expires_at)
-        VALUES ('{queue_name}', '{message}', '{now}', '{expires_at}')
-        RETURNING id
-        """.format(queue_name=queue_name, message=message, now=now,
-            expires_at=expires_at))
-    queue_entry_id = cursor.fetchone()[0]
-    conn.commit()
-    conn.close()
-    return queue_entry_id
+    with self._db.connection() as conn:
+      cursor = conn.cursor()
+      now = datetime.datetime.now().strftime(TIMESTAMP_FORMAT)
+      with tracing.span("query"):
+        ENQUEUE.execute(cursor, queue_name, message, now, expires_at)
+      queue_entry_id = cursor.fetchone()[0]
+      with tracing.span("commit"):
+        conn.commit()
+      return queue_entry_id
 
   def dequeue(self, queue_name):
-    conn = psycopg2.connect("dbname='{dbname}' host='{host}' user={dbuser}".format(
-        dbname="microblog_bench", host=self._db_host, dbuser=self._db_user))
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, message, created_at, expires_at
-        FROM QueueEntries
-        WHERE queue_name = '{queue_name}'
-        ORDER BY created_at ASC
-        LIMIT 1
-        """.format(queue_name=queue_name))
-    row = cursor.fetchone()
-    if row is None:
-      conn.commit()
-      conn.close()
+    queue_entries = self.dequeue_batch(queue_name, 1)
+    if not queue_entries:
       raise TEmptyQueueException()
-    else:
-      queue_entry_id, message, created_at, expires_at = row
-      cursor.execute("""
-          DELETE FROM QueueEntries WHERE id = {queue_entry_id}
-          """.format(queue_entry_id=queue_entry_id))
-      conn.commit()
-      conn.close()
-      return TQueueEntry(id=queue_entry_id, queue_name=queue_name,
-          message=message, created_at=created_at, expires_at=expires_at)
+    return queue_entries[0]
+
+  def dequeue_batch(self, queue_name, max_n):
+    with self._db.connection() as conn:
+      cursor = conn.cursor()
+      now = datetime.datetime.now().strftime(TIMESTAMP_FORMAT)
+      with tracing.span("query"):
+        DEQUEUE.execute(cursor, queue_name, now, max_n)
+      rows = cursor.fetchall()
+      with tracing.span("commit"):
+        conn.commit()
+      # [NOTE] The rows deleted are returned in no particular order.
+      return sorted([
+          TQueueEntry(id=queue_entry_id, queue_name=queue_name,
+              message=message, created_at=created_at, expires_at=expires_at)
+          for (queue_entry_id, message, created_at, expires_at) in rows
+      ], key=lambda queue_entry: queue_entry.id)
+
+  def delete_expired(self, batch_size=1000):
+    """Delete the expired entries of all queues, |batch_size| at a time so as
+    to keep transactions short, and return their number."""
+    n_deleted = 0
+    while True:
+      with self._db.connection() as conn:
+        cursor = conn.cursor()
+        now = datetime.datetime.now().strftime(TIMESTAMP_FORMAT)
+        DELETE_EXPIRED.execute(cursor, now, batch_size)
+        n_batch = cursor.rowcount
+        conn.commit()
+      n_deleted += n_batch
+      if n_batch < batch_size:
+        return n_deleted
+
+  def collect_expired(self, interval, stream=sys.stdout):
+    """Delete the expired entries every |interval| seconds from a background
+    thread, writing their number as a line of JSON to |stream|."""
+    def collect():
+      while True:
+        time.sleep(interval)
+        try:
+          n_deleted = self.delete_expired()
+        except psycopg2.Error as e:
+          stream.write("Error: could not delete expired entries:\n%s\n" % e)
+          stream.flush()
+          continue
+        if n_deleted:
+          stream.write(json.dumps({"queue_gc": {"deleted": n_deleted,
+              "time": time.time()}}) + "\n")
+          stream.flush()
+    threading.Thread(target=collect, daemon=True).start()
 
 
 class Server:
-  def __init__(self, ip_address, port, thread_pool_size, db_host, db_user):
+  def __init__(self, ip_address, port, thread_pool_size, db_host, db_user,
+      db_max_lifetime=600.0, db_stats_interval=10.0, gc_interval=10.0):
     self._ip_address = ip_address
     self._port = port
     self._thread_pool_size = thread_pool_size
     self._db_host = db_host
     self._db_user = db_user
+    self._db_max_lifetime = db_max_lifetime
+    self._db_stats_interval = db_stats_interval
+    self._gc_interval = gc_interval
 
   def serve(self):
-    handler = Handler(self._db_host, self._db_user)
-    processor = TQueueService.Processor(handler)
+    # The garbage collection thread, if any, uses the pool too.
+    db = wise_db.create_pool(self._db_host, self._db_user,
+        self._thread_pool_size, self._db_max_lifetime,
+        self._db_stats_interval,
+        no_background_threads=1 if self._gc_interval > 0 else 0)
+    handler = Handler(db)
+    if self._gc_interval > 0:
+      handler.collect_expired(self._gc_interval)
+    processor = tracing.TracingProcessor(TQueueService.Processor(handler))
     transport = TSocket.TServerSocket(host=self._ip_address, port=self._port)
     tfactory = TTransport.TBufferedTransportFactory()
     pfactory = TBinaryProtocol.TBinaryProtocolFactory()
@@ -84,8 +163,21 @@ class Server:
 @click.option("--thread_pool_size", prompt="Thread pool size", type=click.INT)
 @click.option("--db_host", prompt="PostgreSQL host")
 @click.option("--db_user", prompt="PostgreSQL user")
-def main(ip_address, port, thread_pool_size, db_host, db_user):
-  server = Server(ip_address, port, thread_pool_size, db_host, db_user)
+# Directory to write the spans of the server to when it exits; tracing is
+# disabled if unset.
+@click.option("--trace_dir", envvar="WISE_TRACE_DIR", default=None)
+@click.option("--db_max_lifetime", default=600.0, type=click.FLOAT)
+# Period (seconds) of the database pool stats written to the log; 0 disables
+# them.
+@click.option("--db_stats_interval", default=10.0, type=click.FLOAT)
+# Period (seconds) at which expired entries are deleted; 0 disables it.
+@click.option("--gc_interval", default=10.0, type=click.FLOAT)
+def main(ip_address, port, thread_pool_size, db_host, db_user, trace_dir,
+    db_max_lifetime, db_stats_interval, gc_interval):
+  if trace_dir is not None:
+    tracing.configure("queue", trace_dir)
+  server = Server(ip_address, port, thread_pool_size, db_host, db_user,
+      db_max_lifetime, db_stats_interval, gc_interval)
   server.serve()
 
 
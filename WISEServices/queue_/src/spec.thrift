@@ -16,4 +16,8 @@ service TQueueService {
 
   TQueueEntry dequeue (1:string queue_name)
       throws (1:TEmptyQueueException e);
+
+  // Up to max_n of the oldest entries of a queue, oldest first; none if it
+  // is empty.
+  list<TQueueEntry> dequeue_batch (1:string queue_name, 2:i32 max_n);
 }
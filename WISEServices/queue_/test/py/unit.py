@@ -35,6 +35,21 @@ class TestService(unittest.TestCase):
         datetime.datetime.now().strftime("%Y-%m-%d-%H-%M-%S"))
     self.assertEqual(entry.expires_at, "2099-01-01-00-00-00")
 
+  def testDequeueBatch(self):
+    self._client.enqueue("qd", "ping", "2099-01-01-00-00-00")
+    self._client.enqueue("qd", "pong", "2099-01-01-00-00-00")
+    self._client.enqueue("qd", "pang", "2099-01-01-00-00-00")
+    entries = self._client.dequeue_batch("qd", 2)
+    self.assertEqual([entry.message for entry in entries], ["ping", "pong"])
+    entries = self._client.dequeue_batch("qd", 2)
+    self.assertEqual([entry.message for entry in entries], ["pang"])
+    self.assertEqual(self._client.dequeue_batch("qd", 2), [])
+
+  def testExpiredEntries(self):
+    self._client.enqueue("qe", "ping", "2000-01-01-00-00-00")
+    with self.assertRaises(wise_queue.TEmptyQueueException):
+      self._client.dequeue("qe")
+
   def testEmptyQueueException(self):
     with self.assertRaises(wise_queue.TEmptyQueueException):
       self._client.dequeue("qc")
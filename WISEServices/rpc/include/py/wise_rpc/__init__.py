@@ -0,0 +1,14 @@
+import os, sys
+original_sys_path = sys.path
+sys.path.insert(0,
+    os.path.join(os.path.abspath(os.path.dirname(__file__)),
+        "..", "..", "..", ".."))
+
+from rpc.src.py.balancer import Backend, Policy, RandomPolicy, \
+    RoundRobinPolicy, LeastOutstandingPolicy, PowerOfTwoChoicesPolicy, \
+    create_policy
+from rpc.src.py.client_pool import ClientPool, backend_shares, \
+    is_connection_open
+from rpc.src.py import tracing
+
+sys.path = original_sys_path
@@ -0,0 +1,115 @@
+import itertools
+import random
+import threading
+import time
+
+
+class Backend:
+  """A server of a service, with the load and health observed by a client."""
+
+  def __init__(self, server):
+    self.server = server
+    self.in_flight = 0
+    # [NOTE] An EWMA latency of 0 means that no call completed yet, so that
+    # new backends are tried first.
+    self.ewma_latency = 0.0
+    self.consecutive_errors = 0
+    self.ejected_until = 0.0
+
+
+class Policy:
+  """Picks the backend of each call, keeping per-backend in-flight counters
+  and EWMA latencies, and ejecting for |ejection_time| seconds the backends
+  whose last |ejection_threshold| calls failed."""
+
+  def __init__(self, servers, ewma_alpha=0.3, ejection_threshold=3,
+      ejection_time=10.0):
+    self._backends = [Backend(server) for server in servers]
+    self._ewma_alpha = ewma_alpha
+    self._ejection_threshold = ejection_threshold
+    self._ejection_time = ejection_time
+    self._lock = threading.Lock()
+
+  def backends(self):
+    return self._backends
+
+  def _available(self, now):
+    backends = [backend for backend in self._backends
+        if backend.ejected_until <= now]
+    # [NOTE] If every backend is ejected, calls are spread over all of them
+    # rather than failing outright.
+    return backends or self._backends
+
+  def _choose(self, backends):
+    raise NotImplementedError
+
+  def acquire(self):
+    with self._lock:
+      backend = self._choose(self._available(time.monotonic()))
+      backend.in_flight += 1
+    return backend
+
+  def cancel(self, backend):
+    """Account for a call to |backend| given up before it was issued."""
+    with self._lock:
+      backend.in_flight -= 1
+
+  def release(self, backend, latency, error=False):
+    with self._lock:
+      backend.in_flight -= 1
+      if error:
+        backend.consecutive_errors += 1
+        if backend.consecutive_errors >= self._ejection_threshold:
+          backend.ejected_until = time.monotonic() + self._ejection_time
+          backend.consecutive_errors = 0
+      else:
+        backend.consecutive_errors = 0
+        backend.ewma_latency = latency if backend.ewma_latency == 0.0 else \
+            self._ewma_alpha * latency + \
+            (1 - self._ewma_alpha) * backend.ewma_latency
+
+
+class RandomPolicy(Policy):
+  def _choose(self, backends):
+    return random.choice(backends)
+
+
+class RoundRobinPolicy(Policy):
+  def __init__(self, servers, **kwargs):
+    super().__init__(servers, **kwargs)
+    self._counter = itertools.count()
+
+  def _choose(self, backends):
+    return backends[next(self._counter) % len(backends)]
+
+
+class LeastOutstandingPolicy(Policy):
+  def _choose(self, backends):
+    # Ties are broken at random, so that idle backends share the load.
+    least_in_flight = min(backend.in_flight for backend in backends)
+    return random.choice([backend for backend in backends
+        if backend.in_flight == least_in_flight])
+
+
+class PowerOfTwoChoicesPolicy(Policy):
+  def _choose(self, backends):
+    if len(backends) == 1:
+      return backends[0]
+    # [NOTE] The cost of a backend is its latency scaled by the calls already
+    # waiting on it, so a slow replica stops being picked as its queue grows.
+    return min(random.sample(backends, 2),
+        key=lambda backend: backend.ewma_latency * (backend.in_flight + 1))
+
+
+POLICIES = {
+    "random": RandomPolicy,
+    "round_robin": RoundRobinPolicy,
+    "least_outstanding": LeastOutstandingPolicy,
+    "p2c": PowerOfTwoChoicesPolicy
+}
+
+
+def create_policy(servers, policy="random", **kwargs):
+  if policy not in POLICIES:
+    raise ValueError("Unknown balancing policy %s" % policy)
+  return POLICIES[policy](servers, **kwargs)
@@ -0,0 +1,147 @@
+import collections
+import contextlib
+import select
+import threading
+import time
+
+from thrift.Thrift import TException
+from thrift.transport.TTransport import TTransportException
+
+from . import tracing
+
+
+def is_connection_open(transport, socket):
+  """Whether the connection of a service client, with |transport| over the
+  TSocket |socket|, can still be used, i.e. it is open and the server has not
+  closed it in the meantime."""
+  if not transport.isOpen():
+    return False
+  # [NOTE] An idle connection has nothing to read unless the server closed it
+  # (EOF) or broke the protocol. Unlike select, poll takes file descriptors
+  # of any value.
+  poller = select.poll()
+  poller.register(socket.handle, select.POLLIN)
+  return not poller.poll(0)
+
+
+def backend_shares(max_size, backends):
+  """Split |max_size| clients as evenly as possible among |backends|, giving
+  each at least one."""
+  size, remainder = divmod(max_size, len(backends))
+  return {backend: max(1, size + (1 if i < remainder else 0))
+      for (i, backend) in enumerate(backends)}
+
+
+class ClientPool:
+  """Bounded pool of open Thrift clients to the servers of one service, the
+  server of each call being picked by a balancing |policy|.
+
+  Clients are health-checked when taken from the pool, dropped after an
+  error that may have left the connection unusable, and closed after
+  |max_idle_time| seconds without use, or as soon as they are returned if it
+  is 0. Calls carry the current trace ID, and each checkout is recorded as
+  span "client:|name|" when tracing.
+
+  A Thrift server thread serves a single connection for as long as it is
+  open, so every open client holds a thread of its server. Each server thus
+  gets its share of |max_size| (see backend_shares), and the clients open to
+  it, in use or idle, never outnumber its share; calls to a server wait for
+  one of its clients once its share is in use. The shares of all the
+  processes calling a service must fit in the thread count of each of its
+  servers."""
+
+  def __init__(self, client_cls, policy, max_size=8, max_idle_time=60.0,
+      name=None):
+    self._client_cls = client_cls
+    self._span_name = "client:%s" % (name or client_cls.__module__)
+    self._policy = policy
+    self._max_idle_time = max_idle_time
+    self._semaphores = {backend: threading.BoundedSemaphore(share)
+        for (backend, share) in
+        backend_shares(max_size, policy.backends()).items()}
+    self._lock = threading.Lock()
+    # Per backend, (client, time at which it was returned to the pool),
+    # oldest first.
+    self._idle = {backend: collections.deque()
+        for backend in policy.backends()}
+
+  def policy(self):
+    return self._policy
+
+  def _evict_idle(self, now):
+    evicted = []
+    with self._lock:
+      for idle in self._idle.values():
+        while idle and now - idle[0][1] > self._max_idle_time:
+          evicted.append(idle.popleft()[0])
+    for client in evicted:
+      client.close()
+
+  def _acquire(self, backend):
+    # [NOTE] A client is only opened when none is idle, by a call holding a
+    # slot of |backend|, so the clients open to it never outnumber its slots.
+    self._evict_idle(time.monotonic())
+    idle = self._idle[backend]
+    while True:
+      with self._lock:
+        if not idle:
+          break
+        client, _ = idle.pop()
+      if client.is_open():
+        return client
+      client.close()
+    return tracing.trace_client(self._client_cls(backend.server["hostname"],
+        backend.server["port"]))
+
+  def _release(self, backend, client):
+    if self._max_idle_time <= 0:
+      client.close()
+      return
+    now = time.monotonic()
+    with self._lock:
+      self._idle[backend].append((client, now))
+    # [NOTE] Idle clients are also evicted when others are returned, so that
+    # they give their server thread back even if no call follows.
+    self._evict_idle(now)
+
+  @contextlib.contextmanager
+  def client(self):
+    with tracing.span(self._span_name):
+      backend = self._policy.acquire()
+      self._semaphores[backend].acquire()
+      client = None
+      error = False
+      started_at = time.perf_counter()
+      try:
+        client = self._acquire(backend)
+        yield client
+      except (TTransportException, OSError):
+        # [NOTE] Only failures to reach the server count towards ejecting it.
+        error = True
+        if client is not None:
+          client.close()
+          client = None
+        raise
+      except TException:
+        # [NOTE] Exceptions declared in the IDL and application exceptions are
+        # whole replies, so the connection can be reused.
+        raise
+      except BaseException:
+        if client is not None:
+          client.close()
+          client = None
+        raise
+      finally:
+        self._policy.release(backend, time.perf_counter() - started_at, error)
+        if client is not None:
+          self._release(backend, client)
+        self._semaphores[backend].release()
+
+  def close(self):
+    with self._lock:
+      idle = [client for clients in self._idle.values()
+          for (client, _) in clients]
+      for clients in self._idle.values():
+        clients.clear()
+    for client in idle:
+      client.close()
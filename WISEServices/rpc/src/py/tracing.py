@@ -0,0 +1,210 @@
+import atexit
+import collections
+import contextlib
+import contextvars
+import csv
+import os
+import random
+import signal
+import socket
+import threading
+import time
+
+from thrift.Thrift import TMessageType, TProcessor
+from thrift.protocol import TProtocolDecorator
+
+
+# Separates the trace ID from the method name in the name of a call message.
+SEPARATOR = "|"
+
+# Columns of a trace file. TS is the wall clock time at which the span
+# started and DURATION its length, both in microseconds, so that spans line
+# up with the milliscope event logs.
+FIELDNAMES = ["TRACE_ID", "TIER", "SPAN", "TS", "DURATION", "PID", "TID"]
+
+
+_trace_id = contextvars.ContextVar("trace_id", default="")
+
+
+def new_trace_id():
+  return "%016x" % random.getrandbits(64)
+
+
+def current_trace_id():
+  return _trace_id.get()
+
+
+def set_trace_id(trace_id=None):
+  """Attribute the spans recorded and the calls made from now on in this
+  context to |trace_id|, or to a new trace if None. Return a token to pass
+  to reset_trace_id."""
+  return _trace_id.set(trace_id or new_trace_id())
+
+
+def reset_trace_id(token):
+  _trace_id.reset(token)
+
+
+@contextlib.contextmanager
+def trace(trace_id=None):
+  """Attribute the spans recorded and the calls made by the enclosed block to
+  |trace_id|, or to a new trace if None."""
+  token = set_trace_id(trace_id)
+  try:
+    yield _trace_id.get()
+  finally:
+    reset_trace_id(token)
+
+
+class _Span:
+  __slots__ = ("_tracer", "_name", "_ts", "_started_at")
+
+  def __init__(self, tracer, name):
+    self._tracer = tracer
+    self._name = name
+
+  def __enter__(self):
+    self._ts = time.time()
+    self._started_at = time.perf_counter()
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self._tracer.record(self._name, self._ts,
+        time.perf_counter() - self._started_at)
+
+
+class Tracer:
+  """Records the spans of one tier of the process into a ring buffer of the
+  last |capacity| spans, to be written out as CSV."""
+
+  def __init__(self, tier, capacity=65536):
+    self._tier = tier
+    # [NOTE] Appending to a bounded deque is atomic, so recording takes no
+    # lock and the oldest spans are dropped once the buffer is full.
+    self._spans = collections.deque(maxlen=capacity)
+
+  def tier(self):
+    return self._tier
+
+  def span(self, name):
+    return _Span(self, name)
+
+  def record(self, name, ts, duration):
+    self._spans.append((_trace_id.get(), name, int(ts * 1e6),
+        int(duration * 1e6), threading.get_ident()))
+
+  def dump(self, filename):
+    spans = list(self._spans)
+    pid = os.getpid()
+    with open(filename, "w", newline="") as trace_file:
+      writer = csv.writer(trace_file)
+      writer.writerow(FIELDNAMES)
+      for (trace_id, name, ts, duration, tid) in spans:
+        writer.writerow([trace_id, self._tier, name, ts, duration, pid, tid])
+
+
+_tracer = None
+_null_span = contextlib.nullcontext()
+
+
+def tracer():
+  """Return the tracer of this process, or None if tracing is disabled."""
+  return _tracer
+
+
+def span(name):
+  """Return a context manager recording the enclosed block as span |name| of
+  the current trace, which does nothing if tracing is disabled."""
+  if _tracer is None:
+    return _null_span
+  return _Span(_tracer, name)
+
+
+def configure(tier, trace_dir, capacity=65536, handle_sigterm=True):
+  """Enable tracing for this process. Its spans are written to a CSV file in
+  |trace_dir| when it exits, including on SIGTERM if |handle_sigterm|."""
+  global _tracer
+  _tracer = Tracer(tier, capacity)
+  os.makedirs(trace_dir, exist_ok=True)
+  filename = os.path.join(trace_dir, "%s-%s-%d.csv" % (tier,
+      socket.gethostname(), os.getpid()))
+  dumped = threading.Event()
+
+  def dump():
+    if not dumped.is_set():
+      dumped.set()
+      _tracer.dump(filename)
+
+  atexit.register(dump)
+  if handle_sigterm and \
+      threading.current_thread() is threading.main_thread():
+    def on_sigterm(signum, frame):
+      dump()
+      # [NOTE] The process is then terminated as it would have been without
+      # this handler.
+      signal.signal(signum, signal.SIG_DFL)
+      os.kill(os.getpid(), signum)
+    signal.signal(signal.SIGTERM, on_sigterm)
+  return _tracer
+
+
+class TracingProtocol(TProtocolDecorator.TProtocolDecorator):
+  """Protocol sending the current trace ID ahead of the method name of each
+  call, like TMultiplexedProtocol does with the service name."""
+
+  def __init__(self, protocol):
+    # [NOTE] The decorated protocol's state is already shared by the class
+    # TProtocolDecorator creates, and must not be initialized again.
+    pass
+
+  def writeMessageBegin(self, name, type, seqid):
+    trace_id = _trace_id.get()
+    if trace_id and (type == TMessageType.CALL or
+        type == TMessageType.ONEWAY):
+      name = trace_id + SEPARATOR + name
+    super(TracingProtocol, self).writeMessageBegin(name, type, seqid)
+
+
+def trace_client(client):
+  """Make the calls of a service client carry the current trace ID."""
+  # [NOTE] The service clients wrap a generated client, whose output protocol
+  # is replaced.
+  tclient = client._tclient
+  tclient._oprot = TracingProtocol(tclient._oprot)
+  return client
+
+
+class _StoredMessageProtocol:
+  """Input protocol of a call whose message begin was already read."""
+
+  # [NOTE] Unlike the StoredMessageProtocol of TMultiplexedProcessor, this
+  # does not create a class per call.
+  def __init__(self, protocol, message_begin):
+    self._protocol = protocol
+    self._message_begin = message_begin
+
+  def readMessageBegin(self):
+    return self._message_begin
+
+  def __getattr__(self, name):
+    return getattr(self._protocol, name)
+
+
+class TracingProcessor(TProcessor):
+  """Processor taking the trace ID sent by a TracingProtocol off each call
+  before passing it to |processor|, and recording the call as a span of that
+  trace. Calls without a trace ID are processed as they are."""
+
+  def __init__(self, processor):
+    self._processor = processor
+
+  def process(self, iprot, oprot):
+    name, type, seqid = iprot.readMessageBegin()
+    trace_id, _, method = name.rpartition(SEPARATOR)
+    token = _trace_id.set(trace_id)
+    try:
+      with span("rpc:" + method):
+        return self._processor.process(
+            _StoredMessageProtocol(iprot, (method, type, seqid)), oprot)
+    finally:
+      _trace_id.reset(token)
@@ -0,0 +1,224 @@
+import socket
+import threading
+import time
+import types
+import unittest
+
+from thrift.protocol import TBinaryProtocol
+from thrift.transport import TSocket
+from thrift.transport.TTransport import TBufferedTransport, TMemoryBuffer, \
+    TTransportException
+
+import wise_rpc
+
+
+SERVERS = [{"hostname": "server%d" % i, "port": 9090} for i in range(2)]
+
+
+class FakeClient:
+  """Client that counts the connections open to each server."""
+
+  lock = threading.Lock()
+  open_clients = {}
+  max_open_clients = {}
+
+  def __init__(self, hostname, port):
+    self.hostname = hostname
+    self._open = True
+    # Generated client, whose output protocol is wrapped when tracing.
+    self._tclient = types.SimpleNamespace(
+        _oprot=TBinaryProtocol.TBinaryProtocol(TMemoryBuffer()))
+    with FakeClient.lock:
+      FakeClient.open_clients[hostname] = \
+          FakeClient.open_clients.get(hostname, 0) + 1
+      FakeClient.max_open_clients[hostname] = max(
+          FakeClient.max_open_clients.get(hostname, 0),
+          FakeClient.open_clients[hostname])
+
+  @classmethod
+  def reset(cls):
+    cls.open_clients = {}
+    cls.max_open_clients = {}
+
+  def is_open(self):
+    return self._open
+
+  def close(self):
+    with FakeClient.lock:
+      if self._open:
+        FakeClient.open_clients[self.hostname] -= 1
+      self._open = False
+
+  def call(self):
+    time.sleep(0.001)
+
+
+class TestPolicies(unittest.TestCase):
+  def testCreatePolicy(self):
+    self.assertIsInstance(wise_rpc.create_policy(SERVERS, "p2c"),
+        wise_rpc.PowerOfTwoChoicesPolicy)
+    with self.assertRaises(ValueError):
+      wise_rpc.create_policy(SERVERS, "fastest")
+
+  def testRoundRobin(self):
+    policy = wise_rpc.create_policy(SERVERS, "round_robin")
+    backends = [policy.acquire() for i in range(4)]
+    self.assertEqual([backend.server["hostname"] for backend in backends],
+        ["server0", "server1", "server0", "server1"])
+
+  def testLeastOutstanding(self):
+    policy = wise_rpc.create_policy(SERVERS, "least_outstanding")
+    first = policy.acquire()
+    second = policy.acquire()
+    self.assertIsNot(first, second)
+    policy.release(first, 0.01)
+    self.assertIs(policy.acquire(), first)
+
+  def testPowerOfTwoChoicesAvoidsSlowBackend(self):
+    policy = wise_rpc.create_policy(SERVERS, "p2c")
+    slow, fast = policy.backends()
+    slow.ewma_latency = 1.0
+    fast.ewma_latency = 0.01
+    self.assertTrue(all(policy.acquire() is fast for i in range(10)))
+
+  def testInFlightAndLatency(self):
+    policy = wise_rpc.create_policy(SERVERS[:1], ewma_alpha=0.5)
+    backend = policy.acquire()
+    self.assertEqual(backend.in_flight, 1)
+    policy.release(backend, 0.2)
+    self.assertEqual(backend.in_flight, 0)
+    self.assertEqual(backend.ewma_latency, 0.2)
+    policy.release(policy.acquire(), 0.4)
+    self.assertAlmostEqual(backend.ewma_latency, 0.3)
+    policy.cancel(policy.acquire())
+    self.assertEqual(backend.in_flight, 0)
+
+  def testEjection(self):
+    policy = wise_rpc.create_policy(SERVERS, "round_robin")
+    failing = policy.backends()[0]
+    for i in range(6):
+      backend = policy.acquire()
+      policy.release(backend, 0.01, error=backend is failing)
+      if i < 4:
+        self.assertLessEqual(failing.ejected_until, time.monotonic())
+    self.assertGreater(failing.ejected_until, time.monotonic())
+    self.assertTrue(all(policy.acquire() is not failing for i in range(4)))
+
+  def testEveryBackendEjected(self):
+    policy = wise_rpc.create_policy(SERVERS[:1])
+    backend = policy.backends()[0]
+    backend.ejected_until = time.monotonic() + 60.0
+    self.assertIs(policy.acquire(), backend)
+
+
+class TestBackendShares(unittest.TestCase):
+  def testEvenSplit(self):
+    self.assertEqual(list(wise_rpc.backend_shares(8, ["a", "b"]).values()),
+        [4, 4])
+
+  def testRemainder(self):
+    self.assertEqual(
+        list(wise_rpc.backend_shares(5, ["a", "b", "c"]).values()), [2, 2, 1])
+
+  def testAtLeastOne(self):
+    self.assertEqual(
+        list(wise_rpc.backend_shares(1, ["a", "b", "c"]).values()), [1, 1, 1])
+
+
+class TestIsConnectionOpen(unittest.TestCase):
+  def setUp(self):
+    self._server = socket.socket()
+    self._server.bind(("localhost", 0))
+    self._server.listen()
+    self._socket = TSocket.TSocket("localhost",
+        self._server.getsockname()[1])
+    self._transport = TBufferedTransport(self._socket)
+    self._transport.open()
+    self._connection, _ = self._server.accept()
+
+  def tearDown(self):
+    self._transport.close()
+    self._connection.close()
+    self._server.close()
+
+  def testOpen(self):
+    self.assertTrue(
+        wise_rpc.is_connection_open(self._transport, self._socket))
+
+  def testClosedByServer(self):
+    self._connection.close()
+    time.sleep(0.01)
+    self.assertFalse(
+        wise_rpc.is_connection_open(self._transport, self._socket))
+
+  def testClosed(self):
+    self._transport.close()
+    self.assertFalse(
+        wise_rpc.is_connection_open(self._transport, self._socket))
+
+
+class TestClientPool(unittest.TestCase):
+  def setUp(self):
+    FakeClient.reset()
+
+  def _pool(self, max_size, policy="random", max_idle_time=60.0):
+    return wise_rpc.ClientPool(FakeClient,
+        wise_rpc.create_policy(SERVERS, policy), max_size=max_size,
+        max_idle_time=max_idle_time)
+
+  def _run(self, pool, no_threads, no_calls):
+    def run():
+      for i in range(no_calls):
+        with pool.client() as client:
+          client.call()
+    threads = [threading.Thread(target=run) for i in range(no_threads)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+  def testNeverExceedsShares(self):
+    pool = self._pool(4)
+    self._run(pool, 16, 20)
+    for server in SERVERS:
+      self.assertLessEqual(FakeClient.max_open_clients[server["hostname"]], 2)
+      self.assertLessEqual(FakeClient.open_clients[server["hostname"]], 2)
+    self.assertLessEqual(sum(FakeClient.open_clients.values()), 4)
+
+  def testReusesIdleClients(self):
+    pool = self._pool(4, policy="round_robin")
+    self._run(pool, 1, 10)
+    self.assertEqual(FakeClient.max_open_clients,
+        {"server0": 1, "server1": 1})
+
+  def testZeroIdleTimeClosesClients(self):
+    pool = self._pool(4, max_idle_time=0)
+    self._run(pool, 4, 5)
+    self.assertEqual(sum(FakeClient.open_clients.values()), 0)
+
+  def testIdleClientsAreEvicted(self):
+    pool = self._pool(4, max_idle_time=0.01)
+    self._run(pool, 4, 5)
+    time.sleep(0.02)
+    with pool.client():
+      pass
+    self.assertLessEqual(sum(FakeClient.open_clients.values()), 1)
+
+  def testTransportErrorDropsClient(self):
+    pool = self._pool(2, policy="round_robin")
+    with self.assertRaises(TTransportException):
+      with pool.client():
+        raise TTransportException()
+    self.assertEqual(sum(FakeClient.open_clients.values()), 0)
+    for backend in pool.policy().backends():
+      self.assertEqual(backend.in_flight, 0)
+
+  def testClose(self):
+    pool = self._pool(4)
+    self._run(pool, 4, 5)
+    pool.close()
+    self.assertEqual(sum(FakeClient.open_clients.values()), 0)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -5,6 +5,7 @@ sys.path.insert(0,
         "..", "..", "..", ".."))
 
 from sub.src.py.gen_sub.sub.ttypes import TSubEntry, TSubNotFoundException
+from sub.src.py.gen_sub.sub import TSubService
 from sub.src.py.client import Client
 
 sys.path = original_sys_path
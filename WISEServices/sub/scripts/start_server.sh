@@ -10,6 +10,10 @@ else
   PYFLAGS=""
 fi
 
+# Set PYTHONPATH.
+export PYTHONPATH=$(pwd)/../rpc/include/py/:$PYTHONPATH
+export PYTHONPATH=$(pwd)/../db/include/py/:$PYTHONPATH
+
 # Start the server.
 if [ $1 = "py" ]
 then
@@ -1,6 +1,7 @@
 from thrift.transport import TSocket
 from thrift.transport import TTransport
 from thrift.protocol import TBinaryProtocol
+import wise_rpc
 
 from .gen_sub.sub import TSubService
 
@@ -21,6 +22,9 @@ class Client:
     if self._transport.isOpen():
       self._transport.close()
 
+  def is_open(self):
+    return wise_rpc.is_connection_open(self._transport, self._socket)
+
   def create_subscription(self, subscriber_id, channel_name):
     return self._tclient.create_subscription(subscriber_id=subscriber_id,
         channel_name=channel_name)
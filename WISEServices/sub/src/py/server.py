@@ -1,116 +1,133 @@
 import datetime
 
 import click
-import psycopg2
 from thrift.transport import TSocket
 from thrift.transport import TTransport
 from thrift.protocol import TBinaryProtocol
 from thrift.server.TServer import TThreadPoolServer
+import wise_db
+from wise_rpc import tracing
 
 from gen_sub.sub import TSubService
 from gen_sub.sub.ttypes import TSubEntry, TSubNotFoundException
 
 
+CREATE_SUBSCRIPTION = wise_db.Statement("create_subscription", """
+    INSERT INTO Subscriptions (subscriber_id, channel_name, created_at)
+    VALUES ($1, $2, $3)
+    RETURNING id
+    """)
+
+DELETE_SUBSCRIPTION = wise_db.Statement("delete_subscription", """
+    DELETE FROM Subscriptions WHERE id = $1
+    """)
+
+GET_SUBSCRIPTION = wise_db.Statement("get_subscription", """
+    SELECT id, created_at
+    FROM Subscriptions
+    WHERE subscriber_id = $1 AND channel_name = $2
+    """)
+
+GET_SUBSCRIBERS_OF_CHANNEL = wise_db.Statement("get_subscribers_of_channel",
+    """
+    SELECT id, subscriber_id, created_at
+    FROM Subscriptions
+    WHERE channel_name = $1
+    """)
+
+GET_CHANNELS_SUBSCRIBED_BY = wise_db.Statement("get_channels_subscribed_by",
+    """
+    SELECT id, channel_name, created_at
+    FROM Subscriptions
+    WHERE subscriber_id = $1
+    """)
+
+
 class Handler:
-  def __init__(self, db_host, db_user):
-    self._db_host = db_host
-    self._db_user = db_user
+  def __init__(self, db):
+    self._db = db
 
   def create_subscription(self, subscriber_id, channel_name):
-    conn = psycopg2.connect("dbname='{dbname}' host='{host}' user={dbuser}".format(
-        dbname="microblog_bench", host=self._db_host, dbuser=self._db_user))
-    cursor = conn.cursor()
-    now = datetime.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
-    cursor.execute("""
-        INSERT INTO Subscriptions (subscriber_id, channel_name, created_at)
-        VALUES ({subscriber_id}, '{channel_name}', '{now}')
-        RETURNING id
-        """.format(subscriber_id=subscriber_id, channel_name=channel_name,
-            now=now))
-    subscription_id = cursor.fetchone()[0]
-    conn.commit()
-    conn.close()
-    return TSubEntry(id=subscription_id, subscriber_id=subscriber_id,
-        channel_name=channel_name, created_at=now)
+    with self._db.connection() as conn:
+      cursor = conn.cursor()
+      now = datetime.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+      with tracing.span("query"):
+        CREATE_SUBSCRIPTION.execute(cursor, subscriber_id, channel_name, now)
+      subscription_id = cursor.fetchone()[0]
+      with tracing.span("commit"):
+        conn.commit()
+      return TSubEntry(id=subscription_id, subscriber_id=subscriber_id,
+          channel_name=channel_name, created_at=now)
 
   def delete_subscription(self, subscription_id):
-    conn = psycopg2.connect("dbname='{dbname}' host='{host}' user={dbuser}".format(
-        dbname="microblog_bench", host=self._db_host, dbuser=self._db_user))
-    cursor = conn.cursor()
-    cursor.execute("""
-        DELETE FROM Subscriptions WHERE id = {subscription_id}
-        """.format(subscription_id=subscription_id))
-    conn.commit()
-    conn.close()
-    return None
+    with self._db.connection() as conn:
+      cursor = conn.cursor()
+      with tracing.span("query"):
+        DELETE_SUBSCRIPTION.execute(cursor, subscription_id)
+      with tracing.span("commit"):
+        conn.commit()
+      return None
 
   def get_subscription(self, subscriber_id, channel_name):
-    conn = psycopg2.connect("dbname='{dbname}' host='{host}' user={dbuser}".format(
-        dbname="microblog_bench", host=self._db_host, dbuser=self._db_user))
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, created_at
-        FROM Subscriptions
-        WHERE subscriber_id = {subscriber_id} AND
-            channel_name = '{channel_name}'
-        """.format(subscriber_id=subscriber_id, channel_name=channel_name))
-    row = cursor.fetchone()
-    conn.commit()
-    conn.close()
-    if row is None:
-      raise TSubNotFoundException()
-    subscription_id, created_at = row
-    return TSubEntry(id=subscription_id, subscriber_id=subscriber_id,
-        channel_name=channel_name, created_at=created_at)
+    with self._db.connection() as conn:
+      cursor = conn.cursor()
+      with tracing.span("query"):
+        GET_SUBSCRIPTION.execute(cursor, subscriber_id, channel_name)
+      row = cursor.fetchone()
+      with tracing.span("commit"):
+        conn.commit()
+      if row is None:
+        raise TSubNotFoundException()
+      subscription_id, created_at = row
+      return TSubEntry(id=subscription_id, subscriber_id=subscriber_id,
+          channel_name=channel_name, created_at=created_at)
 
   def get_subscribers_of_channel(self, channel_name):
-    conn = psycopg2.connect("dbname='{dbname}' host='{host}' user={dbuser}".format(
-        dbname="microblog_bench", host=self._db_host, dbuser=self._db_user))
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, subscriber_id, created_at
-        FROM Subscriptions
-        WHERE channel_name = '{channel_name}'
-        """.format(channel_name=channel_name))
-    rows = cursor.fetchall()
-    conn.commit()
-    conn.close()
-    return [
-        TSubEntry(id=subscription_id, subscriber_id=subscriber_id,
-            channel_name=channel_name, created_at=created_at)
-        for (subscription_id, subscriber_id, created_at) in rows
-    ]
+    with self._db.connection() as conn:
+      cursor = conn.cursor()
+      with tracing.span("query"):
+        GET_SUBSCRIBERS_OF_CHANNEL.execute(cursor, channel_name)
+      rows = cursor.fetchall()
+      with tracing.span("commit"):
+        conn.commit()
+      return [
+          TSubEntry(id=subscription_id, subscriber_id=subscriber_id,
+              channel_name=channel_name, created_at=created_at)
+          for (subscription_id, subscriber_id, created_at) in rows
+      ]
 
   def get_channels_subscribed_by(self, subscriber_id):
-    conn = psycopg2.connect("dbname='{dbname}' host='{host}' user={dbuser}".format(
-        dbname="microblog_bench", host=self._db_host, dbuser=self._db_user))
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, channel_name, created_at
-        FROM Subscriptions
-        WHERE subscriber_id = {subscriber_id}
-        """.format(subscriber_id=subscriber_id))
-    rows = cursor.fetchall()
-    conn.commit()
-    conn.close()
-    return [
-        TSubEntry(id=subscription_id, subscriber_id=subscriber_id,
-            channel_name=channel_name, created_at=created_at)
-        for (subscription_id, channel_name, created_at) in rows
-    ]
+    with self._db.connection() as conn:
+      cursor = conn.cursor()
+      with tracing.span("query"):
+        GET_CHANNELS_SUBSCRIBED_BY.execute(cursor, subscriber_id)
+      rows = cursor.fetchall()
+      with tracing.span("commit"):
+        conn.commit()
+      return [
+          TSubEntry(id=subscription_id, subscriber_id=subscriber_id,
+              channel_name=channel_name, created_at=created_at)
+          for (subscription_id, channel_name, created_at) in rows
+      ]
 
 
 class Server:
-  def __init__(self, ip_address, port, thread_pool_size, db_host, db_user):
+  def __init__(self, ip_address, port, thread_pool_size, db_host, db_user,
+      db_max_lifetime=600.0, db_stats_interval=10.0):
     self._ip_address = ip_address
     self._port = port
     self._thread_pool_size = thread_pool_size
     self._db_host = db_host
     self._db_user = db_user
+    self._db_max_lifetime = db_max_lifetime
+    self._db_stats_interval = db_stats_interval
 
   def serve(self):
-    handler = Handler(self._db_host, self._db_user)
-    processor = TSubService.Processor(handler)
+    db = wise_db.create_pool(self._db_host, self._db_user,
+        self._thread_pool_size, self._db_max_lifetime,
+        self._db_stats_interval)
+    handler = Handler(db)
+    processor = tracing.TracingProcessor(TSubService.Processor(handler))
     transport = TSocket.TServerSocket(host=self._ip_address, port=self._port)
     tfactory = TTransport.TBufferedTransportFactory()
     pfactory = TBinaryProtocol.TBinaryProtocolFactory()
@@ -125,8 +142,19 @@ class Server:
 @click.option("--thread_pool_size", prompt="Thread pool size", type=click.INT)
 @click.option("--db_host", prompt="PostgreSQL host")
 @click.option("--db_user", prompt="PostgreSQL user")
-def main(ip_address, port, thread_pool_size, db_host, db_user):
-  server = Server(ip_address, port, thread_pool_size, db_host, db_user)
+# Directory to write the spans of the server to when it exits; tracing is
+# disabled if unset.
+@click.option("--trace_dir", envvar="WISE_TRACE_DIR", default=None)
+@click.option("--db_max_lifetime", default=600.0, type=click.FLOAT)
+# Period (seconds) of the database pool stats written to the log; 0 disables
+# them.
+@click.option("--db_stats_interval", default=10.0, type=click.FLOAT)
+def main(ip_address, port, thread_pool_size, db_host, db_user, trace_dir,
+    db_max_lifetime, db_stats_interval):
+  if trace_dir is not None:
+    tracing.configure("sub", trace_dir)
+  server = Server(ip_address, port, thread_pool_size, db_host, db_user,
+      db_max_lifetime, db_stats_interval)
   server.serve()
 
 
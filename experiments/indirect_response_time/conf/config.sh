@@ -49,23 +49,68 @@ readonly CLIENT_HOSTS="<FILL IN>"
 readonly WORKLOAD_CONFIG="conf/bursty.yml"
 # Path of the session config yml file (relative to the experiment root)
 readonly SESSION_CONFIG="conf/session.yml"
+# Load generator engine; either "thread" (one OS thread per session) or
+# "asyncio" (one coroutine per session; the synchronous actions of the
+# microblog sessions still run on one executor thread per session)
+readonly CLIENT_ENGINE="thread"
+# Number of load generator processes per client host
+readonly CLIENT_PROCESSES=1
+# HTTP connections per load generator process shared by all its sessions; 0
+# gives every session its own keep-alive connection
+readonly CLIENT_MAX_CONNECTIONS=0
+
+# Web tier; either "apache" (Flask under Apache/mod_wsgi) or "asgi" (the
+# asynchronous variant under uvicorn)
+readonly WEB_SERVER="apache"
+# Number of uvicorn worker processes of the asgi web tier
+readonly ASGI_WORKERS=4
+
+# Policy used by the web tier and the workers to pick the server of each
+# call; one of "random", "round_robin", "least_outstanding" and "p2c"
+readonly BALANCING_POLICY="random"
+
+# Staleness bound (seconds) of the pages of recent posts cached by the web
+# tier; 0 only coalesces concurrent identical requests
+readonly WEB_PAGE_CACHE_TTL=0.1
+
+# Whether the web tier sheds requests over an adaptive concurrency limit with
+# fast 503s, writes (sign_up, create_post) ahead of reads; either 0 or 1
+readonly ENABLE_ADMISSION_CONTROL=0
+# Latency (seconds) above which the web tier lowers its concurrency limit
+readonly ADMISSION_TARGET_LATENCY=0.25
+# Time (seconds) after which requests still queued in Apache are shed;
+# "null" for no bound
+readonly ADMISSION_MAX_QUEUE_TIME=1.0
+
+# Whether the web tier, the workers and the microservices record tracing
+# spans, collected under logs/tracing; either 0 or 1
+readonly ENABLE_TRACING=0
+# Directory of each host the spans are written to
+readonly TRACE_DIR="/tmp/wise_tracing"
 
 # Apache/mod_wsgi configuration.
 readonly APACHE_PROCESSES=8
 readonly APACHE_THREADSPERPROCESS=4
 
-# Postgres configuration.
-readonly POSTGRES_MAXCONNECTIONS=175
+# Postgres configuration; each microservice server opens up to one connection
+# per thread, and the queue server one more for garbage collection
+readonly POSTGRES_MAXCONNECTIONS=250
 
 # Workers configuration.
 readonly NUM_WORKERS=32
+# Maximum number of posts claimed by a worker per call to the queue; larger
+# batches save round trips but leave posts waiting behind a busy worker
+readonly WORKER_DEQUEUE_BATCH_SIZE=4
 
-# Microservices configuration.
+# Microservices configuration. A server thread serves one client connection at
+# a time, so the servers of the inbox, queue and subscription services need a
+# thread per worker on top of those of the web tier's pools, which are sized
+# from what is left.
 MICROBLOG_THREADPOOLSIZE=32
 AUTH_THREADPOOLSIZE=32
-INBOX_THREADPOOLSIZE=32
-QUEUE_THREADPOOLSIZE=32
-SUB_THREADPOOLSIZE=32
+INBOX_THREADPOOLSIZE=48
+QUEUE_THREADPOOLSIZE=48
+SUB_THREADPOOLSIZE=48
 
 # Either 0 or 1.
 readonly WISE_DEBUG=0
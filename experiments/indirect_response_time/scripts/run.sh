@@ -300,12 +300,17 @@ for K in "${!microservice_hosts[@]}"; do
   port=${microservice_ports[$K]}
   threadpool_size=${microservice_threadpool_sizes[$K]}
   image="$K"
+  if [[ $ENABLE_TRACING -eq 1 ]]; then
+    tracing_flags="-e WISE_TRACE_DIR=$TRACE_DIR -v $TRACE_DIR:$TRACE_DIR"
+  else
+    tracing_flags=""
+  fi
   echo "  [$(date +%s)] Setting up microservice class \"$K\""
   for host in $hosts; do
     echo "    [$(date +%s)] Setting up microservice class \"$K\" on host $host"
     ssh -T -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no \
         -o BatchMode=yes $USERNAME@$host "
-        sudo docker run -d -p ${port}:${port} wisebenchmark/${image}:v1.0 $port $threadpool_size $POSTGRESQL_HOST $USERNAME
+        sudo docker run -d -p ${port}:${port} $tracing_flags wisebenchmark/${image}:v1.0 $port $threadpool_size $POSTGRESQL_HOST $USERNAME
     " &
     sessions[$n_sessions]=$!
     let n_sessions=n_sessions+1
@@ -328,7 +333,10 @@ for host in $WEB_HOSTS; do
   APACHE_PYTHONPATH=$wise_home/WISEServices/queue_/include/py/:$APACHE_PYTHONPATH
   APACHE_PYTHONPATH=$wise_home/WISEServices/sub/include/py/:$APACHE_PYTHONPATH
   APACHE_PYTHONPATH=$wise_home/microblog_bench/services/microblog/include/py/:$APACHE_PYTHONPATH
+  APACHE_PYTHONPATH=$wise_home/WISEServices/rpc/include/py/:$APACHE_PYTHONPATH
   APACHE_PYTHONHOME=$wise_home/.env
+  ASGI_PYTHONPATH=$APACHE_PYTHONPATH
+  ASGI_PYTHONHOME=$APACHE_PYTHONHOME
   APACHE_WSGIDIRPATH=${APACHE_WSGIDIRPATH//\//\\\\\/}
   APACHE_PYTHONPATH=${APACHE_PYTHONPATH//\//\\\\\/}
   APACHE_PYTHONHOME=${APACHE_PYTHONHOME//\//\\\\\/}
@@ -349,6 +357,11 @@ for host in $WEB_HOSTS; do
     pip install flask_httpauth
     pip install pyyaml
     pip install thrift
+    pip install orjson
+    if [ \"$WEB_SERVER\" = \"asgi\" ]; then
+      pip install starlette
+      pip install uvicorn
+    fi
     deactivate
 
     # Generate Thrift code.
@@ -365,6 +378,9 @@ for host in $WEB_HOSTS; do
     export APACHE_PROCESSES=$APACHE_PROCESSES
     export APACHE_THREADSPERPROCESS=$APACHE_THREADSPERPROCESS
     export APACHE_WSGIFILENAME=web.wsgi
+    export ASGI_PYTHONPATH=\"$ASGI_PYTHONPATH\"
+    export ASGI_PYTHONHOME=\"$ASGI_PYTHONHOME\"
+    export ASGI_WORKERS=$ASGI_WORKERS
     export AUTH_HOSTS=$AUTH_HOSTS
     export AUTH_PORT=$AUTH_PORT
     export INBOX_HOSTS=$INBOX_HOSTS
@@ -375,8 +391,23 @@ for host in $WEB_HOSTS; do
     export QUEUE_PORT=$QUEUE_PORT
     export SUB_HOSTS=$SUB_HOSTS
     export SUB_PORT=$SUB_PORT
-
-    $wise_home/microblog_bench/web/scripts/start_server.sh apache
+    export WEB_HOSTS=\"$WEB_HOSTS\"
+    export WORKER_HOSTS=\"$WORKER_HOSTS\"
+    export NUM_WORKERS=$NUM_WORKERS
+    export AUTH_THREADPOOLSIZE=$AUTH_THREADPOOLSIZE
+    export INBOX_THREADPOOLSIZE=$INBOX_THREADPOOLSIZE
+    export MICROBLOG_THREADPOOLSIZE=$MICROBLOG_THREADPOOLSIZE
+    export QUEUE_THREADPOOLSIZE=$QUEUE_THREADPOOLSIZE
+    export SUB_THREADPOOLSIZE=$SUB_THREADPOOLSIZE
+    export BALANCING_POLICY=$BALANCING_POLICY
+    export WEB_PAGE_CACHE_TTL=$WEB_PAGE_CACHE_TTL
+    export ENABLE_ADMISSION_CONTROL=$ENABLE_ADMISSION_CONTROL
+    export ADMISSION_TARGET_LATENCY=$ADMISSION_TARGET_LATENCY
+    export ADMISSION_MAX_QUEUE_TIME=$ADMISSION_MAX_QUEUE_TIME
+    export ENABLE_TRACING=$ENABLE_TRACING
+    export TRACE_DIR=$TRACE_DIR
+
+    $wise_home/microblog_bench/web/scripts/start_server.sh $WEB_SERVER
   " &
   sessions[$n_sessions]=$!
   let n_sessions=n_sessions+1
@@ -408,6 +439,7 @@ for host in $WORKER_HOSTS; do
 
     # Export configuration parameters.
     export NUM_WORKERS=$NUM_WORKERS
+    export WORKER_DEQUEUE_BATCH_SIZE=$WORKER_DEQUEUE_BATCH_SIZE
     export INBOX_HOSTS=$INBOX_HOSTS
     export INBOX_PORT=$INBOX_PORT
     export QUEUE_HOSTS=$QUEUE_HOSTS
@@ -416,6 +448,9 @@ for host in $WORKER_HOSTS; do
     export SUB_PORT=$SUB_PORT
     export WISE_HOME=$wise_home
     export WISE_DEBUG=$WISE_DEBUG
+    export BALANCING_POLICY=$BALANCING_POLICY
+    export ENABLE_TRACING=$ENABLE_TRACING
+    export TRACE_DIR=$TRACE_DIR
 
     $wise_home/microblog_bench/worker/scripts/start_workers.sh
   " &
@@ -561,7 +596,8 @@ for host in $CLIENT_HOSTS; do
 
     # Load balance.
     mkdir -p $wise_home/logs
-    python $wise_home/microblog_bench/client/session.py --config $wise_home/experiments/indirect_response_time/$WORKLOAD_CONFIG --hostname $WEB_HOSTS --port 80 --prefix microblog
+    mkdir -p logs/wise_load
+    python $wise_home/microblog_bench/client/session.py --config $wise_home/experiments/indirect_response_time/$WORKLOAD_CONFIG --hostname $WEB_HOSTS --port 80 --prefix microblog --engine $CLIENT_ENGINE --processes $CLIENT_PROCESSES --max-connections $CLIENT_MAX_CONNECTIONS --summary logs/wise_load/summary.json
   " &
   sessions[$n_sessions]=$!
   let n_sessions=n_sessions+1
@@ -588,6 +624,7 @@ for K in "${!host_log_names[@]}"; do
     if [[ " $container_instrumented_hosts " =~ .*\ $host\ .* ]]; then is_docker_instrumented=1; else is_docker_instrumented=0; fi
     if [[ " $instrumented_hosts " =~ .*\ $host\ .* ]]; then is_instrumented=1; else is_instrumented=0; fi
     if [[ " $WEB_HOSTS " =~ .*\ $host\ .* ]]; then is_web=1; else is_web=0; fi
+    if [[ " $WORKER_HOSTS " =~ .*\ $host\ .* ]]; then is_worker=1; else is_worker=0; fi
 
     ssh -T -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no \
         -o BatchMode=yes $USERNAME@$host "
@@ -613,8 +650,24 @@ for K in "${!host_log_names[@]}"; do
           sleep 4s
         fi
 
+        if [[ \"$ENABLE_TRACING\" -eq 1 ]]; then
+          # Stop the web tier and the workers, which write their spans when
+          # they exit (the microservices did when their container stopped).
+          if [[ \"$is_web\" -eq 1 ]]; then
+            $wise_home/microblog_bench/web/scripts/stop_server.sh $WEB_SERVER
+          fi
+          if [[ \"$is_worker\" -eq 1 ]]; then
+            $wise_home/microblog_bench/worker/scripts/stop_workers.sh
+          fi
+          sleep 4s
+        fi
+
         # Collect log data.
         mkdir -p logs
+        if [[ \"$ENABLE_TRACING\" -eq 1 ]]; then
+          mkdir -p logs/tracing
+          cp $TRACE_DIR/*.csv logs/tracing 2> /dev/null
+        fi
         if [[ \"$is_instrumented\" -eq 1 ]]; then
           if [[ \"$ENABLE_COLLECTL\" -eq 1 ]]; then
             mkdir -p logs/collectl
@@ -1,15 +1,22 @@
-import os
-import random
-
 import click
-import requests
 
 import wise_load
 
 
 class MicroblogSession(wise_load.Session):
-  def __init__(self, session_config_filename, hostname, port, prefix):
+  def __init__(self, session_config_filename, hostname, port, prefix,
+      max_connections=0, keep_alive=True):
     super().__init__(session_config_filename)
+    # [NOTE] By default every session keeps its own connection open, as a
+    # browser would. With |max_connections| set, the sessions of a process
+    # share a pool of at most that many connections to the server.
+    if max_connections > 0:
+      self._http = wise_load.shared_http_transport(max_connections,
+          keep_alive)
+      self._owns_http = False
+    else:
+      self._http = wise_load.HttpTransport(1, keep_alive)
+      self._owns_http = True
     self._username = self.random_string(10)
     self._password = self.random_string(10)
     self._first_name = self.random_string(10)
@@ -20,68 +27,113 @@ class MicroblogSession(wise_load.Session):
     self._url_prefix = "http://{hostname}:{port}/{prefix}".format(
         hostname=hostname, port=port, prefix=prefix)
 
+  def _rejected(self, action_name, r):
+    """Whether the web tier shed the request of |action_name|, which is then
+    counted as an error."""
+    if r.status_code != 503:
+      return False
+    self.record_error(action_name)
+    return True
+
   def sign_up(self):
-    requests.post(self._url_prefix + "/account",
+    r = self._http.post(self._url_prefix + "/account",
         json={
             "username": self._username,
             "password": self._password,
             "first_name": self._first_name,
             "last_name": self._last_name
         })
+    self._rejected("sign_up", r)
 
   def create_post(self):
-    requests.post(self._url_prefix + "/post",
+    r = self._http.post(self._url_prefix + "/post",
         auth=(self._username, self._password),
         json={
             "text": self.random_string(140)
         })
+    self._rejected("create_post", r)
 
   def endorse_post(self):
     if self._post_to_endorse is not None:
-      requests.post(
+      r = self._http.post(
           self._url_prefix + "/endorsement/%s" % self._post_to_endorse,
           auth=(self._username, self._password))
+      self._rejected("endorse_post", r)
       self._post_to_endorse = None
 
   def view_inbox(self):
-    r = requests.get(self._url_prefix + "/inbox",
+    r = self._http.get(self._url_prefix + "/inbox",
         auth=(self._username, self._password))
+    if self._rejected("view_inbox", r):
+      return
     try:
       posts = r.json()
       if posts:
-        self._post_to_read = random.choice(posts)["id"]
-        self._user_to_subscribe = random.choice(posts)["author_id"]
+        self._post_to_read = self.random().choice(posts)["id"]
+        self._user_to_subscribe = self.random().choice(posts)["author_id"]
     except ValueError as e:
       print(f"Error: could not fetch route /inbox:\n{e}")
+      self.record_error("view_inbox")
 
   def view_recent_posts(self):
-    r = requests.get(self._url_prefix + "/post",
+    r = self._http.get(self._url_prefix + "/post",
         auth=(self._username, self._password))
+    if self._rejected("view_recent_posts", r):
+      return
     try:
       posts = r.json()
       if posts:
-        self._post_to_read = random.choice(posts)["id"]
-        self._user_to_subscribe = random.choice(posts)["author_id"]
+        self._post_to_read = self.random().choice(posts)["id"]
+        self._user_to_subscribe = self.random().choice(posts)["author_id"]
     except ValueError as e:
       print(f"Error: could not fetch route /post:\n{e}")
+      self.record_error("view_recent_posts")
 
   def subscribe_to_user(self):
     if self._user_to_subscribe is not None:
-      requests.post(
+      r = self._http.post(
           self._url_prefix + "/subscription/%s" % self._user_to_subscribe,
           auth=(self._username, self._password))
+      self._rejected("subscribe_to_user", r)
       self._user_to_subscribe = None
 
+  def close(self):
+    if self._owns_http:
+      self._http.close()
+
 
 @click.command()
-@click.option("--config", prompt="Configuration file")
+@click.option("--config", default=None)
+@click.option("--schedule", default=None)
+@click.option("--seed", default=None, type=click.INT)
 @click.option("--hostname", prompt="Hostname")
 @click.option("--port", prompt="Port", type=click.INT)
 @click.option("--prefix", default="")
-def main(config, hostname, port, prefix):
-  workload = wise_load.Workload(MicroblogSession, config, hostname, port,
-      prefix)
-  workload.start()
+@click.option("--engine", type=click.Choice(["thread", "asyncio"]),
+    default="thread")
+@click.option("--processes", default=1, type=click.INT)
+@click.option("--summary", default=None)
+@click.option("--max-connections", default=0, type=click.INT)
+@click.option("--keep-alive/--no-keep-alive", default=True)
+@click.option("--metrics-port", default=None, type=click.INT)
+def main(config, schedule, seed, hostname, port, prefix, engine, processes,
+    summary, max_connections, keep_alive, metrics_port):
+  workload_cls = {
+      "thread": wise_load.Workload,
+      "asyncio": wise_load.AsyncWorkload
+  }[engine]
+  if schedule is not None:
+    workload = workload_cls.from_schedule(MicroblogSession, schedule, hostname,
+        port, prefix, max_connections, keep_alive)
+  elif config is not None:
+    workload = workload_cls(MicroblogSession, config, hostname, port, prefix,
+        max_connections, keep_alive, seed=seed)
+  else:
+    raise click.UsageError("Either --config or --schedule is required")
+  stats = workload.start(processes, metrics_port)
+  print(stats.summary())
+  if summary is not None:
+    stats.dump(summary)
 
 
 if __name__ == "__main__":
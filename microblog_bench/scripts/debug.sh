@@ -39,6 +39,7 @@ export PYTHONPATH=$WISE_HOME/WISEServices/inbox/include/py/:$PYTHONPATH
 export PYTHONPATH=$WISE_HOME/WISEServices/queue_/include/py/:$PYTHONPATH
 export PYTHONPATH=$WISE_HOME/WISEServices/sub/include/py/:$PYTHONPATH
 export PYTHONPATH=$WISE_HOME/microblog_bench/services/microblog/include/py/:$PYTHONPATH
+export PYTHONPATH=$WISE_HOME/WISEServices/rpc/include/py/:$PYTHONPATH
 
 # Set up the database.
 dropdb --if-exists microblog_bench
@@ -91,6 +92,12 @@ echo "Running unit tests for the subscription microservice..."
 python $WISE_HOME/WISEServices/sub/test/py/unit.py
 echo "Running unit tests for the microblog microservice..."
 python $WISE_HOME/microblog_bench/services/microblog/test/py/unit.py
+echo "Running unit tests for the client pools and balancing policies..."
+python $WISE_HOME/WISEServices/rpc/test/py/unit.py
+echo "Running unit tests for the load generator..."
+python $WISE_HOME/WISELoad/test/py/unit.py
+echo "Running unit tests for the web tier..."
+python $WISE_HOME/microblog_bench/web/test/py/unit.py
 
 # Render workload.yml.
 ESCAPED_WISE_HOME=${WISE_HOME//\//\\\/}
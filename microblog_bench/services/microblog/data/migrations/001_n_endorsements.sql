@@ -0,0 +1,21 @@
+-- Add the count of endorsements of each post, and backfill it. Endorsements
+-- are locked out meanwhile, so that none is missed; running this again
+-- recounts them.
+BEGIN;
+
+ALTER TABLE Posts ADD COLUMN IF NOT EXISTS n_endorsements INTEGER NOT NULL
+  DEFAULT 0;
+
+LOCK TABLE Endorsements IN SHARE MODE;
+
+UPDATE Posts
+SET n_endorsements = Counts.n_endorsements
+FROM (
+  SELECT post_id, COUNT(*) AS n_endorsements
+  FROM Endorsements
+  GROUP BY post_id
+) AS Counts
+WHERE Posts.id = Counts.post_id AND
+  Posts.n_endorsements <> Counts.n_endorsements;
+
+COMMIT;
@@ -0,0 +1,21 @@
+-- Store the creation times of posts and endorsements as timestamps rather
+-- than formatted strings; tables already migrated are left as they are.
+BEGIN;
+
+DO $$
+DECLARE
+  table_name_ TEXT;
+BEGIN
+  FOREACH table_name_ IN ARRAY ARRAY['posts', 'endorsements'] LOOP
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_name = table_name_ AND column_name = 'created_at') =
+        'character varying' THEN
+      EXECUTE format('ALTER TABLE %I ALTER COLUMN created_at TYPE TIMESTAMP '
+          'USING to_timestamp(created_at, ''YYYY-MM-DD-HH24-MI-SS'')',
+          table_name_);
+    END IF;
+  END LOOP;
+END
+$$;
+
+COMMIT;
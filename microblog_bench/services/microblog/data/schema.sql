@@ -2,11 +2,15 @@ DROP TABLE IF EXISTS Endorsements;
 DROP TABLE IF EXISTS Posts;
 
 CREATE TABLE Posts(
+  -- Recent posts are read newest first, before a given id, through the
+  -- primary key.
   id SERIAL PRIMARY KEY,
   author_id INTEGER NOT NULL,
   parent_id INTEGER,
   text VARCHAR(280) NOT NULL,
-  created_at VARCHAR(64) NOT NULL,
+  created_at TIMESTAMP NOT NULL,
+  -- Number of Endorsements of the post, kept up to date by endorse_post.
+  n_endorsements INTEGER NOT NULL DEFAULT 0,
   FOREIGN KEY(parent_id) REFERENCES Posts(id)
 );
 
@@ -14,6 +18,6 @@ CREATE TABLE Endorsements(
   id SERIAL PRIMARY KEY,
   endorser_id INTEGER NOT NULL,
   post_id INTEGER NOT NULL,
-  created_at VARCHAR(64) NOT NULL,
+  created_at TIMESTAMP NOT NULL,
   FOREIGN KEY(post_id) REFERENCES Posts(id)
 );
@@ -5,6 +5,7 @@ sys.path.insert(0,
         "..", "..", "..", ".."))
 
 from microblog.src.py.gen_microblog.microblog.ttypes import TPost
+from microblog.src.py.gen_microblog.microblog import TMicroblogService
 from microblog.src.py.client import Client
 
 sys.path = original_sys_path 
@@ -1,6 +1,7 @@
 from thrift.transport import TSocket
 from thrift.transport import TTransport
 from thrift.protocol import TBinaryProtocol
+import wise_rpc
 
 from .gen_microblog.microblog import TMicroblogService
 
@@ -21,6 +22,9 @@ class Client:
     if self._transport.isOpen():
       self._transport.close()
 
+  def is_open(self):
+    return wise_rpc.is_connection_open(self._transport, self._socket)
+
   def create_post(self, text, author_id, parent_id=None):
     return self._tclient.create_post(text=text, author_id=author_id,
         parent_id=parent_id)
@@ -31,5 +35,8 @@ class Client:
   def get_post(self, post_id):
     return self._tclient.get_post(post_id=post_id)
 
-  def recent_posts(self, n, offset):
-    return self._tclient.recent_posts(n=n, offset=offset)
+  def get_posts(self, post_ids):
+    return self._tclient.get_posts(post_ids=post_ids)
+
+  def recent_posts(self, n, before_id=None):
+    return self._tclient.recent_posts(n=n, before_id=before_id)
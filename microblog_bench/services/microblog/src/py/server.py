@@ -1,108 +1,146 @@
 import datetime
 
 import click
-import psycopg2
 from thrift.transport import TSocket
 from thrift.transport import TTransport
 from thrift.protocol import TBinaryProtocol
 from thrift.server.TServer import TThreadPoolServer
+import wise_db
+from wise_rpc import tracing
 
 from gen_microblog.microblog import TMicroblogService
 from gen_microblog.microblog.ttypes import TPost
 
 
+CREATE_POST = wise_db.Statement("create_post", """
+    INSERT INTO Posts (author_id, parent_id, text, created_at)
+    VALUES ($1, $2, $3, $4)
+    RETURNING id
+    """)
+
+ENDORSE_POST = wise_db.Statement("endorse_post", """
+    INSERT INTO Endorsements (endorser_id, post_id, created_at)
+    VALUES ($1, $2, $3)
+    """)
+
+INCREMENT_ENDORSEMENTS = wise_db.Statement("increment_endorsements", """
+    UPDATE Posts SET n_endorsements = n_endorsements + 1 WHERE id = $1
+    """)
+
+GET_POST = wise_db.Statement("get_post", """
+    SELECT author_id, parent_id, text, n_endorsements
+    FROM Posts
+    WHERE id = $1
+    """)
+
+# [NOTE] The ids are bound as one array, so that the statement is the same
+# whatever the number of posts.
+GET_POSTS = wise_db.Statement("get_posts", """
+    SELECT id, author_id, parent_id, text, n_endorsements
+    FROM Posts
+    WHERE id = ANY($1)
+    """)
+
+RECENT_POSTS = wise_db.Statement("recent_posts", """
+    SELECT id, author_id, parent_id, text, n_endorsements
+    FROM Posts
+    WHERE id < COALESCE($1, 2147483647)
+    ORDER BY id DESC
+    LIMIT $2
+    """)
+
+
 class Handler:
-  def __init__(self, db_host, db_user):
-    self._db_host = db_host
-    self._db_user = db_user
+  def __init__(self, db):
+    self._db = db
 
   def create_post(self, text, author_id, parent_id):
-    conn = psycopg2.connect("dbname='{dbname}' host='{host}' user={dbuser}".format(
-        dbname="microblog_bench", host=self._db_host, dbuser=self._db_user))
-    cursor = conn.cursor()
-    now = datetime.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
-    cursor.execute("""
-        INSERT INTO Posts (author_id, parent_id, text, created_at)
-        VALUES ({author_id}, {parent_id}, '{text}', '{now}')
-        RETURNING id
-        """.format(author_id=author_id,
-            parent_id=parent_id if parent_id else "null", text=text,
-            now=now))
-    post_id = cursor.fetchone()[0]
-    conn.commit()
-    conn.close()
-    return post_id
+    with self._db.connection() as conn:
+      cursor = conn.cursor()
+      now = datetime.datetime.now()
+      with tracing.span("query"):
+        CREATE_POST.execute(cursor, author_id, parent_id or None, text, now)
+      post_id = cursor.fetchone()[0]
+      with tracing.span("commit"):
+        conn.commit()
+      return post_id
 
   def endorse_post(self, endorser_id, post_id):
-    conn = psycopg2.connect("dbname='{dbname}' host='{host}' user={dbuser}".format(
-        dbname="microblog_bench", host=self._db_host, dbuser=self._db_user))
-    cursor = conn.cursor()
-    now = datetime.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
-    cursor.execute("""
-        INSERT INTO Endorsements (endorser_id, post_id, created_at)
-        VALUES ({endorser_id}, {post_id}, '{now}')
-        """.format(endorser_id=endorser_id, post_id=post_id, now=now))
-    conn.commit()
-    conn.close()
+    with self._db.connection() as conn:
+      cursor = conn.cursor()
+      now = datetime.datetime.now()
+      with tracing.span("query"):
+        ENDORSE_POST.execute(cursor, endorser_id, post_id, now)
+      # [NOTE] The count of endorsements of the post is kept up to date in the
+      # same transaction, so that reads need not count them.
+      with tracing.span("query"):
+        INCREMENT_ENDORSEMENTS.execute(cursor, post_id)
+      with tracing.span("commit"):
+        conn.commit()
 
   def get_post(self, post_id):
-    conn = psycopg2.connect("dbname='{dbname}' host='{host}' user={dbuser}".format(
-        dbname="microblog_bench", host=self._db_host, dbuser=self._db_user))
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT author_id, parent_id, text, created_at
-        FROM Posts
-        WHERE id = '{post_id}'
-        """.format(post_id=post_id))
-    row = cursor.fetchone()
-    author_id, parent_id, text, created_at = row
-    cursor.execute("""
-        SELECT COUNT(*)
-        FROM Endorsements
-        WHERE post_id = '{post_id}'
-        """.format(post_id=post_id))
-    n_endorsements = cursor.fetchone()[0]
-    conn.commit()
-    conn.close()
-    return TPost(id=post_id, text=text, author_id=author_id,
-        n_endorsements=n_endorsements, parent_id=parent_id)
-
-  def recent_posts(self, n, offset):
-    conn = psycopg2.connect("dbname='{dbname}' host='{host}' user={dbuser}".format(
-        dbname="microblog_bench", host=self._db_host, dbuser=self._db_user))
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, author_id, parent_id, text, created_at
-        FROM Posts
-        LIMIT {n} OFFSET {offset}
-        """.format(n=n, offset=offset))
-    posts = []
-    for row in cursor.fetchall():
-      post_id, author_id, parent_id, text, created_at = row
-      cursor.execute("""
-          SELECT COUNT(*)
-          FROM Endorsements
-          WHERE post_id = '{post_id}'
-          """.format(post_id=post_id))
-      n_endorsements = cursor.fetchone()[0]
-      posts.append(TPost(id=post_id, text=text, author_id=author_id,
-          n_endorsements=n_endorsements, parent_id=parent_id))
-    conn.commit()
-    conn.close()
-    return posts
+    with self._db.connection() as conn:
+      cursor = conn.cursor()
+      with tracing.span("query"):
+        GET_POST.execute(cursor, post_id)
+      row = cursor.fetchone()
+      author_id, parent_id, text, n_endorsements = row
+      with tracing.span("commit"):
+        conn.commit()
+      return TPost(id=post_id, text=text, author_id=author_id,
+          n_endorsements=n_endorsements, parent_id=parent_id)
+
+  def get_posts(self, post_ids):
+    if not post_ids:
+      return []
+    with self._db.connection() as conn:
+      cursor = conn.cursor()
+      with tracing.span("query"):
+        GET_POSTS.execute(cursor, list(set(post_ids)))
+      posts = {}
+      for row in cursor.fetchall():
+        post_id, author_id, parent_id, text, n_endorsements = row
+        posts[post_id] = TPost(id=post_id, text=text, author_id=author_id,
+            n_endorsements=n_endorsements, parent_id=parent_id)
+      with tracing.span("commit"):
+        conn.commit()
+      # [NOTE] Posts are returned in the order requested; ids of missing posts
+      # are skipped.
+      return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+  def recent_posts(self, n, before_id):
+    with self._db.connection() as conn:
+      cursor = conn.cursor()
+      with tracing.span("query"):
+        RECENT_POSTS.execute(cursor, before_id, n)
+      posts = [
+          TPost(id=post_id, text=text, author_id=author_id,
+              n_endorsements=n_endorsements, parent_id=parent_id)
+          for (post_id, author_id, parent_id, text, n_endorsements)
+          in cursor.fetchall()
+      ]
+      with tracing.span("commit"):
+        conn.commit()
+      return posts
 
 
 class Server:
-  def __init__(self, ip_address, port, thread_pool_size, db_host, db_user):
+  def __init__(self, ip_address, port, thread_pool_size, db_host, db_user,
+      db_max_lifetime=600.0, db_stats_interval=10.0):
     self._ip_address = ip_address
     self._port = port
     self._thread_pool_size = thread_pool_size
     self._db_host = db_host
     self._db_user = db_user
+    self._db_max_lifetime = db_max_lifetime
+    self._db_stats_interval = db_stats_interval
 
   def serve(self):
-    handler = Handler(self._db_host, self._db_user)
-    processor = TMicroblogService.Processor(handler)
+    db = wise_db.create_pool(self._db_host, self._db_user,
+        self._thread_pool_size, self._db_max_lifetime,
+        self._db_stats_interval)
+    handler = Handler(db)
+    processor = tracing.TracingProcessor(TMicroblogService.Processor(handler))
     transport = TSocket.TServerSocket(host=self._ip_address, port=self._port)
     tfactory = TTransport.TBufferedTransportFactory()
     pfactory = TBinaryProtocol.TBinaryProtocolFactory()
@@ -117,8 +155,19 @@ class Server:
 @click.option("--thread_pool_size", prompt="Thread pool size", type=click.INT)
 @click.option("--db_host", prompt="PostgreSQL host")
 @click.option("--db_user", prompt="PostgreSQL user")
-def main(ip_address, port, thread_pool_size, db_host, db_user):
-  server = Server(ip_address, port, thread_pool_size, db_host, db_user)
+# Directory to write the spans of the server to when it exits; tracing is
+# disabled if unset.
+@click.option("--trace_dir", envvar="WISE_TRACE_DIR", default=None)
+@click.option("--db_max_lifetime", default=600.0, type=click.FLOAT)
+# Period (seconds) of the database pool stats written to the log; 0 disables
+# them.
+@click.option("--db_stats_interval", default=10.0, type=click.FLOAT)
+def main(ip_address, port, thread_pool_size, db_host, db_user, trace_dir,
+    db_max_lifetime, db_stats_interval):
+  if trace_dir is not None:
+    tracing.configure("microblog", trace_dir)
+  server = Server(ip_address, port, thread_pool_size, db_host, db_user,
+      db_max_lifetime, db_stats_interval)
   server.serve()
 
 
@@ -15,5 +15,10 @@ service TMicroblogService {
 
   TPost get_post (1:i32 post_id);
 
-  list<TPost> recent_posts (1:i32 n, 2:i32 offset);
+  list<TPost> get_posts (1:list<i32> post_ids);
+
+  // The n most recent posts with an id below before_id, or the n most recent
+  // posts if it is unset, newest first. The next page is the one before the
+  // id of the last post.
+  list<TPost> recent_posts (1:i32 n, 3:i32 before_id);
 }
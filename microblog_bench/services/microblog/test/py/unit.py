@@ -34,7 +34,22 @@ class TestService(unittest.TestCase):
     self.assertEqual(pong_post.text, "pong")
     self.assertEqual(pong_post.author_id, 1)
     self.assertEqual(pong_post.n_endorsements, 0)
-    # [TODO] Get the recent posts.
+    # Get both posts at once.
+    posts = self._client.get_posts([pong_post_id, ping_post_id, -1])
+    self.assertEqual([post.id for post in posts],
+        [pong_post_id, ping_post_id])
+    self.assertEqual([post.text for post in posts], ["pong", "ping"])
+    self.assertEqual([post.n_endorsements for post in posts], [0, 1])
+    self.assertEqual(self._client.get_posts([]), [])
+    # Endorse the ping post again.
+    self._client.endorse_post(3, ping_post_id)
+    self.assertEqual(self._client.get_post(ping_post_id).n_endorsements, 2)
+    # Get the recent posts, a page at a time.
+    posts = self._client.recent_posts(1)
+    self.assertEqual([post.id for post in posts], [pong_post_id])
+    posts = self._client.recent_posts(1, pong_post_id)
+    self.assertEqual([post.id for post in posts], [ping_post_id])
+    self.assertEqual(posts[0].n_endorsements, 2)
 
 
 if __name__ == "__main__":
@@ -6,6 +6,39 @@ cd "$(dirname "$(dirname "$(readlink -fm "$0")")")"
 # Create configuration directory.
 mkdir -p conf
 
+# Size the client pools of each web process.
+# [NOTE] A Thrift server thread serves a single connection for as long as it
+# is open, and a pool splits its size evenly among the servers of a service,
+# so the shares of all web processes must not hold more connections than the
+# threads of each server, less one for each worker calling the service (all
+# of which may call the same server); other connections would wait unserved
+# in the server's backlog.
+if [ $1 = "apache" ]; then
+  processes_per_host=${APACHE_PROCESSES:-1}
+elif [ $1 = "asgi" ]; then
+  processes_per_host=${ASGI_WORKERS:-1}
+else
+  processes_per_host=1
+fi
+n_web_processes=$(( $(echo ${WEB_HOSTS:-localhost} | wc -w) * processes_per_host ))
+n_workers=$(( $(echo $WORKER_HOSTS | wc -w) * ${NUM_WORKERS:-0} ))
+# Maximum number of connections of a web process to each server.
+max_pool_share=${WEB_CLIENT_POOL_SIZE:-8}
+
+# Usage: pool_size <server hosts> <server thread pool size> <workers>
+pool_size() {
+  local share=$(( ($2 - $3) / n_web_processes ))
+  if [ $share -lt 1 ]; then
+    echo "Warning: $2 threads per server cannot serve $n_web_processes" \
+        "web processes and $3 workers" >&2
+    share=1
+  fi
+  if [ $share -gt $max_pool_share ]; then
+    share=$max_pool_share
+  fi
+  echo $(( $(echo $1 | wc -w) * share ))
+}
+
 # Render services.yml.
 echo "authentication:" > conf/services.yml
 for authentication_host in $AUTH_HOSTS; do
@@ -32,6 +65,58 @@ for subscription_host in $SUB_HOSTS; do
   echo "  - hostname: $subscription_host" >> conf/services.yml
   echo "    port: $SUB_PORT" >> conf/services.yml
 done
+echo "balancer:" >> conf/services.yml
+echo "  policy: ${BALANCING_POLICY:-random}" >> conf/services.yml
+# The threaded (pool) and asyncio (async_pool) web tiers share the sizes.
+auth_pool_size=$(pool_size "$AUTH_HOSTS" ${AUTH_THREADPOOLSIZE:-32} 0)
+inbox_pool_size=$(pool_size "$INBOX_HOSTS" ${INBOX_THREADPOOLSIZE:-32} $n_workers)
+microblog_pool_size=$(pool_size "$MICROBLOG_HOSTS" ${MICROBLOG_THREADPOOLSIZE:-32} 0)
+queue_pool_size=$(pool_size "$QUEUE_HOSTS" ${QUEUE_THREADPOOLSIZE:-32} $n_workers)
+sub_pool_size=$(pool_size "$SUB_HOSTS" ${SUB_THREADPOOLSIZE:-32} $n_workers)
+for pool in pool async_pool; do
+  echo "$pool:" >> conf/services.yml
+  echo "  max_sizes:" >> conf/services.yml
+  echo "    authentication: $auth_pool_size" >> conf/services.yml
+  echo "    inbox: $inbox_pool_size" >> conf/services.yml
+  echo "    microblog: $microblog_pool_size" >> conf/services.yml
+  echo "    queue: $queue_pool_size" >> conf/services.yml
+  echo "    subscription: $sub_pool_size" >> conf/services.yml
+  echo "  max_idle_time: ${WEB_CLIENT_POOL_IDLE_TIME:-5}" >> conf/services.yml
+done
+echo "auth_cache:" >> conf/services.yml
+echo "  max_size: ${WEB_AUTH_CACHE_SIZE:-10000}" >> conf/services.yml
+echo "  ttl: ${WEB_AUTH_CACHE_TTL:-60}" >> conf/services.yml
+echo "page_cache:" >> conf/services.yml
+echo "  max_size: ${WEB_PAGE_CACHE_SIZE:-1024}" >> conf/services.yml
+echo "  ttl: ${WEB_PAGE_CACHE_TTL:-0.1}" >> conf/services.yml
+echo "fan_out:" >> conf/services.yml
+echo "  max_workers: ${WEB_FAN_OUT_WORKERS:-16}" >> conf/services.yml
+echo "  hydrate_chunk_size: ${WEB_HYDRATE_CHUNK_SIZE:-0}" >> conf/services.yml
+# [NOTE] The concurrency limit of each web process starts at, and never
+# exceeds, the number of requests the process serves at once: its threads
+# under Apache, and otherwise the connections of its microblog pool, which
+# every read goes through. A higher limit would never shed anything.
+if [ $1 = "apache" ]; then
+  admission_max_limit=${APACHE_THREADSPERPROCESS:-4}
+else
+  admission_max_limit=$microblog_pool_size
+fi
+echo "admission:" >> conf/services.yml
+echo "  enabled: $([ "${ENABLE_ADMISSION_CONTROL:-0}" -eq 1 ] && echo true || echo false)" >> conf/services.yml
+echo "  initial_limit: $admission_max_limit" >> conf/services.yml
+echo "  min_limit: 1" >> conf/services.yml
+echo "  max_limit: $admission_max_limit" >> conf/services.yml
+echo "  target_latency: ${ADMISSION_TARGET_LATENCY:-0.25}" >> conf/services.yml
+echo "  max_queue_time: ${ADMISSION_MAX_QUEUE_TIME:-1.0}" >> conf/services.yml
+echo "tracing:" >> conf/services.yml
+echo "  enabled: $([ "${ENABLE_TRACING:-0}" -eq 1 ] && echo true || echo false)" >> conf/services.yml
+echo "  trace_dir: ${TRACE_DIR:-/tmp/wise_tracing}" >> conf/services.yml
+
+# Create the trace directory, writable by the Apache user.
+if [ "${ENABLE_TRACING:-0}" -eq 1 ]; then
+  mkdir -p ${TRACE_DIR:-/tmp/wise_tracing}
+  chmod 777 ${TRACE_DIR:-/tmp/wise_tracing}
+fi
 
 if [ $1 = "apache" ]; then
   # Render apache2.conf.
@@ -49,6 +134,12 @@ if [ $1 = "apache" ]; then
 
   # Restart Apache.
   sudo service apache2 restart
+elif [ $1 = "asgi" ]; then
+  # Start the ASGI server on Apache's port and below its URL prefix.
+  sudo env PYTHONPATH="$ASGI_PYTHONPATH" WEB_URL_PREFIX=/microblog \
+      $ASGI_PYTHONHOME/bin/uvicorn --app-dir src web_async:app \
+      --host 0.0.0.0 --port 80 --workers $ASGI_WORKERS &
+  echo "$!" > pid
 else
   # Start flask server.
   export FLASK_APP=$WISE_HOME/microblog_bench/web/src/web.py
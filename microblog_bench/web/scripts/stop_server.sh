@@ -3,6 +3,12 @@
 if [ $1 = "apache" ]; then
   # Stop Apache.
   sudo service apache2 stop
+elif [ $1 = "asgi" ]; then
+  # Change to the parent directory.
+  cd "$(dirname "$(dirname "$(readlink -fm "$0")")")"
+  # Stop the ASGI server, which runs as root to listen on port 80.
+  sudo kill $(cat pid)
+  rm pid
 else
   # Change to the parent directory.
   cd "$(dirname "$(dirname "$(readlink -fm "$0")")")"
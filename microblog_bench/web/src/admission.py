@@ -0,0 +1,87 @@
+import collections
+import threading
+import time
+
+
+# Priority of each route (view function name); lower values go first. Writes
+# are admitted ahead of reads, which are the bulk of the load.
+DEFAULT_PRIORITIES = {
+    "sign_up": 0,
+    "create_post": 0,
+    "endorse_post": 1,
+    "subscribe_to_user": 1,
+    "inbox": 2,
+    "recent_posts": 2
+}
+
+
+class AdmissionController:
+  """Limits the number of requests in flight, shedding the others, with a
+  limit adapted to the measured latency by AIMD: it grows by one per
+  limit's worth of requests served within |target_latency| while it is in
+  use, and shrinks by |backoff| when requests exceed it.
+
+  Requests of priority p are only admitted while fewer than
+  |shares|[p] * limit requests are in flight, so that lower priorities are
+  shed first. Requests that already waited more than |max_queue_time| in the
+  server's queue are shed too."""
+
+  def __init__(self, initial_limit=32, min_limit=4, max_limit=512,
+      target_latency=0.25, backoff=0.9, shares=(1.0, 0.9, 0.75),
+      max_queue_time=None, priorities=None):
+    self._limit = float(initial_limit)
+    self._min_limit = min_limit
+    self._max_limit = max_limit
+    self._target_latency = target_latency
+    self._backoff = backoff
+    self._shares = shares
+    self._max_queue_time = max_queue_time
+    self._priorities = dict(DEFAULT_PRIORITIES, **(priorities or {}))
+    self._lock = threading.Lock()
+    self._in_flight = 0
+    self._decreased_at = time.monotonic()
+    self._admitted = collections.Counter()
+    self._rejected = collections.Counter()
+
+  def priority(self, route):
+    return self._priorities.get(route, len(self._shares) - 1)
+
+  def try_acquire(self, route, queue_time=0.0):
+    """Admit a request to |route| that waited |queue_time| seconds before
+    reaching the application, and return the time at which it was admitted,
+    to be passed to release. Return None if it is shed."""
+    priority = min(self.priority(route), len(self._shares) - 1)
+    with self._lock:
+      if (self._max_queue_time is not None and
+          queue_time > self._max_queue_time) or \
+          self._in_flight >= max(1, int(self._limit * self._shares[priority])):
+        self._rejected[route] += 1
+        return None
+      self._in_flight += 1
+      self._admitted[route] += 1
+    return time.monotonic() - queue_time
+
+  def release(self, started_at, overloaded=False):
+    """Account for the end of a request admitted at |started_at|; if
+    |overloaded|, it failed because a backend was overloaded."""
+    now = time.monotonic()
+    with self._lock:
+      in_flight = self._in_flight
+      self._in_flight -= 1
+      if overloaded or now - started_at > self._target_latency:
+        # [NOTE] Requests admitted before the last decrease saw the load that
+        # caused it, so they do not decrease the limit again.
+        if started_at > self._decreased_at:
+          self._limit = max(self._min_limit, self._limit * self._backoff)
+          self._decreased_at = now
+      elif 2 * in_flight >= self._limit:
+        self._limit = min(self._max_limit, self._limit + 1.0 / self._limit)
+
+  def stats(self):
+    with self._lock:
+      return {
+          "limit": int(self._limit),
+          "in_flight": self._in_flight,
+          "admitted": dict(self._admitted),
+          "rejected": dict(self._rejected)
+      }
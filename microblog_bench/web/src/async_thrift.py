@@ -0,0 +1,293 @@
+import asyncio
+import collections
+import contextlib
+import struct
+import time
+
+from thrift.Thrift import TException, TType
+from thrift.protocol import TBinaryProtocol
+from thrift.transport.TTransport import TMemoryBuffer, TTransportException
+
+import wise_rpc
+
+
+# Size of the values of each fixed-size type of the binary protocol.
+_FIXED_SIZES = {
+    TType.BOOL: 1,
+    TType.BYTE: 1,
+    TType.I16: 2,
+    TType.I32: 4,
+    TType.I64: 8,
+    TType.DOUBLE: 8
+}
+
+
+class _MessageScanner:
+  """Finds the end of a binary protocol message in a buffer as its bytes
+  arrive, without decoding it. Each call to scan resumes where the previous
+  one stopped, so a message is scanned once however it is split."""
+
+  def __init__(self):
+    self._offset = 0
+    # Parts of the message left to scan, the next one last: ["message"],
+    # ["fields"] of a struct, ["value", type], ["elements", type, count] of a
+    # list or set, and ["pairs", key type, value type, count] of a map.
+    self._stack = [["message"]]
+
+  def _available(self, buffer, size):
+    return len(buffer) - self._offset >= size
+
+  def _i32(self, buffer, offset):
+    return struct.unpack_from("!i", buffer, self._offset + offset)[0]
+
+  def _scan_message(self, buffer):
+    if not self._available(buffer, 4):
+      return False
+    size = self._i32(buffer, 0)
+    if size < 0:
+      # Strict: version and type, name, sequence ID.
+      if not self._available(buffer, 8):
+        return False
+      header_size = 4 + 4 + self._i32(buffer, 4) + 4
+    else:
+      # Name, type, sequence ID.
+      header_size = 4 + size + 1 + 4
+    if not self._available(buffer, header_size):
+      return False
+    self._offset += header_size
+    self._stack[-1] = ["fields"]
+    return True
+
+  def _scan_value(self, buffer, ttype):
+    top = self._stack[-1]
+    if ttype in _FIXED_SIZES:
+      if not self._available(buffer, _FIXED_SIZES[ttype]):
+        return False
+      self._offset += _FIXED_SIZES[ttype]
+      self._stack.pop()
+    elif ttype == TType.STRING:
+      if not self._available(buffer, 4) or \
+          not self._available(buffer, 4 + self._i32(buffer, 0)):
+        return False
+      self._offset += 4 + self._i32(buffer, 0)
+      self._stack.pop()
+    elif ttype == TType.STRUCT:
+      self._stack[-1] = ["fields"]
+    elif ttype in (TType.LIST, TType.SET):
+      if not self._available(buffer, 5):
+        return False
+      top[:] = ["elements", buffer[self._offset], self._i32(buffer, 1)]
+      self._offset += 5
+    elif ttype == TType.MAP:
+      if not self._available(buffer, 6):
+        return False
+      top[:] = ["pairs", buffer[self._offset], buffer[self._offset + 1],
+          self._i32(buffer, 2)]
+      self._offset += 6
+    else:
+      raise TTransportException(TTransportException.UNKNOWN,
+          "Unexpected type %d in reply" % ttype)
+    return True
+
+  def scan(self, buffer):
+    """Scan the bytes of |buffer| not scanned yet; return whether the message
+    is complete."""
+    while self._stack:
+      top = self._stack[-1]
+      if top[0] == "message":
+        if not self._scan_message(buffer):
+          return False
+      elif top[0] == "fields":
+        if not self._available(buffer, 1):
+          return False
+        if buffer[self._offset] == TType.STOP:
+          self._offset += 1
+          self._stack.pop()
+        else:
+          # Field type and ID.
+          if not self._available(buffer, 3):
+            return False
+          self._stack.append(["value", buffer[self._offset]])
+          self._offset += 3
+      elif top[0] == "value":
+        if not self._scan_value(buffer, top[1]):
+          return False
+      elif top[0] == "elements":
+        _, ttype, count = top
+        if count <= 0:
+          self._stack.pop()
+        elif ttype in _FIXED_SIZES:
+          # [NOTE] Elements of a fixed size are skipped all at once.
+          if not self._available(buffer, count * _FIXED_SIZES[ttype]):
+            return False
+          self._offset += count * _FIXED_SIZES[ttype]
+          self._stack.pop()
+        else:
+          top[2] -= 1
+          self._stack.append(["value", ttype])
+      else:
+        _, key_type, value_type, count = top
+        if count <= 0:
+          self._stack.pop()
+        else:
+          top[3] -= 1
+          self._stack.append(["value", value_type])
+          self._stack.append(["value", key_type])
+    return True
+
+
+class AsyncClient:
+  """Thrift client over asyncio streams, for services speaking the binary
+  protocol over a buffered (unframed) transport.
+
+  Calls are serialized and parsed by the generated client of |service|
+  against memory buffers, so any generated service can be used."""
+
+  def __init__(self, service, reader, writer, timeout=10.0):
+    self._service = service
+    self._reader = reader
+    self._writer = writer
+    self._timeout = timeout
+
+  @classmethod
+  async def connect(cls, service, hostname, port, timeout=10.0):
+    """Connect to a server; connecting and each call then time out after
+    |timeout| seconds, like the threaded clients."""
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(hostname, port), timeout)
+    return cls(service, reader, writer, timeout)
+
+  def close(self):
+    self._writer.close()
+
+  async def is_open(self):
+    """Whether the connection can still be used, i.e. it is open and the
+    server has not closed it in the meantime."""
+    if self._writer.is_closing() or self._reader.at_eof():
+      return False
+    # [NOTE] An idle connection has nothing to read unless the server closed
+    # it (EOF) or broke the protocol, so a read that does not complete at once
+    # means that it is usable. The read runs before this coroutine resumes,
+    # and is cancelled before consuming anything otherwise.
+    read = asyncio.ensure_future(self._reader.read(1))
+    await asyncio.sleep(0)
+    if read.done():
+      return False
+    read.cancel()
+    await asyncio.wait([read])
+    return True
+
+  async def _exchange(self, request):
+    self._writer.write(request)
+    await self._writer.drain()
+    # [NOTE] The binary protocol does not frame messages, so the end of the
+    # reply is found by scanning its bytes as they arrive, and the reply is
+    # then parsed once.
+    reply = bytearray()
+    scanner = _MessageScanner()
+    while not scanner.scan(reply):
+      chunk = await self._reader.read(65536)
+      if not chunk:
+        raise TTransportException(TTransportException.END_OF_FILE,
+            "Connection closed by the server")
+      reply += chunk
+    return bytes(reply)
+
+  async def call(self, method, **kwargs):
+    send_buffer = TMemoryBuffer()
+    tclient = self._service.Client(wise_rpc.tracing.TracingProtocol(
+        TBinaryProtocol.TBinaryProtocol(send_buffer)))
+    getattr(tclient, "send_" + method)(**kwargs)
+    if not hasattr(tclient, "recv_" + method):
+      # Oneway call.
+      self._writer.write(send_buffer.getvalue())
+      await asyncio.wait_for(self._writer.drain(), self._timeout)
+      return None
+    try:
+      reply = await asyncio.wait_for(
+          self._exchange(send_buffer.getvalue()), self._timeout)
+    except asyncio.TimeoutError:
+      raise TTransportException(TTransportException.TIMED_OUT,
+          "No reply to %s within %s s" % (method, self._timeout))
+    tclient = self._service.Client(
+        TBinaryProtocol.TBinaryProtocol(TMemoryBuffer(reply)))
+    return getattr(tclient, "recv_" + method)()
+
+
+class AsyncClientPool:
+  """Bounded pool of open asynchronous Thrift clients to the servers of one
+  service, with the same balancing, health checks, eviction and per-server
+  shares of |max_size| as the threaded wise_rpc.ClientPool."""
+
+  def __init__(self, service, policy, max_size=8, max_idle_time=60.0,
+      name=None):
+    self._service = service
+    self._span_name = "client:%s" % (name or service.__name__)
+    self._policy = policy
+    self._max_idle_time = max_idle_time
+    self._semaphores = {backend: asyncio.Semaphore(share)
+        for (backend, share) in
+        wise_rpc.backend_shares(max_size, policy.backends()).items()}
+    # Per backend, (client, time at which it was returned to the pool),
+    # oldest first.
+    self._idle = {backend: collections.deque()
+        for backend in policy.backends()}
+
+  def policy(self):
+    return self._policy
+
+  async def _acquire(self, backend):
+    now = time.monotonic()
+    for idle in self._idle.values():
+      while idle and now - idle[0][1] > self._max_idle_time:
+        idle.popleft()[0].close()
+    idle = self._idle[backend]
+    while idle:
+      client, _ = idle.pop()
+      if await client.is_open():
+        return client
+      client.close()
+    return await AsyncClient.connect(self._service, backend.server["hostname"],
+        backend.server["port"])
+
+  @contextlib.asynccontextmanager
+  async def client(self):
+    with wise_rpc.tracing.span(self._span_name):
+      backend = self._policy.acquire()
+      try:
+        await self._semaphores[backend].acquire()
+      except BaseException:
+        self._policy.cancel(backend)
+        raise
+      try:
+        client = None
+        error = False
+        started_at = time.perf_counter()
+        try:
+          client = await self._acquire(backend)
+          yield client
+        except (TTransportException, OSError, asyncio.TimeoutError):
+          error = True
+          if client is not None:
+            client.close()
+            client = None
+          raise
+        except TException:
+          raise
+        except BaseException:
+          if client is not None:
+            client.close()
+            client = None
+          raise
+        finally:
+          self._policy.release(backend, time.perf_counter() - started_at,
+              error)
+          if client is not None:
+            self._idle[backend].append((client, time.monotonic()))
+      finally:
+        self._semaphores[backend].release()
+
+  def close(self):
+    for idle in self._idle.values():
+      while idle:
+        idle.popleft()[0].close()
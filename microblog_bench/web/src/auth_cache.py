@@ -0,0 +1,54 @@
+import collections
+import hashlib
+import hmac
+import threading
+import time
+
+
+class AuthCache:
+  """Bounded LRU cache of signed-in accounts, keyed on the username and a
+  SHA-256 hash of the password, whose entries expire after |ttl| seconds."""
+
+  def __init__(self, max_size=10000, ttl=60.0):
+    self._max_size = max_size
+    self._ttl = ttl
+    self._lock = threading.Lock()
+    # username -> (password hash, account, expiration time)
+    self._entries = collections.OrderedDict()
+
+  @staticmethod
+  def _hash(password):
+    return hashlib.sha256(password.encode("utf-8")).digest()
+
+  def get(self, username, password):
+    now = time.monotonic()
+    with self._lock:
+      entry = self._entries.get(username)
+      if entry is None:
+        return None
+      password_hash, account, expires_at = entry
+      if expires_at <= now:
+        del self._entries[username]
+        return None
+      self._entries.move_to_end(username)
+    if not hmac.compare_digest(password_hash, self._hash(password)):
+      return None
+    return account
+
+  def put(self, username, password, account):
+    if self._max_size <= 0 or self._ttl <= 0:
+      return
+    entry = (self._hash(password), account, time.monotonic() + self._ttl)
+    with self._lock:
+      self._entries[username] = entry
+      self._entries.move_to_end(username)
+      while len(self._entries) > self._max_size:
+        self._entries.popitem(last=False)
+
+  def invalidate(self, username=None):
+    """Forget the account of |username|, or every account if None."""
+    with self._lock:
+      if username is None:
+        self._entries.clear()
+      else:
+        self._entries.pop(username, None)
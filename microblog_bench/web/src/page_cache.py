@@ -0,0 +1,122 @@
+import asyncio
+import collections
+from concurrent.futures import Future
+import threading
+import time
+
+
+class _Pages:
+  """Bounded LRU map of rendered pages, each served until |ttl| seconds
+  after its load started, so that a page never reflects data older than
+  that. Not thread-safe."""
+
+  def __init__(self, max_size, ttl):
+    self._max_size = max_size
+    self._ttl = ttl
+    # key -> (page, expiration time)
+    self._entries = collections.OrderedDict()
+    self.hits = 0
+    self.misses = 0
+    self.coalesced = 0
+
+  def get(self, key):
+    entry = self._entries.get(key)
+    if entry is None:
+      return None
+    page, expires_at = entry
+    if expires_at <= time.monotonic():
+      del self._entries[key]
+      return None
+    self._entries.move_to_end(key)
+    self.hits += 1
+    return page
+
+  def put(self, key, page, loaded_at):
+    if self._max_size <= 0 or loaded_at + self._ttl <= time.monotonic():
+      return
+    self._entries[key] = (page, loaded_at + self._ttl)
+    self._entries.move_to_end(key)
+    while len(self._entries) > self._max_size:
+      self._entries.popitem(last=False)
+
+  def stats(self):
+    return {"hits": self.hits, "misses": self.misses,
+        "coalesced": self.coalesced, "size": len(self._entries)}
+
+
+class PageCache:
+  """Cache of rendered pages for threaded servers. Concurrent requests for a
+  page that is not cached share a single load (single-flight)."""
+
+  def __init__(self, max_size=1024, ttl=0.1):
+    self._lock = threading.Lock()
+    self._pages = _Pages(max_size, ttl)
+    # key -> Future of the page being loaded
+    self._loads = {}
+
+  def get(self, key, load):
+    """Return the page of |key|, calling |load| to render it on a miss."""
+    with self._lock:
+      page = self._pages.get(key)
+      if page is not None:
+        return page
+      future = self._loads.get(key)
+      if future is not None:
+        self._pages.coalesced += 1
+      else:
+        self._pages.misses += 1
+        loading = self._loads[key] = Future()
+    if future is not None:
+      return future.result()
+    loaded_at = time.monotonic()
+    try:
+      page = load()
+    except BaseException as e:
+      with self._lock:
+        del self._loads[key]
+      loading.set_exception(e)
+      raise
+    with self._lock:
+      del self._loads[key]
+      self._pages.put(key, page, loaded_at)
+    loading.set_result(page)
+    return page
+
+  def stats(self):
+    with self._lock:
+      return self._pages.stats()
+
+
+class AsyncPageCache:
+  """Cache of rendered pages for asyncio servers, like PageCache."""
+
+  def __init__(self, max_size=1024, ttl=0.1):
+    self._pages = _Pages(max_size, ttl)
+    # key -> Task loading the page
+    self._loads = {}
+
+  async def _load(self, key, load):
+    loaded_at = time.monotonic()
+    try:
+      page = await load()
+    finally:
+      del self._loads[key]
+    self._pages.put(key, page, loaded_at)
+    return page
+
+  async def get(self, key, load):
+    """Return the page of |key|, awaiting |load|() to render it on a miss."""
+    page = self._pages.get(key)
+    if page is not None:
+      return page
+    task = self._loads.get(key)
+    if task is not None:
+      self._pages.coalesced += 1
+    else:
+      self._pages.misses += 1
+      task = self._loads[key] = asyncio.ensure_future(self._load(key, load))
+    # [NOTE] The load is shared, so a cancelled request must not cancel it.
+    return await asyncio.shield(task)
+
+  def stats(self):
+    return self._pages.stats()
@@ -0,0 +1,24 @@
+from json.encoder import encode_basestring_ascii
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+
+_POST_FORMAT = '{"id":%d,"text":%s,"author_id":%d,"n_endorsements":%d,' \
+    '"parent_id":%s}'
+
+
+def posts_to_json(posts, use_orjson=True):
+  """Encode a list of TPost as a JSON array of objects, in one pass and
+  without building an intermediate dict per post."""
+  if orjson is not None and use_orjson:
+    # [NOTE] A TPost keeps its fields in its instance dict, which orjson
+    # encodes natively.
+    return orjson.dumps([vars(post) for post in posts])
+  return ("[%s]" % ",".join(_POST_FORMAT % (post.id,
+      encode_basestring_ascii(post.text),
+      post.author_id, post.n_endorsements,
+      "null" if post.parent_id is None else int(post.parent_id))
+      for post in posts)).encode("utf-8")
@@ -1,17 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import json
 import os
-import random
+import threading
+import time
 
 import flask
 import flask_httpauth
+from thrift.transport.TTransport import TTransportException
 import yaml
 
 import wise_auth
 import wise_inbox
 import wise_microblog
 import wise_queue
+import wise_rpc
 import wise_sub
 
+from admission import AdmissionController
+from auth_cache import AuthCache
+from page_cache import PageCache
+from serialization import posts_to_json
+
+
+class FanOut:
+  """Issues independent backend calls concurrently on a shared thread pool,
+  and accounts for the latency saved over issuing them one after the
+  other."""
+
+  def __init__(self, max_workers=16):
+    self._executor = ThreadPoolExecutor(max_workers=max_workers)
+    self._lock = threading.Lock()
+    self._no_fan_outs = 0
+    self._no_calls = 0
+    self._serial_time = 0.0
+    self._parallel_time = 0.0
+
+  @staticmethod
+  def _timed(fn, args):
+    started_at = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started_at
+
+  def map(self, fn, args_list):
+    """Return [fn(*args) for args in |args_list|], computed concurrently."""
+    if len(args_list) <= 1:
+      return [fn(*args) for args in args_list]
+    started_at = time.perf_counter()
+    # [NOTE] Calls run in the context of the caller, so that they belong to
+    # its trace.
+    futures = [self._executor.submit(contextvars.copy_context().run,
+        self._timed, fn, args) for args in args_list]
+    results = [future.result() for future in futures]
+    parallel_time = time.perf_counter() - started_at
+    with self._lock:
+      self._no_fan_outs += 1
+      self._no_calls += len(args_list)
+      self._serial_time += sum(duration for (_, duration) in results)
+      self._parallel_time += parallel_time
+    return [result for (result, _) in results]
+
+  def stats(self):
+    with self._lock:
+      return {
+          "fan_outs": self._no_fan_outs,
+          "calls": self._no_calls,
+          "serial_time": self._serial_time,
+          "parallel_time": self._parallel_time,
+          "saved_time": self._serial_time - self._parallel_time
+      }
+
 
 class ServiceClientFactory:
   def __init__(self):
@@ -19,48 +77,162 @@ class ServiceClientFactory:
         "..", "conf", "services.yml")
     with open(conf_filename) as conf_file:
       self._conf = yaml.safe_load(conf_file)
+    pool_conf = self._conf.get("pool", {})
+    balancer_conf = self._conf.get("balancer", {})
+    self._pools = {
+        name: wise_rpc.ClientPool(client_cls,
+            wise_rpc.create_policy(self._conf[name], **balancer_conf),
+            max_size=pool_conf.get("max_sizes", {}).get(name,
+                pool_conf.get("max_size", 8)),
+            max_idle_time=pool_conf.get("max_idle_time", 60.0), name=name)
+        for (name, client_cls) in [
+            ("authentication", wise_auth.Client),
+            ("inbox", wise_inbox.Client),
+            ("microblog", wise_microblog.Client),
+            ("queue", wise_queue.Client),
+            ("subscription", wise_sub.Client)]}
+
+  def conf(self):
+    return self._conf
 
-  def get_authentication_client(self):
-    server = random.choice(self._conf["authentication"])
-    return wise_auth.Client(server["hostname"], server["port"])
+  def backend_stats(self):
+    now = time.monotonic()
+    return {name: [{
+        "hostname": backend.server["hostname"],
+        "port": backend.server["port"],
+        "in_flight": backend.in_flight,
+        "ewma_latency": backend.ewma_latency,
+        "ejected": backend.ejected_until > now
+    } for backend in pool.policy().backends()]
+        for (name, pool) in self._pools.items()}
 
-  def get_inbox_client(self):
-    server = random.choice(self._conf["inbox"])
-    return wise_inbox.Client(server["hostname"], server["port"])
+  def authentication_client(self):
+    return self._pools["authentication"].client()
 
-  def get_microblog_client(self):
-    server = random.choice(self._conf["microblog"])
-    return wise_microblog.Client(server["hostname"], server["port"])
+  def inbox_client(self):
+    return self._pools["inbox"].client()
 
-  def get_queue_client(self):
-    server = random.choice(self._conf["queue"])
-    return wise_queue.Client(server["hostname"], server["port"])
+  def microblog_client(self):
+    return self._pools["microblog"].client()
 
-  def get_subscription_client(self):
-    server = random.choice(self._conf["subscription"])
-    return wise_sub.Client(server["hostname"], server["port"])
+  def queue_client(self):
+    return self._pools["queue"].client()
+
+  def subscription_client(self):
+    return self._pools["subscription"].client()
+
+
+def setup_tracing(tracing_conf):
+  if not tracing_conf.get("enabled", False):
+    return
+  # [NOTE] Under mod_wsgi, Apache owns the signals of the process, so the
+  # spans are written when the interpreter exits.
+  wise_rpc.tracing.configure("web", tracing_conf["trace_dir"],
+      capacity=tracing_conf.get("capacity", 65536), handle_sigterm=False)
+
+
+def setup_admission(admission_conf):
+  admission_conf = dict(admission_conf)
+  if not admission_conf.pop("enabled", False):
+    return None
+  return AdmissionController(**admission_conf)
 
 
 def setup_app():
   app = flask.Flask(__name__)
   app.url_map.strict_slashes = False
+
+  @app.before_request
+  def admit():
+    if admission is None or flask.request.endpoint in (None, "stats"):
+      return None
+    # [NOTE] mod_wsgi gives the time (in microseconds) at which Apache
+    # accepted the request, so time spent in its queue counts too.
+    request_start = flask.request.environ.get("mod_wsgi.request_start")
+    queue_time = max(0.0, time.time() - int(request_start) / 1e6) \
+        if request_start is not None else 0.0
+    flask.g.admitted_at = admission.try_acquire(flask.request.endpoint,
+        queue_time)
+    if flask.g.admitted_at is None:
+      return flask.Response("Service Unavailable", status=503,
+          headers={"Retry-After": "1"})
+    return None
+
+  @app.before_request
+  def start_trace():
+    if wise_rpc.tracing.tracer() is None:
+      return
+    flask.g.trace_token = wise_rpc.tracing.set_trace_id(
+        flask.request.headers.get("X-Trace-Id"))
+    flask.g.trace_started_at = (time.time(), time.perf_counter())
+
+  @app.after_request
+  def set_trace_header(response):
+    if "trace_token" in flask.g:
+      response.headers["X-Trace-Id"] = wise_rpc.tracing.current_trace_id()
+    return response
+
+  @app.teardown_request
+  def release(exception):
+    if flask.g.get("admitted_at") is not None:
+      admission.release(flask.g.admitted_at,
+          overloaded=isinstance(exception, (TTransportException, OSError)))
+
+  @app.teardown_request
+  def finish_trace(exception):
+    if "trace_token" not in flask.g:
+      return
+    ts, started_at = flask.g.trace_started_at
+    wise_rpc.tracing.tracer().record("request:%s" % flask.request.endpoint,
+        ts, time.perf_counter() - started_at)
+    wise_rpc.tracing.reset_trace_id(flask.g.trace_token)
+
   return app
 
 
+cl_factory = ServiceClientFactory()
+setup_tracing(cl_factory.conf().get("tracing", {}))
+admission = setup_admission(cl_factory.conf().get("admission", {}))
 app = setup_app()
 auth = flask_httpauth.HTTPBasicAuth()
-cl_factory = ServiceClientFactory()
+auth_cache = AuthCache(**cl_factory.conf().get("auth_cache", {}))
+# Pages of recent posts, served for up to the configured staleness bound.
+page_cache = PageCache(**cl_factory.conf().get("page_cache", {}))
+fan_out_conf = cl_factory.conf().get("fan_out", {})
+fan_out = FanOut(fan_out_conf.get("max_workers", 16))
+# Number of posts hydrated by each of the concurrent get_posts calls of a page;
+# 0 hydrates the whole page with one call.
+hydrate_chunk_size = fan_out_conf.get("hydrate_chunk_size", 0)
+
+
+def get_posts(post_ids):
+  with cl_factory.microblog_client() as microblog_cl:
+    return microblog_cl.get_posts(post_ids)
+
+
+def hydrate_chunks(post_ids):
+  """Split |post_ids| into the chunks of hydrate_chunk_size posts hydrated by
+  concurrent get_posts calls, or into a single chunk if it is 0."""
+  if not post_ids:
+    return []
+  chunk_size = hydrate_chunk_size or len(post_ids)
+  return [post_ids[i:i + chunk_size]
+      for i in range(0, len(post_ids), chunk_size)]
 
 
 @auth.verify_password
 def verify_password(username, password):
-  authentication_cl = cl_factory.get_authentication_client()
+  flask.g.account = auth_cache.get(username, password)
+  if flask.g.account is not None:
+    return True
   try:
-    flask.g.account = authentication_cl.sign_in(username=username,
-        password=password)
+    with cl_factory.authentication_client() as authentication_cl:
+      flask.g.account = authentication_cl.sign_in(username=username,
+          password=password)
   except Exception:
     flask.g.account = None
-  authentication_cl.close()
+  if flask.g.account is not None:
+    auth_cache.put(username, password, flask.g.account)
   return flask.g.account is not None
 
 
@@ -70,10 +242,10 @@ def sign_up():
   password = flask.request.json["password"]
   first_name = flask.request.json["first_name"]
   last_name = flask.request.json["last_name"]
-  authentication_cl = cl_factory.get_authentication_client()
-  authentication_cl.sign_up(username=username, password=password,
-      first_name=first_name, last_name=last_name)
-  authentication_cl.close()
+  with cl_factory.authentication_client() as authentication_cl:
+    authentication_cl.sign_up(username=username, password=password,
+        first_name=first_name, last_name=last_name)
+  auth_cache.invalidate(username)
   return ""
 
 
@@ -82,73 +254,86 @@ def sign_up():
 def create_post():
   text = flask.request.json["text"]
   parent_id = flask.request.json.get("parent_id", None)
-  microblog_cl = cl_factory.get_microblog_client()
-  post_id = microblog_cl.create_post(text=text, author_id=flask.g.account.id,
-      parent_id=parent_id)
-  microblog_cl.close()
-  queue_cl = cl_factory.get_queue_client()
-  queue_cl.enqueue(queue_name="post",
-      message=json.dumps({"post_id": post_id, "author_id": flask.g.account.id}),
-      expires_at="2099-01-01-00-00-00")
-  queue_cl.close()
+  with cl_factory.microblog_client() as microblog_cl:
+    post_id = microblog_cl.create_post(text=text,
+        author_id=flask.g.account.id, parent_id=parent_id)
+  with cl_factory.queue_client() as queue_cl:
+    # [NOTE] The trace ID lets the worker attribute its calls to this request.
+    queue_cl.enqueue(queue_name="post",
+        message=json.dumps({"post_id": post_id,
+            "author_id": flask.g.account.id,
+            "trace_id": wise_rpc.tracing.current_trace_id()}),
+        expires_at="2099-01-01-00-00-00")
   return ""
 
 
 @app.route("/endorsement/<post_id>", methods=["POST"])
 @auth.login_required
 def endorse_post(post_id):
-  microblog_cl = cl_factory.get_microblog_client()
-  microblog_cl.endorse_post(endorser_id=flask.g.account.id,
-      post_id=int(post_id))
-  microblog_cl.close()
+  with cl_factory.microblog_client() as microblog_cl:
+    microblog_cl.endorse_post(endorser_id=flask.g.account.id,
+        post_id=int(post_id))
   return ""
 
 
 @app.route("/subscription/<user_id>", methods=["POST"])
 @auth.login_required
 def subscribe_to_user(user_id):
-  subscription_cl = cl_factory.get_subscription_client()
-  subscription_cl.create_subscription(subscriber_id=flask.g.account.id,
-      channel_name=user_id)
-  subscription_cl.close()
+  with cl_factory.subscription_client() as subscription_cl:
+    subscription_cl.create_subscription(subscriber_id=flask.g.account.id,
+        channel_name=user_id)
   return ""
 
 
+def page_response(page, next_before_id):
+  """Response of a page of posts, with the before_id of the next page in its
+  X-Next-Before-Id header unless it is the last one."""
+  response = flask.Response(page, mimetype="application/json")
+  if next_before_id is not None:
+    response.headers["X-Next-Before-Id"] = str(next_before_id)
+  return response
+
+
 @app.route("/inbox", methods=["GET"])
 @auth.login_required
 def inbox():
   n = int(flask.request.args.get("n", 16))
-  offset = int(flask.request.args.get("offset", 0))
-  inbox_cl = cl_factory.get_inbox_client()
-  microblog_cl = cl_factory.get_microblog_client()
-  posts = []
-  for message in inbox_cl.fetch(inbox_name=("%s" % flask.g.account.id), n=n,
-      offset=offset):
-    post = microblog_cl.get_post(int(message.text))
-    posts.append({
-        "id": post.id,
-        "text": post.text,
-        "author_id": post.author_id,
-        "n_endorsements": post.n_endorsements,
-        "parent_id": post.parent_id
-    })
-  inbox_cl.close()
-  microblog_cl.close()
-  return flask.jsonify(posts)
+  before_id = flask.request.args.get("before_id", type=int)
+  with cl_factory.inbox_client() as inbox_cl:
+    messages = inbox_cl.fetch(inbox_name=("%s" % flask.g.account.id), n=n,
+        before_id=before_id)
+  post_ids = [int(message.text) for message in messages]
+  # [NOTE] Chunks of the page, if any, are hydrated concurrently, each on its
+  # own pooled connection and thus possibly by a different microblog server.
+  chunks = fan_out.map(get_posts,
+      [(chunk,) for chunk in hydrate_chunks(post_ids)])
+  return page_response(
+      posts_to_json([post for chunk in chunks for post in chunk]),
+      messages[-1].id if messages and len(messages) == n else None)
+
+
+def load_recent_posts(n, before_id):
+  with cl_factory.microblog_client() as microblog_cl:
+    posts = microblog_cl.recent_posts(n=n, before_id=before_id)
+  return (posts_to_json(posts),
+      posts[-1].id if posts and len(posts) == n else None)
 
 
 @app.route("/post", methods=["GET"])
 @auth.login_required
 def recent_posts():
   n = int(flask.request.args.get("n", 10))
-  offset = int(flask.request.args.get("offset", 0))
-  microblog_cl = cl_factory.get_microblog_client()
-  posts = [{
-          "id": post.id,
-          "text": post.text,
-          "author_id": post.author_id,
-          "n_endorsements": post.n_endorsements,
-          "parent_id": post.parent_id
-  } for post in microblog_cl.recent_posts(n=n, offset=offset)]
-  microblog_cl.close()
-  return flask.jsonify(posts)
+  before_id = flask.request.args.get("before_id", type=int)
+  page, next_before_id = page_cache.get((n, before_id),
+      lambda: load_recent_posts(n, before_id))
+  return page_response(page, next_before_id)
+
+
+# [NOTE] Apache serves this only to local clients, below an alias other than the
+# public one (see templates/apache2.conf).
+@app.route("/stats", methods=["GET"])
+def stats():
+  return flask.jsonify({"fan_out": fan_out.stats(),
+      "page_cache": page_cache.stats(),
+      "admission": admission.stats() if admission is not None else None,
+      "backends": cl_factory.backend_stats()})
@@ -0,0 +1,348 @@
+import asyncio
+import base64
+import binascii
+import functools
+import json
+import os
+import time
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Mount, Route
+from thrift.transport.TTransport import TTransportException
+import yaml
+
+import wise_auth
+import wise_inbox
+import wise_microblog
+import wise_queue
+import wise_rpc
+import wise_sub
+
+from admission import AdmissionController
+from async_thrift import AsyncClientPool
+from auth_cache import AuthCache
+from page_cache import AsyncPageCache
+from serialization import posts_to_json
+
+
+class ServiceClientFactory:
+  def __init__(self):
+    conf_filename = os.path.join(os.path.abspath(os.path.dirname(__file__)),
+        "..", "conf", "services.yml")
+    with open(conf_filename) as conf_file:
+      self._conf = yaml.safe_load(conf_file)
+    pool_conf = self._conf.get("async_pool", {})
+    balancer_conf = self._conf.get("balancer", {})
+    self._pools = {
+        name: AsyncClientPool(service,
+            wise_rpc.create_policy(self._conf[name], **balancer_conf),
+            max_size=pool_conf.get("max_sizes", {}).get(name,
+                pool_conf.get("max_size", 8)),
+            max_idle_time=pool_conf.get("max_idle_time", 60.0), name=name)
+        for (name, service) in [
+            ("authentication", wise_auth.TAuthService),
+            ("inbox", wise_inbox.TInboxService),
+            ("microblog", wise_microblog.TMicroblogService),
+            ("queue", wise_queue.TQueueService),
+            ("subscription", wise_sub.TSubService)]}
+
+  def conf(self):
+    return self._conf
+
+  def backend_stats(self):
+    now = time.monotonic()
+    return {name: [{
+        "hostname": backend.server["hostname"],
+        "port": backend.server["port"],
+        "in_flight": backend.in_flight,
+        "ewma_latency": backend.ewma_latency,
+        "ejected": backend.ejected_until > now
+    } for backend in pool.policy().backends()]
+        for (name, pool) in self._pools.items()}
+
+  def authentication_client(self):
+    return self._pools["authentication"].client()
+
+  def inbox_client(self):
+    return self._pools["inbox"].client()
+
+  def microblog_client(self):
+    return self._pools["microblog"].client()
+
+  def queue_client(self):
+    return self._pools["queue"].client()
+
+  def subscription_client(self):
+    return self._pools["subscription"].client()
+
+
+class FanOut:
+  """Accounts for the latency saved by awaiting independent backend calls
+  together instead of one after the other, like FanOut in the WSGI tier."""
+
+  def __init__(self):
+    self._no_fan_outs = 0
+    self._no_calls = 0
+    self._serial_time = 0.0
+    self._parallel_time = 0.0
+
+  @staticmethod
+  async def _timed(coroutine):
+    started_at = time.perf_counter()
+    result = await coroutine
+    return result, time.perf_counter() - started_at
+
+  async def gather(self, *coroutines):
+    if len(coroutines) <= 1:
+      return [await coroutine for coroutine in coroutines]
+    started_at = time.perf_counter()
+    results = await asyncio.gather(
+        *[self._timed(coroutine) for coroutine in coroutines])
+    self._no_fan_outs += 1
+    self._no_calls += len(coroutines)
+    self._serial_time += sum(duration for (_, duration) in results)
+    self._parallel_time += time.perf_counter() - started_at
+    return [result for (result, _) in results]
+
+  def stats(self):
+    return {
+        "fan_outs": self._no_fan_outs,
+        "calls": self._no_calls,
+        "serial_time": self._serial_time,
+        "parallel_time": self._parallel_time,
+        "saved_time": self._serial_time - self._parallel_time
+    }
+
+
+cl_factory = ServiceClientFactory()
+tracing_conf = cl_factory.conf().get("tracing", {})
+if tracing_conf.get("enabled", False):
+  # [NOTE] uvicorn shuts its workers down on SIGTERM, so the spans are written
+  # when the interpreter exits.
+  wise_rpc.tracing.configure("web", tracing_conf["trace_dir"],
+      capacity=tracing_conf.get("capacity", 65536), handle_sigterm=False)
+admission_conf = dict(cl_factory.conf().get("admission", {}))
+admission = AdmissionController(**admission_conf) \
+    if admission_conf.pop("enabled", False) else None
+auth_cache = AuthCache(**cl_factory.conf().get("auth_cache", {}))
+# Pages of recent posts, served for up to the configured staleness bound.
+page_cache = AsyncPageCache(**cl_factory.conf().get("page_cache", {}))
+fan_out = FanOut()
+# Number of posts hydrated by each of the concurrent get_posts calls of a page;
+# 0 hydrates the whole page with one call.
+hydrate_chunk_size = cl_factory.conf().get("fan_out", {}).get(
+    "hydrate_chunk_size", 0)
+
+
+# Addresses of the clients allowed to read the stats.
+LOCAL_HOSTS = ("127.0.0.1", "::1", "localhost")
+
+
+def unauthorized():
+  return PlainTextResponse("Unauthorized Access", status_code=401,
+      headers={"WWW-Authenticate": 'Basic realm="Authentication Required"'})
+
+
+async def verify_password(request):
+  """Return the account of the request's basic auth credentials, or None."""
+  try:
+    scheme, credentials = request.headers["Authorization"].split(" ", 1)
+    username, password = base64.b64decode(credentials).decode(
+        "utf-8").split(":", 1)
+  except (KeyError, ValueError, binascii.Error):
+    return None
+  if scheme.lower() != "basic":
+    return None
+  account = auth_cache.get(username, password)
+  if account is not None:
+    return account
+  try:
+    async with cl_factory.authentication_client() as authentication_cl:
+      account = await authentication_cl.call("sign_in", username=username,
+          password=password)
+  except Exception:
+    return None
+  auth_cache.put(username, password, account)
+  return account
+
+
+def admitted(handler):
+  """Shed the requests to |handler| that the admission controller does not
+  admit with a fast 503."""
+  route = handler.__name__
+
+  @functools.wraps(handler)
+  async def admitted_handler(request):
+    if admission is None:
+      return await handler(request)
+    admitted_at = admission.try_acquire(route)
+    if admitted_at is None:
+      return PlainTextResponse("Service Unavailable", status_code=503,
+          headers={"Retry-After": "1"})
+    overloaded = False
+    try:
+      return await handler(request)
+    except (TTransportException, OSError, asyncio.TimeoutError):
+      overloaded = True
+      raise
+    finally:
+      admission.release(admitted_at, overloaded)
+  return admitted_handler
+
+
+def traced(handler):
+  """Record each request to |handler| as a span of the trace of the
+  X-Trace-Id header, or of a new trace."""
+  span_name = "request:%s" % handler.__name__
+
+  @functools.wraps(handler)
+  async def traced_handler(request):
+    if wise_rpc.tracing.tracer() is None:
+      return await handler(request)
+    with wise_rpc.tracing.trace(request.headers.get("X-Trace-Id")) \
+        as trace_id:
+      with wise_rpc.tracing.span(span_name):
+        response = await handler(request)
+    response.headers["X-Trace-Id"] = trace_id
+    return response
+  return traced_handler
+
+
+def login_required(handler):
+  @functools.wraps(handler)
+  async def authenticated_handler(request):
+    account = await verify_password(request)
+    if account is None:
+      return unauthorized()
+    return await handler(request, account)
+  return authenticated_handler
+
+
+async def sign_up(request):
+  body = await request.json()
+  async with cl_factory.authentication_client() as authentication_cl:
+    await authentication_cl.call("sign_up", username=body["username"],
+        password=body["password"], first_name=body["first_name"],
+        last_name=body["last_name"])
+  auth_cache.invalidate(body["username"])
+  return Response("")
+
+
+@login_required
+async def create_post(request, account):
+  body = await request.json()
+  async with cl_factory.microblog_client() as microblog_cl:
+    post_id = await microblog_cl.call("create_post", text=body["text"],
+        author_id=account.id, parent_id=body.get("parent_id", None))
+  async with cl_factory.queue_client() as queue_cl:
+    await queue_cl.call("enqueue", queue_name="post",
+        message=json.dumps({"post_id": post_id, "author_id": account.id,
+            "trace_id": wise_rpc.tracing.current_trace_id()}),
+        expires_at="2099-01-01-00-00-00")
+  return Response("")
+
+
+@login_required
+async def endorse_post(request, account):
+  async with cl_factory.microblog_client() as microblog_cl:
+    await microblog_cl.call("endorse_post", endorser_id=account.id,
+        post_id=int(request.path_params["post_id"]))
+  return Response("")
+
+
+@login_required
+async def subscribe_to_user(request, account):
+  async with cl_factory.subscription_client() as subscription_cl:
+    await subscription_cl.call("create_subscription",
+        subscriber_id=account.id,
+        channel_name=request.path_params["user_id"])
+  return Response("")
+
+
+async def get_posts(post_ids):
+  async with cl_factory.microblog_client() as microblog_cl:
+    return await microblog_cl.call("get_posts", post_ids=post_ids)
+
+
+def hydrate_chunks(post_ids):
+  """Split |post_ids| into the chunks of hydrate_chunk_size posts hydrated by
+  concurrent get_posts calls, or into a single chunk if it is 0."""
+  if not post_ids:
+    return []
+  chunk_size = hydrate_chunk_size or len(post_ids)
+  return [post_ids[i:i + chunk_size]
+      for i in range(0, len(post_ids), chunk_size)]
+
+
+def before_id_param(request):
+  before_id = request.query_params.get("before_id")
+  return int(before_id) if before_id is not None else None
+
+
+def page_response(page, next_before_id):
+  """Response of a page of posts, with the before_id of the next page in its
+  X-Next-Before-Id header unless it is the last one."""
+  response = Response(page, media_type="application/json")
+  if next_before_id is not None:
+    response.headers["X-Next-Before-Id"] = str(next_before_id)
+  return response
+
+
+@login_required
+async def inbox(request, account):
+  n = int(request.query_params.get("n", 16))
+  before_id = before_id_param(request)
+  async with cl_factory.inbox_client() as inbox_cl:
+    messages = await inbox_cl.call("fetch", inbox_name=("%s" % account.id),
+        n=n, before_id=before_id)
+  post_ids = [int(message.text) for message in messages]
+  chunks = await fan_out.gather(
+      *[get_posts(chunk) for chunk in hydrate_chunks(post_ids)])
+  return page_response(
+      posts_to_json([post for chunk in chunks for post in chunk]),
+      messages[-1].id if messages and len(messages) == n else None)
+
+
+async def load_recent_posts(n, before_id):
+  async with cl_factory.microblog_client() as microblog_cl:
+    posts = await microblog_cl.call("recent_posts", n=n, before_id=before_id)
+  return (posts_to_json(posts),
+      posts[-1].id if posts and len(posts) == n else None)
+
+
+@login_required
+async def recent_posts(request, account):
+  n = int(request.query_params.get("n", 10))
+  before_id = before_id_param(request)
+  page, next_before_id = await page_cache.get((n, before_id),
+      lambda: load_recent_posts(n, before_id))
+  return page_response(page, next_before_id)
+
+
+async def stats(request):
+  if request.client is None or request.client.host not in LOCAL_HOSTS:
+    return PlainTextResponse("Not Found", status_code=404)
+  return JSONResponse({"fan_out": fan_out.stats(),
+      "page_cache": page_cache.stats(),
+      "admission": admission.stats() if admission is not None else None,
+      "backends": cl_factory.backend_stats()})
+
+
+routes = [
+    Route("/account", admitted(traced(sign_up)), methods=["POST"]),
+    Route("/post", admitted(traced(create_post)), methods=["POST"]),
+    Route("/endorsement/{post_id}", admitted(traced(endorse_post)),
+        methods=["POST"]),
+    Route("/subscription/{user_id}", admitted(traced(subscribe_to_user)),
+        methods=["POST"]),
+    Route("/inbox", admitted(traced(inbox)), methods=["GET"]),
+    Route("/post", admitted(traced(recent_posts)), methods=["GET"])
+]
+# [NOTE] Under Apache the routes are served below the WSGIScriptAlias prefix;
+# WEB_URL_PREFIX mounts them below the same prefix. Like under Apache, the
+# stats are served to local clients only, below /internal.
+url_prefix = os.environ.get("WEB_URL_PREFIX", "")
+app = Starlette(routes=[
+    Mount("/internal", routes=[Route("/stats", stats, methods=["GET"])]),
+    Mount(url_prefix, routes=routes)])
@@ -0,0 +1,59 @@
+import json
+import os
+import sys
+import timeit
+
+import click
+import flask
+
+import wise_microblog
+
+sys.path.insert(0, os.path.join(os.path.abspath(os.path.dirname(__file__)),
+    "..", "..", "src"))
+from serialization import orjson, posts_to_json
+
+
+def make_posts(n):
+  return [wise_microblog.TPost(id=i, text="post %d é\"\\" % i * 10,
+      author_id=i % 97, n_endorsements=i % 13,
+      parent_id=None if i % 3 else i - 1) for i in range(n)]
+
+
+def jsonify_posts(app, posts):
+  """The previous path: one dict per post, then flask.jsonify."""
+  with app.app_context():
+    return flask.jsonify([{
+        "id": post.id,
+        "text": post.text,
+        "author_id": post.author_id,
+        "n_endorsements": post.n_endorsements,
+        "parent_id": post.parent_id
+    } for post in posts]).get_data()
+
+
+@click.command()
+@click.option("--page_sizes", default="10,100,1000")
+@click.option("--repeat", default=5, type=click.INT)
+def main(page_sizes, repeat):
+  app = flask.Flask(__name__)
+  encoders = [("jsonify", lambda posts: jsonify_posts(app, posts)),
+      ("stdlib", lambda posts: posts_to_json(posts, use_orjson=False))]
+  if orjson is not None:
+    encoders.append(("orjson", posts_to_json))
+  print("%10s %12s %12s %8s" % ("page size", "encoder", "us/page", "speedup"))
+  for n in [int(page_size) for page_size in page_sizes.split(",")]:
+    posts = make_posts(n)
+    expected = json.loads(jsonify_posts(app, posts))
+    baseline = None
+    for (name, encoder) in encoders:
+      assert json.loads(encoder(posts)) == expected, name
+      number = max(1, 20000 // n)
+      elapsed = min(timeit.repeat(lambda: encoder(posts), number=number,
+          repeat=repeat)) / number
+      baseline = baseline or elapsed
+      print("%10d %12s %12.1f %7.1fx" % (n, name, elapsed * 1e6,
+          baseline / elapsed))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,231 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import types
+import unittest
+
+sys.path.insert(0,
+    os.path.join(os.path.abspath(os.path.dirname(__file__)), "..", "..",
+        "src"))
+
+from admission import AdmissionController
+from auth_cache import AuthCache
+from page_cache import AsyncPageCache, PageCache
+from serialization import orjson, posts_to_json
+
+
+class TestAdmissionController(unittest.TestCase):
+  def testShedsOverTheLimit(self):
+    admission = AdmissionController(initial_limit=2)
+    admitted = [admission.try_acquire("sign_up") for i in range(3)]
+    self.assertIsNotNone(admitted[0])
+    self.assertIsNotNone(admitted[1])
+    self.assertIsNone(admitted[2])
+    admission.release(admitted[0])
+    self.assertIsNotNone(admission.try_acquire("sign_up"))
+    self.assertEqual(admission.stats()["rejected"], {"sign_up": 1})
+
+  def testWritesGoFirst(self):
+    admission = AdmissionController(initial_limit=4)
+    for i in range(3):
+      self.assertIsNotNone(admission.try_acquire("create_post"))
+    # Reads only get 75% of the limit.
+    self.assertIsNone(admission.try_acquire("inbox"))
+    self.assertIsNotNone(admission.try_acquire("create_post"))
+
+  def testMaxQueueTime(self):
+    admission = AdmissionController(max_queue_time=0.5)
+    self.assertIsNotNone(admission.try_acquire("inbox", queue_time=0.1))
+    self.assertIsNone(admission.try_acquire("inbox", queue_time=1.0))
+
+  def testAdditiveIncrease(self):
+    admission = AdmissionController(initial_limit=4, max_limit=5)
+    for i in range(40):
+      admitted = [admission.try_acquire("sign_up") for j in range(4)]
+      for admitted_at in admitted:
+        if admitted_at is not None:
+          admission.release(admitted_at)
+    self.assertEqual(admission.stats()["limit"], 5)
+
+  def testMultiplicativeDecrease(self):
+    admission = AdmissionController(initial_limit=10, min_limit=4,
+        target_latency=0.01, backoff=0.5)
+    admitted = [admission.try_acquire("sign_up") for i in range(2)]
+    time.sleep(0.02)
+    admission.release(admitted[0])
+    self.assertEqual(admission.stats()["limit"], 5)
+    # [NOTE] The second request saw the same overload, so it does not
+    # decrease the limit again.
+    admission.release(admitted[1])
+    self.assertEqual(admission.stats()["limit"], 5)
+    # Later slow requests do, down to the minimum.
+    for i in range(2):
+      admitted_at = admission.try_acquire("sign_up")
+      time.sleep(0.02)
+      admission.release(admitted_at)
+    self.assertEqual(admission.stats()["limit"], 4)
+
+  def testOverloadDecreases(self):
+    admission = AdmissionController(initial_limit=10, backoff=0.5)
+    admission.release(admission.try_acquire("inbox"), overloaded=True)
+    self.assertEqual(admission.stats()["limit"], 5)
+
+
+class TestAuthCache(unittest.TestCase):
+  def testHit(self):
+    cache = AuthCache()
+    cache.put("rrivellino", "sccp1910", "account")
+    self.assertEqual(cache.get("rrivellino", "sccp1910"), "account")
+
+  def testWrongPassword(self):
+    cache = AuthCache()
+    cache.put("rrivellino", "sccp1910", "account")
+    self.assertIsNone(cache.get("rrivellino", "wrongpasswd"))
+
+  def testExpiration(self):
+    cache = AuthCache(ttl=0.01)
+    cache.put("rrivellino", "sccp1910", "account")
+    time.sleep(0.02)
+    self.assertIsNone(cache.get("rrivellino", "sccp1910"))
+
+  def testLeastRecentlyUsedIsEvicted(self):
+    cache = AuthCache(max_size=2)
+    cache.put("a", "password", "account a")
+    cache.put("b", "password", "account b")
+    cache.get("a", "password")
+    cache.put("c", "password", "account c")
+    self.assertEqual(cache.get("a", "password"), "account a")
+    self.assertIsNone(cache.get("b", "password"))
+    self.assertEqual(cache.get("c", "password"), "account c")
+
+  def testDisabled(self):
+    for cache in [AuthCache(max_size=0), AuthCache(ttl=0)]:
+      cache.put("rrivellino", "sccp1910", "account")
+      self.assertIsNone(cache.get("rrivellino", "sccp1910"))
+
+  def testInvalidate(self):
+    cache = AuthCache()
+    cache.put("a", "password", "account a")
+    cache.put("b", "password", "account b")
+    cache.invalidate("a")
+    self.assertIsNone(cache.get("a", "password"))
+    self.assertEqual(cache.get("b", "password"), "account b")
+    cache.invalidate()
+    self.assertIsNone(cache.get("b", "password"))
+
+
+class TestPageCache(unittest.TestCase):
+  def testSingleFlight(self):
+    cache = PageCache()
+    started = threading.Event()
+    release = threading.Event()
+    no_loads = []
+
+    def load():
+      no_loads.append(1)
+      started.set()
+      release.wait()
+      return "page"
+
+    pages = []
+    threads = [threading.Thread(target=lambda: pages.append(
+        cache.get("key", load))) for i in range(8)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+      thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+      thread.join()
+    self.assertEqual(pages, ["page"] * 8)
+    self.assertEqual(len(no_loads), 1)
+    self.assertEqual(cache.stats()["misses"], 1)
+    self.assertEqual(cache.stats()["coalesced"], 7)
+
+  def testTtl(self):
+    cache = PageCache(ttl=0.05)
+    self.assertEqual(cache.get("key", lambda: "old"), "old")
+    self.assertEqual(cache.get("key", lambda: "new"), "old")
+    time.sleep(0.06)
+    self.assertEqual(cache.get("key", lambda: "new"), "new")
+    self.assertEqual(cache.stats()["hits"], 1)
+
+  def testFailedLoadIsNotCached(self):
+    cache = PageCache()
+
+    def load():
+      raise ValueError("Failed load")
+
+    with self.assertRaises(ValueError):
+      cache.get("key", load)
+    self.assertEqual(cache.get("key", lambda: "page"), "page")
+
+  def testLeastRecentlyUsedIsEvicted(self):
+    cache = PageCache(max_size=2)
+    for key in ["a", "b", "a", "c"]:
+      cache.get(key, lambda: key)
+    self.assertEqual(cache.get("a", lambda: "reloaded"), "a")
+    self.assertEqual(cache.get("b", lambda: "reloaded"), "reloaded")
+
+  def testAsyncSingleFlight(self):
+    cache = AsyncPageCache()
+    no_loads = []
+
+    async def load():
+      no_loads.append(1)
+      await asyncio.sleep(0.01)
+      return "page"
+
+    async def main():
+      return await asyncio.gather(*[cache.get("key", load)
+          for i in range(8)])
+
+    self.assertEqual(asyncio.run(main()), ["page"] * 8)
+    self.assertEqual(len(no_loads), 1)
+    self.assertEqual(cache.stats()["coalesced"], 7)
+
+  def testAsyncCancelledRequestKeepsLoad(self):
+    cache = AsyncPageCache()
+
+    async def load():
+      await asyncio.sleep(0.02)
+      return "page"
+
+    async def main():
+      first = asyncio.ensure_future(cache.get("key", load))
+      second = asyncio.ensure_future(cache.get("key", load))
+      await asyncio.sleep(0.005)
+      first.cancel()
+      return await second
+
+    self.assertEqual(asyncio.run(main()), "page")
+
+
+class TestPostsToJson(unittest.TestCase):
+  def setUp(self):
+    # [NOTE] Like a TPost, each post keeps its fields in its instance dict.
+    self._posts = [
+        types.SimpleNamespace(id=1, text='Quote " and \\ and \u00e9',
+            author_id=2, n_endorsements=3, parent_id=None),
+        types.SimpleNamespace(id=4, text="Reply\n", author_id=5,
+            n_endorsements=0, parent_id=1)]
+    self._expected = [vars(post) for post in self._posts]
+
+  def testFormat(self):
+    self.assertEqual(json.loads(posts_to_json(self._posts, use_orjson=False)),
+        self._expected)
+
+  @unittest.skipIf(orjson is None, "orjson is not installed")
+  def testOrjson(self):
+    self.assertEqual(json.loads(posts_to_json(self._posts)), self._expected)
+
+  def testEmpty(self):
+    self.assertEqual(json.loads(posts_to_json([], use_orjson=False)), [])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -29,11 +29,25 @@ for subscription_host in $SUB_HOSTS; do
   echo "  - hostname: $subscription_host" >> conf/services.yml
   echo "    port: $SUB_PORT" >> conf/services.yml
 done
+echo "balancer:" >> conf/services.yml
+echo "  policy: ${BALANCING_POLICY:-random}" >> conf/services.yml
+# [NOTE] A worker makes one call at a time, and gives its connection back to
+# the server after each call, so that it holds a server thread only while
+# calling; see the sizing of the web tier's pools.
+echo "pool:" >> conf/services.yml
+echo "  max_size: 1" >> conf/services.yml
+echo "  max_idle_time: 0" >> conf/services.yml
+echo "dequeue:" >> conf/services.yml
+echo "  batch_size: ${WORKER_DEQUEUE_BATCH_SIZE:-4}" >> conf/services.yml
+echo "tracing:" >> conf/services.yml
+echo "  enabled: $([ "${ENABLE_TRACING:-0}" -eq 1 ] && echo true || echo false)" >> conf/services.yml
+echo "  trace_dir: ${TRACE_DIR:-/tmp/wise_tracing}" >> conf/services.yml
 
 # Set PYTHONPATH.
 export PYTHONPATH=$WISE_HOME/WISEServices/inbox/include/py/:$PYTHONPATH
 export PYTHONPATH=$WISE_HOME/WISEServices/queue_/include/py/:$PYTHONPATH
 export PYTHONPATH=$WISE_HOME/WISEServices/sub/include/py/:$PYTHONPATH
+export PYTHONPATH=$WISE_HOME/WISEServices/rpc/include/py/:$PYTHONPATH
 
 # Start the workers.
 rm -f pid
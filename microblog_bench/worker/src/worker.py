@@ -1,7 +1,6 @@
 import datetime
 import json
 import os
-import random
 import time
 
 import thrift
@@ -9,6 +8,7 @@ import yaml
 
 import wise_inbox
 import wise_queue
+import wise_rpc
 import wise_sub
 
 
@@ -18,46 +18,71 @@ class ServiceClientFactory:
         "..", "conf", "services.yml")
     with open(conf_filename) as conf_file:
       self._conf = yaml.safe_load(conf_file)
+    pool_conf = self._conf.get("pool", {})
+    balancer_conf = self._conf.get("balancer", {})
+    self._pools = {
+        name: wise_rpc.ClientPool(client_cls,
+            wise_rpc.create_policy(self._conf[name], **balancer_conf),
+            max_size=pool_conf.get("max_sizes", {}).get(name,
+                pool_conf.get("max_size", 8)),
+            max_idle_time=pool_conf.get("max_idle_time", 60.0), name=name)
+        for (name, client_cls) in [
+            ("inbox", wise_inbox.Client),
+            ("queue", wise_queue.Client),
+            ("subscription", wise_sub.Client)]}
 
-  def get_inbox_client(self):
-    server = random.choice(self._conf["inbox"])
-    return wise_inbox.Client(server["hostname"], server["port"])
+  def conf(self):
+    return self._conf
 
-  def get_queue_client(self):
-    server = random.choice(self._conf["queue"])
-    return wise_queue.Client(server["hostname"], server["port"])
+  def inbox_client(self):
+    return self._pools["inbox"].client()
 
-  def get_subscription_client(self):
-    server = random.choice(self._conf["subscription"])
-    return wise_sub.Client(server["hostname"], server["port"])
+  def queue_client(self):
+    return self._pools["queue"].client()
 
+  def subscription_client(self):
+    return self._pools["subscription"].client()
 
-def main():
-  cl_factory = ServiceClientFactory()
-  while True:
-    queue_cl = cl_factory.get_queue_client()
-    try:
-      # Try to get a post from the queue.
-      queue_entry = queue_cl.dequeue(queue_name="post")
-    except wise_queue.TEmptyQueueException:
-      queue_cl.close()
-      # Do not spin if no post is in the queue.
-      time.sleep(1)
-      continue
-    post = json.loads(queue_entry.message)
-    # Get the author's subscribers.
-    subscription_cl = cl_factory.get_subscription_client()
+
+def process(cl_factory, post):
+  # Get the author's subscribers.
+  with cl_factory.subscription_client() as subscription_cl:
     subscriptions = subscription_cl.get_subscribers_of_channel(
         channel_name=str(post["author_id"]))
-    subscription_cl.close()
-    # Push post to the inbox of its author's subscribers.
-    inbox_cl = cl_factory.get_inbox_client()
+  # Push post to the inbox of its author's subscribers.
+  with cl_factory.inbox_client() as inbox_cl:
     for subscription_entry in subscriptions:
       inbox_cl.push(inbox_name=str(subscription_entry.subscriber_id),
           message_text=str(post["post_id"]))
-    queue_cl.close()
-    inbox_cl.close()
 
 
+def main():
+  cl_factory = ServiceClientFactory()
+  tracing_conf = cl_factory.conf().get("tracing", {})
+  if tracing_conf.get("enabled", False):
+    wise_rpc.tracing.configure("worker", tracing_conf["trace_dir"],
+        capacity=tracing_conf.get("capacity", 65536))
+  batch_size = cl_factory.conf().get("dequeue", {}).get("batch_size", 1)
+  while True:
+    with cl_factory.queue_client() as queue_cl:
+      # Try to claim a batch of posts from the queue.
+      queue_entries = queue_cl.dequeue_batch(queue_name="post",
+          max_n=batch_size)
+    if not queue_entries:
+      # Do not spin if no post is in the queue.
+      time.sleep(1)
+      continue
+    for queue_entry in queue_entries:
+      post = json.loads(queue_entry.message)
+      # [NOTE] The post is processed as part of the trace of the request that
+      # created it, if any, or of a new trace if the worker records spans.
+      # Otherwise its calls carry no trace ID.
+      if not post.get("trace_id") and wise_rpc.tracing.tracer() is None:
+        process(cl_factory, post)
+        continue
+      with wise_rpc.tracing.trace(post.get("trace_id")):
+        with wise_rpc.tracing.span("process:post"):
+          process(cl_factory, post)
+
 if __name__ == "__main__":
   main()
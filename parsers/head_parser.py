@@ -22,6 +22,7 @@ import cpu
 import disk
 import mem
 import milliscope_parser
+import tracing_parser
 
 DESCRIPTION = "Script to parse rAdvisor container stat logs"
 
@@ -213,6 +214,17 @@ def milliscope(root):
 
     return (spec_connect, spec_recvfrom, spec_sendto)
 
+def tracing(root):
+    if getListOfFiles(root + '/tracing') == "does not exist":
+        return {}
+
+    listoffiles = [x for x in getListOfFiles(root + '/tracing') if x.endswith('.csv')]
+    tracingdict = {}
+    for i in listoffiles:
+        with open(i, 'r') as file:
+            tracingdict[i] = tracing_parser.main(iter(file))
+    return tracingdict
+
 
 
 
@@ -227,8 +239,9 @@ def main(root):
     collectl_disk_val = collectl_disk(root)
     collectl_mem_val = collectl_mem(root)
     (milliscope_vals) = milliscope(root)
+    tracing_val = tracing(root)
 
-    return (nbench_val, moby_val, radvisor_val, collectl_cpu_val, collectl_disk_val, collectl_mem_val, milliscope_vals)
+    return (nbench_val, moby_val, radvisor_val, collectl_cpu_val, collectl_disk_val, collectl_mem_val, milliscope_vals, tracing_val)
 
 
 if __name__ == "__main__":
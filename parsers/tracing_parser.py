@@ -0,0 +1,86 @@
+import csv
+import numpy
+from collections import OrderedDict
+
+
+class LogEntrySpan:
+    """A tracing span log entry."""
+
+    def __init__(self, trace_id, tier, span, ts, duration, pid, tid):
+        """Initialize a LogEntrySpan.
+
+        trace_id -- [str] ID of the request the span belongs to, or '' if none.
+        tier -- [str] Tier that recorded the span: 'web', 'worker', or a microservice.
+        span -- [str] Name of the span, e.g. 'rpc:fetch', 'connect', 'query', or 'commit'.
+        ts -- [int] Timestamp (microseconds) at which the span started.
+        duration -- [int] Duration (microseconds) of the span.
+        """
+        self._trace_id = trace_id
+        self._tier = tier
+        self._span = span
+        self._ts = ts
+        self._duration = duration
+        self._pid = pid
+        self._tid = tid
+
+    def __lt__(self, other):
+        """Less than comparison operator.
+
+        other -- [LogEntrySpan] Another LogEntrySpan being compared against this.
+        """
+        return self._ts < other._ts
+
+    def trace_id(self):
+        return self._trace_id
+
+    def tier(self):
+        return self._tier
+
+    def span(self):
+        """Return the name."""
+        return self._span
+
+    def ts(self):
+        """Return the timestamp."""
+        return self._ts
+
+    def duration(self):
+        return self._duration
+
+    def pid(self):
+        return self._pid
+
+    def tid(self):
+        return self._tid
+
+
+def main(iterator):
+    log_entries = OrderedDict()
+    span_reader = csv.DictReader(iterator)
+    val = 0
+    for span_row in span_reader:
+        log_entries[val] = LogEntrySpan(span_row['TRACE_ID'], span_row['TIER'], span_row['SPAN'], int(span_row['TS']), int(span_row['DURATION']), int(span_row['PID']), int(span_row['TID']))
+        val = val + 1
+    return log_entries
+
+
+def breakdown(log_entries):
+    """Return the latency (microseconds) of each span of each tier, as a dict
+    from (tier, span) to its count, mean, and 50th, 95th and 99th percentiles.
+
+    log_entries -- [iterable] LogEntrySpan of any number of trace files.
+    """
+    durations = {}
+    for entry in log_entries:
+        durations.setdefault((entry.tier(), entry.span()), []).append(entry.duration())
+    ret = OrderedDict()
+    for key in sorted(durations):
+        values = numpy.array(durations[key])
+        ret[key] = {
+            'count': len(values),
+            'mean': float(numpy.mean(values)),
+            'p50': float(numpy.percentile(values, 50)),
+            'p95': float(numpy.percentile(values, 95)),
+            'p99': float(numpy.percentile(values, 99)),
+        }
+    return ret